@@ -0,0 +1,207 @@
+# backend/backfill.py
+"""
+Recomputation of drift_event and daily_domain_summary for past days.
+
+Work is partitioned by (user, day): a partition re-runs the drift rules
+over the user's sessions that started that day and recomputes the user's
+daily summary rows for that day, in one transaction. Both are
+replacements, not increments, so a partition can be re-run (e.g. after an
+interruption between its commit and its checkpoint) without double
+counting:
+
+- drifts: the sessions' rule-engine drifts are deleted (drift triggers,
+  maintained by the scheduled analyzer, are kept) and the new ones
+  inserted in bulk, with drift_hour_histogram adjusted by the difference
+- summaries: per-domain totals are computed with the daily summary
+  formula and upserted in bulk, and rows for domains no longer seen that
+  day are deleted
+
+Throttle keeps a backfill from crowding out ingest: before each partition
+it waits while the primary has more than BACKFILL_MAX_THREADS_RUNNING
+statements running or a replica is more than BACKFILL_MAX_REPLICA_LAG_SECONDS
+behind, and after each one it sleeps so that at most BACKFILL_DUTY_CYCLE of
+its wall time is spent working.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from database import DB_REPLICA_HOSTS, DB_REPLICA_MAX_LAG_SECONDS, iter_dict_rows, replica_lags
+from drift_detection import SESSION_EVENTS_QUERY, dedupe_drifts, detect_session_drifts
+from drift_histogram import adjust_histogram
+from drift_thresholds import load_thresholds
+from event_rollup import RAW_EVENT_RETENTION_HOURS, get_active_minutes
+
+# Statements running on the primary (Threads_running) above which workers pause
+BACKFILL_MAX_THREADS_RUNNING = int(os.getenv('BACKFILL_MAX_THREADS_RUNNING', '16'))
+BACKFILL_MAX_REPLICA_LAG_SECONDS = float(os.getenv('BACKFILL_MAX_REPLICA_LAG_SECONDS',
+                                                   str(DB_REPLICA_MAX_LAG_SECONDS)))
+# Fraction of each worker's wall time spent on partitions; 0.5 sleeps as long as each one took
+BACKFILL_DUTY_CYCLE = float(os.getenv('BACKFILL_DUTY_CYCLE', '0.5'))
+BACKFILL_EVENT_BATCH_SIZE = int(os.getenv('DRIFT_EVENT_BATCH_SIZE', '2000'))
+
+# Drift types written outside the rule engine, left alone by a drift backfill
+PRESERVED_DRIFT_TYPES = ('DRIFT_TRIGGER',)
+
+# Same formula as sp_UpdateDailySummaries: an event lasts until the next
+# event on its tab, at most 300 s, and 10 s for a tab's last event of the day
+DAY_SUMMARY_QUERY = """
+    WITH EventDurations AS (
+        SELECT tab_id,
+               COALESCE(
+                   LEAST(TIMESTAMPDIFF(SECOND, timestamp,
+                                       LEAD(timestamp) OVER (PARTITION BY tab_id ORDER BY timestamp)), 300),
+                   10
+               ) AS duration_seconds
+        FROM activity_event
+        WHERE user_id = %s AND timestamp >= %s AND timestamp < %s
+    )
+    SELECT t.domain_id, SUM(ed.duration_seconds), COUNT(*)
+    FROM EventDurations ed
+    JOIN tab t ON ed.tab_id = t.tid
+    GROUP BY t.domain_id
+"""
+
+
+def list_partitions(cursor, start_date, end_date, user_id=None):
+    """
+    Sorted (user_id, day) pairs in [start_date, end_date] with a session
+    starting or ending that day.
+    """
+    session_end = "COALESCE(end_time, last_activity_at)"
+    params = [start_date, end_date + timedelta(days=1)]
+    user_filter = ""
+    if user_id is not None:
+        user_filter = "AND user_id = %s"
+        params.append(user_id)
+    cursor.execute(f"""
+        SELECT user_id, DATE(start_time) FROM sessions
+        WHERE start_time >= %s AND start_time < %s {user_filter}
+        UNION
+        SELECT user_id, DATE({session_end}) FROM sessions
+        WHERE {session_end} >= %s AND {session_end} < %s {user_filter}
+    """, tuple(params * 2), query_name='backfill.partitions')
+    return sorted((uid, day) for uid, day in cursor.fetchall() if day is not None)
+
+
+def compacted_before():
+    """Days before this have had their raw MOUSE_MOVE / SCROLL rows purged."""
+    return (datetime.now() - timedelta(hours=RAW_EVENT_RETENTION_HOURS)).date()
+
+
+def backfill_drifts(conn, user_id, day):
+    """Replace the rule-engine drifts of the user's sessions started on day. Returns (removed, inserted)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT sid FROM sessions
+            WHERE user_id = %s AND start_time >= %s AND start_time < %s
+        """, (user_id, day, day + timedelta(days=1)), query_name='backfill.sessions')
+        session_ids = [row[0] for row in cursor.fetchall()]
+        if not session_ids:
+            return 0, 0
+        thresholds = load_thresholds(cursor, user_id)
+
+        new_rows = []
+        for session_id in session_ids:
+            active_minutes = get_active_minutes(cursor, session_id)
+            events = iter_dict_rows(conn, SESSION_EVENTS_QUERY, (session_id,),
+                                    batch_size=BACKFILL_EVENT_BATCH_SIZE, query_name='backfill.session_events')
+            for drift in dedupe_drifts(detect_session_drifts(events, active_minutes, thresholds)):
+                new_rows.append((session_id, drift['event_start'], drift['event_end'],
+                                 int((drift['event_end'] - drift['event_start']).total_seconds()),
+                                 drift['drift_type'], drift['description'], drift['severity']))
+
+        placeholders = ', '.join(['%s'] * len(session_ids))
+        preserved = ', '.join(['%s'] * len(PRESERVED_DRIFT_TYPES))
+        cursor.execute(f"""
+            SELECT drift_id, event_start, drift_type, duration_seconds FROM drift_event
+            WHERE session_id IN ({placeholders}) AND drift_type NOT IN ({preserved})
+            FOR UPDATE
+        """, (*session_ids, *PRESERVED_DRIFT_TYPES), query_name='backfill.old_drifts')
+        old_rows = cursor.fetchall()
+        if old_rows:
+            adjust_histogram(cursor, user_id, [row[1:] for row in old_rows], sign=-1)
+            cursor.execute(f"""
+                DELETE FROM drift_event WHERE drift_id IN ({', '.join(['%s'] * len(old_rows))})
+            """, tuple(row[0] for row in old_rows), query_name='backfill.delete_drifts')
+        if new_rows:
+            cursor.executemany("""
+                INSERT INTO drift_event
+                (session_id, event_start, event_end, duration_seconds, drift_type, description, severity)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, new_rows, query_name='backfill.insert_drifts')
+            adjust_histogram(cursor, user_id, [(row[1], row[4], row[3]) for row in new_rows])
+        return len(old_rows), len(new_rows)
+    finally:
+        cursor.close()
+
+
+def backfill_daily_summary(conn, user_id, day):
+    """Recompute the user's daily_domain_summary rows for day. Returns the number of domains."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(DAY_SUMMARY_QUERY, (user_id, day, day + timedelta(days=1)), query_name='backfill.day_summary')
+        rows = [(user_id, domain_id, day, int(seconds or 0), count) for domain_id, seconds, count in cursor.fetchall()]
+        if rows:
+            cursor.executemany("""
+                INSERT INTO daily_domain_summary (user_id, domain_id, summary_date, total_seconds_focused, total_events)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    total_seconds_focused = VALUES(total_seconds_focused),
+                    total_events = VALUES(total_events)
+            """, rows, query_name='backfill.upsert_summary')
+            cursor.execute(f"""
+                DELETE FROM daily_domain_summary
+                WHERE user_id = %s AND summary_date = %s AND domain_id NOT IN ({', '.join(['%s'] * len(rows))})
+            """, (user_id, day, *(row[1] for row in rows)), query_name='backfill.prune_summary')
+        else:
+            cursor.execute("DELETE FROM daily_domain_summary WHERE user_id = %s AND summary_date = %s",
+                           (user_id, day), query_name='backfill.prune_summary')
+        return len(rows)
+    finally:
+        cursor.close()
+
+
+class Throttle:
+    """Per-worker pacing against the database's load (see the module docstring)."""
+
+    def __init__(self, max_threads_running=BACKFILL_MAX_THREADS_RUNNING,
+                 max_replica_lag=BACKFILL_MAX_REPLICA_LAG_SECONDS, duty_cycle=BACKFILL_DUTY_CYCLE,
+                 max_pause=30.0):
+        self.max_threads_running = max_threads_running
+        self.max_replica_lag = max_replica_lag
+        self.duty_cycle = duty_cycle
+        self.max_pause = max_pause
+        self.paused_seconds = 0.0
+
+    def _overloaded(self, cursor):
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Threads_running'", query_name='backfill.load')
+        row = cursor.fetchone()
+        if row is not None and int(row[1]) > self.max_threads_running:
+            return f"{row[1]} threads running"
+        if DB_REPLICA_HOSTS:
+            lagging = [replica for replica, lag in replica_lags().items()
+                       if lag is not None and lag > self.max_replica_lag]
+            if lagging:
+                return f"replica lag on {', '.join(lagging)}"
+        return None
+
+    def wait_for_capacity(self, conn):
+        """Block, backing off exponentially, until the database is under the load targets."""
+        pause = 1.0
+        cursor = conn.cursor()
+        try:
+            while self._overloaded(cursor):
+                time.sleep(pause)
+                self.paused_seconds += pause
+                pause = min(pause * 2, self.max_pause)
+        finally:
+            cursor.close()
+
+    def rest_after(self, elapsed):
+        if 0 < self.duty_cycle < 1:
+            pause = elapsed * (1 - self.duty_cycle) / self.duty_cycle
+            time.sleep(pause)
+            self.paused_seconds += pause
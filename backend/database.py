@@ -1,26 +1,471 @@
 # backend/database.py
 import mysql.connector
+from mysql.connector import pooling
 import os
+import random
+import re
+import threading
+import time
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv()  # Loads variables from .env
 
-def get_db_connection():
-    """Establishes a connection to the MySQL database."""
+connections_open = metrics.gauge('ddt_db_connections_open', 'MySQL connections currently checked out')
+connections_opened = metrics.counter('ddt_db_connections_opened_total', 'MySQL connections opened')
+connection_failures = metrics.counter('ddt_db_connection_failures_total', 'Failed MySQL connection attempts')
+connect_seconds = metrics.histogram('ddt_db_connect_duration_seconds', 'Time to open a MySQL connection')
+
+_thread_state = threading.local()
+
+def thread_db_seconds():
+    """Wall time the calling thread has spent inside cursor calls (execute and fetch)."""
+    return getattr(_thread_state, 'db_seconds', 0.0)
+
+def thread_db_cpu_seconds():
+    """CPU time the calling thread has spent inside those calls (e.g. decoding rows in Python)."""
+    return getattr(_thread_state, 'db_cpu_seconds', 0.0)
+
+def _add_db_seconds(seconds, cpu_seconds=0.0):
+    _thread_state.db_seconds = thread_db_seconds() + seconds
+    _thread_state.db_cpu_seconds = thread_db_cpu_seconds() + cpu_seconds
+
+_VERB_RE = re.compile(r'^\s*(\w+)', re.IGNORECASE)
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+
+def default_query_name(sql):
+    """Stable name for an unnamed statement: '<verb>.<first table>'."""
+    verb_match = _VERB_RE.match(sql or '')
+    verb = verb_match.group(1).lower() if verb_match else 'sql'
+    table_match = _TABLE_RE.search(sql or '')
+    return f"{verb}.{table_match.group(1).lower()}" if table_match else verb
+
+
+class InstrumentedCursor:
+    """Cursor wrapper recording per-statement latency and row counts under a stable query name."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._query_name = None
+
+    def execute(self, operation, params=None, query_name=None, **kwargs):
+        self._query_name = query_name or default_query_name(operation)
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            result = self._cursor.execute(operation, params, **kwargs)
+        except Exception:
+            metrics.db_query_errors.inc(query=self._query_name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _add_db_seconds(elapsed, time.thread_time() - cpu_start)
+            metrics.record_query(self._query_name, elapsed, operation)
+        if self._cursor.with_rows is False and self._cursor.rowcount > 0:
+            metrics.db_query_rows.inc(self._cursor.rowcount, query=self._query_name)
+        return result
+
+    def executemany(self, operation, seq_params, query_name=None, **kwargs):
+        self._query_name = query_name or default_query_name(operation)
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            result = self._cursor.executemany(operation, seq_params, **kwargs)
+        except Exception:
+            metrics.db_query_errors.inc(query=self._query_name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _add_db_seconds(elapsed, time.thread_time() - cpu_start)
+            metrics.record_query(self._query_name, elapsed, operation)
+        if self._cursor.rowcount and self._cursor.rowcount > 0:
+            metrics.db_query_rows.inc(self._cursor.rowcount, query=self._query_name)
+        return result
+
+    def callproc(self, procname, args=(), query_name=None):
+        self._query_name = query_name or f"proc.{procname}"
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            return self._cursor.callproc(procname, args)
+        except Exception:
+            metrics.db_query_errors.inc(query=self._query_name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _add_db_seconds(elapsed, time.thread_time() - cpu_start)
+            metrics.record_query(self._query_name, elapsed, f"CALL {procname}")
+
+    def _count_rows(self, rows):
+        if self._query_name and rows:
+            metrics.db_query_rows.inc(len(rows), query=self._query_name)
+        return rows
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            return fetch(*args)
+        finally:
+            _add_db_seconds(time.perf_counter() - start, time.thread_time() - cpu_start)
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cursor.fetchone)
+        if row is not None and self._query_name:
+            metrics.db_query_rows.inc(query=self._query_name)
+        return row
+
+    def fetchmany(self, size=1):
+        return self._count_rows(self._timed_fetch(self._cursor.fetchmany, size))
+
+    def fetchall(self):
+        return self._count_rows(self._timed_fetch(self._cursor.fetchall))
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection wrapper handing out InstrumentedCursor objects."""
+
+    def __init__(self, conn, on_close=None, on_commit=None):
+        self._conn = conn
+        self._closed = False
+        self._on_close = on_close
+        self._on_commit = on_commit
+        connections_open.inc()
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        result = self._conn.commit()
+        if self._on_commit:
+            self._on_commit()
+        return result
+
+    def close(self):
+        first_close = not self._closed
+        if first_close:
+            self._closed = True
+            connections_open.dec()
+        try:
+            # For pooled connections this returns the connection to the pool
+            return self._conn.close()
+        finally:
+            if first_close and self._on_close:
+                self._on_close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# Connection intents: writes (and reads that must see them) go to the primary,
+# read-only dashboard/admin/job queries may be served by a replica
+INTENT_WRITE = 'write'
+INTENT_READ = 'read'
+
+# Comma-separated host[:port] list of read replicas; empty routes everything to the primary
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv('DB_REPLICA_HOSTS', '').split(',') if h.strip()]
+# Replicas further behind than this are skipped
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '5'))
+# How long a replica lag measurement is reused before it is taken again
+DB_REPLICA_LAG_CHECK_SECONDS = float(os.getenv('DB_REPLICA_LAG_CHECK_SECONDS', '5'))
+
+PRIMARY = 'primary'
+
+connections_routed = metrics.counter('ddt_db_connections_routed_total', 'Connections opened by intent and target',
+                                     ('intent', 'target'))
+replica_lag_seconds = metrics.gauge('ddt_db_replica_lag_seconds',
+                                    'Last measured replication lag (-1 when not replicating)', ('replica',))
+
+
+def _parse_host(spec):
+    host, _, port = spec.partition(':')
+    return host, int(port or os.getenv('DB_PORT', '3306'))
+
+
+def _connection_args(target=PRIMARY):
+    args = dict(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', '3306')),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        database=os.getenv('DB_NAME', 'ddt'),
+        auth_plugin='mysql_native_password',
+        connect_timeout=10
+    )
+    if target != PRIMARY:
+        args['host'], args['port'] = _parse_host(target)
+    return args
+
+
+# --- Read-your-writes ---
+# Wall time of each user's last commit on a primary connection opened for them
+_last_write = {}
+_last_write_lock = threading.Lock()
+
+
+def note_write(user_id):
+    """Record that user_id just committed a write, so their next reads avoid lagging replicas."""
+    now = time.time()
+    with _last_write_lock:
+        _last_write[user_id] = now
+        if len(_last_write) > 10000:
+            # Writes older than any usable lag no longer affect routing
+            horizon = now - DB_REPLICA_MAX_LAG_SECONDS - DB_REPLICA_LAG_CHECK_SECONDS - 1
+            for uid in [uid for uid, ts in _last_write.items() if ts < horizon]:
+                del _last_write[uid]
+
+
+# --- Replica lag ---
+_replica_lag = {}  # replica -> (lag seconds or None, wall time measured)
+_replica_locks = {replica: threading.Lock() for replica in DB_REPLICA_HOSTS}
+
+
+def _measure_lag(replica):
+    """Seconds_Behind_Source of replica, or None if it is unreachable or not replicating."""
     try:
-        conn = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            port=int(os.getenv('DB_PORT', '3306')),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_NAME', 'ddt'),
-            auth_plugin='mysql_native_password',
-            connect_timeout=10
-        )
-        return conn
+        conn = mysql.connector.connect(**_connection_args(replica))
     except mysql.connector.Error as e:
+        print(f"MySQL replica {replica} unreachable: {e}")
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error:
+            # MySQL before 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            print(f"MySQL replica {replica} is not configured as a replica")
+            return None
+        lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        return float(lag) if lag is not None else None
+    except mysql.connector.Error as e:
+        print(f"MySQL replica {replica} lag check failed: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def _replica_status(replica):
+    """(lag, measured_at) for replica, re-measured at most every DB_REPLICA_LAG_CHECK_SECONDS."""
+    status = _replica_lag.get(replica)
+    if status is not None and time.time() - status[1] < DB_REPLICA_LAG_CHECK_SECONDS:
+        return status
+    with _replica_locks[replica]:
+        status = _replica_lag.get(replica)
+        if status is None or time.time() - status[1] >= DB_REPLICA_LAG_CHECK_SECONDS:
+            measured_at = time.time()
+            lag = _measure_lag(replica)
+            status = (lag, measured_at)
+            _replica_lag[replica] = status
+            replica_lag_seconds.set(-1 if lag is None else lag, replica=replica)
+    return status
+
+
+def replica_lags():
+    """{replica: last measured lag in seconds, or None when unreachable or not replicating}."""
+    return {replica: _replica_status(replica)[0] for replica in DB_REPLICA_HOSTS}
+
+
+def _mark_replica_down(replica):
+    _replica_lag[replica] = (None, time.time())
+    replica_lag_seconds.set(-1, replica=replica)
+
+
+def choose_target(intent=INTENT_WRITE, user_id=None):
+    """
+    PRIMARY, or a replica for read intent.
+
+    A replica qualifies when its lag is within DB_REPLICA_MAX_LAG_SECONDS
+    and, if user_id wrote recently, the measurement shows it had already
+    applied that write: a replica lag seconds behind at measured_at has
+    every transaction committed before measured_at - lag.
+    """
+    if intent != INTENT_READ or not DB_REPLICA_HOSTS:
+        return PRIMARY
+    last_write = _last_write.get(user_id) if user_id is not None else None
+    candidates = []
+    for replica in DB_REPLICA_HOSTS:
+        lag, measured_at = _replica_status(replica)
+        if lag is None or lag > DB_REPLICA_MAX_LAG_SECONDS:
+            continue
+        # Seconds_Behind_Source has one-second resolution
+        if last_write is not None and last_write + lag + 1 >= measured_at:
+            continue
+        candidates.append(replica)
+    return random.choice(candidates) if candidates else PRIMARY
+
+
+def _on_commit_for(intent, user_id):
+    if intent == INTENT_WRITE and user_id is not None:
+        return lambda: note_write(user_id)
+    return None
+
+
+def get_db_connection(intent=INTENT_WRITE, user_id=None):
+    """
+    Establishes a connection to the MySQL database.
+
+    intent=INTENT_READ may be routed to a replica (see choose_target); pass
+    the user_id the request acts for so reads follow that user's own
+    writes. Commits on a write connection opened with a user_id are
+    recorded for that purpose.
+    """
+    target = choose_target(intent, user_id)
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        try:
+            conn = mysql.connector.connect(**_connection_args(target))
+        except mysql.connector.Error as e:
+            if target == PRIMARY:
+                raise
+            print(f"MySQL replica {target} connection error, using primary: {e}")
+            _mark_replica_down(target)
+            target = PRIMARY
+            conn = mysql.connector.connect(**_connection_args(target))
+        elapsed = time.perf_counter() - start
+        _add_db_seconds(elapsed, time.thread_time() - cpu_start)
+        connect_seconds.observe(elapsed)
+        connections_opened.inc()
+        connections_routed.inc(intent=intent, target='primary' if target == PRIMARY else 'replica')
+        return InstrumentedConnection(conn, on_commit=_on_commit_for(intent, user_id))
+    except mysql.connector.Error as e:
+        connection_failures.inc()
         print(f"MySQL connection error: {e}")
         return None
     except Exception as e:
+        connection_failures.inc()
         print(f"Error connecting to MySQL: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+# Shared pools for concurrent read fan-out, one per target (mysql-connector
+# caps pool_size at 32)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+_pools = {}
+_pool_slots = {target: threading.BoundedSemaphore(DB_POOL_SIZE) for target in [PRIMARY, *DB_REPLICA_HOSTS]}
+_pool_lock = threading.Lock()
+
+pool_wait_seconds = metrics.histogram('ddt_db_pool_wait_seconds', 'Time spent waiting for a pooled connection')
+
+
+def _get_pool(target=PRIMARY):
+    pool = _pools.get(target)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(target)
+            if pool is None:
+                name = 'ddt' if target == PRIMARY else f"ddt_{target.replace(':', '_')}"
+                pool = pooling.MySQLConnectionPool(pool_name=name, pool_size=DB_POOL_SIZE,
+                                                   pool_reset_session=True, **_connection_args(target))
+                _pools[target] = pool
+    return pool
+
+
+def warm_pools():
+    """
+    Create the shared pools (which open all DB_POOL_SIZE connections up
+    front) for the primary and every replica within the lag limit. Returns
+    the targets warmed; raises if the primary's pool cannot be created.
+    """
+    _get_pool(PRIMARY)
+    warmed = [PRIMARY]
+    for replica, lag in replica_lags().items():
+        if lag is None or lag > DB_REPLICA_MAX_LAG_SECONDS:
+            continue
+        try:
+            _get_pool(replica)
+            warmed.append(replica)
+        except mysql.connector.Error as e:
+            print(f"MySQL replica {replica} pool warm-up failed: {e}")
+    return warmed
+
+
+def _checkout(target, timeout):
+    slots = _pool_slots[target]
+    if not slots.acquire(timeout=timeout):
+        raise TimeoutError(f"no connection free after {timeout}s")
+    try:
+        return _get_pool(target).get_connection(), slots
+    except Exception:
+        slots.release()
+        raise
+
+
+def get_pooled_connection(timeout=10, intent=INTENT_WRITE, user_id=None):
+    """
+    Check a connection out of the shared pool of the target chosen for
+    intent/user_id (see choose_target), waiting up to timeout seconds for
+    one to be free. close() returns it to the pool. Returns None on error.
+    """
+    target = choose_target(intent, user_id)
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        try:
+            conn, slots = _checkout(target, timeout)
+        except mysql.connector.Error as e:
+            if target == PRIMARY:
+                raise
+            print(f"MySQL replica {target} pool error, using primary: {e}")
+            _mark_replica_down(target)
+            target = PRIMARY
+            conn, slots = _checkout(target, max(timeout - (time.perf_counter() - start), 0))
+    except TimeoutError as e:
+        connection_failures.inc()
+        print(f"MySQL pool exhausted: {e}")
+        return None
+    except Exception as e:
+        connection_failures.inc()
+        print(f"MySQL pool connection error: {e}")
+        return None
+    elapsed = time.perf_counter() - start
+    _add_db_seconds(elapsed, time.thread_time() - cpu_start)
+    pool_wait_seconds.observe(elapsed)
+    connections_routed.inc(intent=intent, target='primary' if target == PRIMARY else 'replica')
+    return InstrumentedConnection(conn, on_close=slots.release, on_commit=_on_commit_for(intent, user_id))
+
+
+def iter_row_batches(conn, query, params=None, batch_size=1000, query_name=None):
+    """
+    Stream a result set in batches of at most batch_size rows.
+
+    Uses an unbuffered cursor, so only one batch is held in memory at a time.
+    The connection cannot run other statements until the generator is
+    exhausted or closed.
+    """
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query, params, query_name=query_name)
+        columns = [desc[0] for desc in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield columns, rows
+    finally:
+        # Drain (batch by batch) whatever the caller did not read so the
+        # connection stays usable
+        try:
+            while cursor.fetchmany(batch_size):
+                pass
+        except Exception:
+            pass
+        cursor.close()
+
+
+def iter_dict_rows(conn, query, params=None, batch_size=1000, query_name=None):
+    """Stream a result set as one dict per row, fetching batch_size rows at a time."""
+    for columns, rows in iter_row_batches(conn, query, params, batch_size, query_name):
+        for row in rows:
+            yield dict(zip(columns, row))
@@ -0,0 +1,132 @@
+# backend/domain_catalog.py
+"""
+Global domain catalog with per-user mapping rows.
+
+domain_catalog holds one row per normalized domain name; each user's
+domains row maps (user_id, domain_name) to a catalog_id and carries the
+user's category, which starts as the catalog's default_category: the
+category most users give the domain, refreshed by jobs/run_stat_sketches.py
+(refresh_default_categories). Both lookups are cached in-process, so a tab open for a
+domain the user has visited before needs no domain query at all, and a
+domain already in the catalog only needs the per-user mapping INSERT.
+"""
+
+import metrics
+from url_dictionary import InternCache
+
+# Bounded LRU caches shared by every request in the process
+catalog_cache = InternCache(max_size=50000)   # domain_name -> catalog_id
+user_domain_cache = InternCache(max_size=100000)  # (user_id, domain_name) -> domains.id
+
+_cache_entries = metrics.gauge('ddt_domain_cache_entries', 'Entries held in the domain caches', ('cache',))
+_cache_hits = metrics.counter('ddt_domain_cache_hits_total', 'Domain cache hits', ('cache',))
+_cache_misses = metrics.counter('ddt_domain_cache_misses_total', 'Domain cache misses', ('cache',))
+for _name, _cache in (('catalog', catalog_cache), ('user_domain', user_domain_cache)):
+    _cache_entries.set_function(_cache.__len__, cache=_name)
+    _cache_hits.set_function(lambda c=_cache: c.hits, cache=_name)
+    _cache_misses.set_function(lambda c=_cache: c.misses, cache=_name)
+
+
+def extract_domain(url):
+    """Python equivalent of the extractDomainFromUrl() SQL function, lowercased."""
+    if not url:
+        return None
+    domain_name = url.split('://', 1)[-1].split('/', 1)[0].split(':', 1)[0].lower()
+    if domain_name.startswith('www.'):
+        domain_name = domain_name[4:]
+    return domain_name or None
+
+
+def get_catalog_id(cursor, domain_name):
+    """Return the catalog id for a normalized domain name, creating the row if needed."""
+    catalog_id = catalog_cache.get(domain_name)
+    if catalog_id is not None:
+        return catalog_id
+    cursor.execute(
+        "INSERT INTO domain_catalog (domain_name) VALUES (%s) "
+        "ON DUPLICATE KEY UPDATE catalog_id = LAST_INSERT_ID(catalog_id)",
+        (domain_name,), query_name='domain_catalog.upsert')
+    catalog_id = cursor.lastrowid
+    catalog_cache.put(domain_name, catalog_id)
+    return catalog_id
+
+
+def resolve_domain(cursor, user_id, domain_name):
+    """
+    Return (domain_id, created) for the user's mapping row of domain_name.
+
+    New mapping rows get the catalog's default_category. The caller must commit before the id is
+    used by other connections, and call forget() if it rolls back instead.
+    """
+    domain_id = user_domain_cache.get((user_id, domain_name))
+    if domain_id is not None:
+        return domain_id, False
+
+    cursor.execute("SELECT id FROM domains WHERE user_id = %s AND domain_name = %s",
+                   (user_id, domain_name), query_name='domain_catalog.user_lookup')
+    row = cursor.fetchone()
+    if row:
+        user_domain_cache.put((user_id, domain_name), row[0])
+        return row[0], False
+
+    catalog_id = get_catalog_id(cursor, domain_name)
+    cursor.execute("""
+        INSERT INTO domains (user_id, catalog_id, domain_name, category)
+        SELECT %s, catalog_id, domain_name, default_category
+        FROM domain_catalog WHERE catalog_id = %s
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+    """, (user_id, catalog_id), query_name='domain_catalog.user_insert')
+    domain_id = cursor.lastrowid
+    user_domain_cache.put((user_id, domain_name), domain_id)
+    return domain_id, True
+
+
+def forget(user_id, domain_name):
+    """Drop cached ids that may refer to rows from a rolled-back transaction."""
+    user_domain_cache.discard((user_id, domain_name))
+    catalog_cache.discard(domain_name)
+
+
+def refresh_default_categories(cursor):
+    """
+    Set each catalog domain's default_category to the category most users
+    give it (ties go to the first category in enum order). Returns the
+    number of catalog rows changed.
+    """
+    cursor.execute("""
+        UPDATE domain_catalog c
+        JOIN (
+            SELECT catalog_id, category,
+                   ROW_NUMBER() OVER (PARTITION BY catalog_id ORDER BY COUNT(*) DESC, category) AS category_rank
+            FROM domains
+            GROUP BY catalog_id, category
+        ) dominant ON dominant.catalog_id = c.catalog_id AND dominant.category_rank = 1
+        SET c.default_category = dominant.category
+        WHERE c.default_category <> dominant.category
+    """, query_name='domain_catalog.refresh_defaults')
+    return cursor.rowcount
+
+
+def preload(cursor, limit=20000, active_since=None):
+    """
+    Fill the caches ahead of traffic: the newest catalog entries and, when
+    active_since is given, the domain mappings of users with a session
+    active since then. Returns the number of entries loaded.
+    """
+    cursor.execute("SELECT domain_name, catalog_id FROM domain_catalog ORDER BY catalog_id DESC LIMIT %s",
+                   (min(limit, catalog_cache.max_size),), query_name='domain_catalog.preload')
+    rows = cursor.fetchall()
+    for domain_name, catalog_id in reversed(rows):
+        catalog_cache.put(domain_name, catalog_id)
+    loaded = len(rows)
+    if active_since is not None:
+        cursor.execute("""
+            SELECT d.user_id, d.domain_name, d.id FROM domains d
+            WHERE d.user_id IN (SELECT user_id FROM sessions WHERE last_activity_at >= %s)
+            ORDER BY d.id DESC LIMIT %s
+        """, (active_since, min(limit, user_domain_cache.max_size)), query_name='domain_catalog.preload_users')
+        rows = cursor.fetchall()
+        for user_id, domain_name, domain_id in reversed(rows):
+            user_domain_cache.put((user_id, domain_name), domain_id)
+        loaded += len(rows)
+    return loaded
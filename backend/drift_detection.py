@@ -0,0 +1,91 @@
+# backend/drift_detection.py
+"""
+Drift detection shared by the batch analyzer and the ingest path.
+
+The drift types themselves are declarative rules in drift_rules.py,
+evaluated by a DriftEngine in one pass over a session's events;
+detect_session_drifts runs that pass over a whole session
+(jobs/run_drift_analysis.py) while live_drift.py feeds batches to a
+per-session engine as they arrive. insert_drift de-duplicates and stores
+what either of them finds.
+"""
+
+from drift_histogram import record_drift
+from drift_rules import DriftEngine
+
+# Drifts of the same type in a session starting closer together than this are one drift
+DUPLICATE_WINDOW_SECONDS = 10
+
+# All activity events for a session, ordered by timestamp, in the shape the rules take
+SESSION_EVENTS_QUERY = """
+    SELECT 
+        ae.event_id, ae.user_id, ae.tab_id, ae.event_type, 
+        ae.timestamp, COALESCE(ae.url, ud.url) AS url, COALESCE(ud.url_flags, 0) AS url_flags,
+        d.domain_name, d.category
+    FROM activity_event ae
+    JOIN tab t ON ae.tab_id = t.tid
+    JOIN domains d ON t.domain_id = d.id
+    LEFT JOIN url_dict ud ON ae.url_id = ud.url_id
+    WHERE ae.session_id = %s
+    ORDER BY ae.timestamp ASC
+"""
+
+
+def detect_session_drifts(events, active_minutes, thresholds=None):
+    """
+    Single pass of the active drift rules over any iterable of event dicts
+    in timestamp order (e.g. a streaming cursor). Returns the detected
+    drifts as dicts.
+    """
+    engine = DriftEngine(thresholds, active_minutes)
+    drifts = []
+    for event in events:
+        drifts.extend(engine.feed(event))
+    return drifts
+
+
+def dedupe_drifts(drifts):
+    """
+    Drop drifts insert_drift would reject as duplicates of an earlier one
+    in the list, for callers that replace a session's drifts in bulk.
+    """
+    kept = []
+    last_start = {}  # drift_type -> event_start of the latest kept drift
+    for drift in sorted(drifts, key=lambda d: d['event_start']):
+        previous = last_start.get(drift['drift_type'])
+        if previous is not None and (drift['event_start'] - previous).total_seconds() < DUPLICATE_WINDOW_SECONDS:
+            continue
+        last_start[drift['drift_type']] = drift['event_start']
+        kept.append(drift)
+    return kept
+
+
+def insert_drift(cursor, session_id, event_start, event_end, drift_type, description, severity, tab_id=None, event_meta=None):
+    """
+    Insert a drift event into the database.
+
+    Returns the new drift_id, or None when the same drift type was already
+    recorded for the session within DUPLICATE_WINDOW_SECONDS of event_start
+    (e.g. by the ingest path before the scheduled analyzer ran). The user's
+    drift_hour_histogram cell is updated in the same transaction.
+    """
+    duration = int((event_end - event_start).total_seconds())
+
+    cursor.execute("""
+        SELECT drift_id FROM drift_event
+        WHERE session_id = %s
+        AND drift_type = %s
+        AND ABS(TIMESTAMPDIFF(SECOND, event_start, %s)) < %s
+        LIMIT 1
+    """, (session_id, drift_type, event_start, DUPLICATE_WINDOW_SECONDS))
+    if cursor.fetchone():
+        return None
+
+    cursor.execute("""
+        INSERT INTO drift_event
+        (session_id, event_start, event_end, duration_seconds, drift_type, description, severity)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, (session_id, event_start, event_end, duration, drift_type, description, severity))
+    drift_id = cursor.lastrowid
+    record_drift(cursor, session_id, event_start, drift_type, duration)
+    return drift_id
@@ -0,0 +1,113 @@
+# backend/drift_histogram.py
+"""
+Per-user drift histogram by day of week, hour of day and drift type.
+
+drift_hour_histogram holds at most 7 x 24 x (drift types) rows per user and
+is updated in the same transaction as every drift written by insert_drift,
+so "driftiest hours" and the weekday/hour heatmap read a bounded number of
+rows instead of grouping the user's whole drift history. Hours and days are
+in the database server's time zone, like drift_event.event_start.
+drift_histogram_migration.sql backfills the table from drift_event.
+"""
+
+WEEKDAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+WEEKEND_DAYS = (5, 6)  # WEEKDAY(): 0 = Monday
+
+
+def record_drift(cursor, session_id, event_start, drift_type, duration_seconds):
+    """Count one drift of the session's user in its (weekday, hour, type) cell."""
+    cursor.execute("""
+        INSERT INTO drift_hour_histogram
+            (user_id, day_of_week, hour_of_day, drift_type, drift_count, total_seconds)
+        SELECT user_id, WEEKDAY(%s), HOUR(%s), %s, 1, %s
+        FROM sessions WHERE sid = %s
+        ON DUPLICATE KEY UPDATE
+            drift_count = drift_count + 1,
+            total_seconds = total_seconds + VALUES(total_seconds)
+    """, (event_start, event_start, drift_type or 'Unknown', max(duration_seconds or 0, 0), session_id),
+        query_name='drift_histogram.record')
+
+
+def adjust_histogram(cursor, user_id, drifts, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) drifts, given as (event_start,
+    drift_type, duration_seconds) tuples, from the user's cells with one
+    upsert per cell touched. Cells left empty by a removal are deleted.
+    """
+    cells = {}
+    for event_start, drift_type, duration_seconds in drifts:
+        key = (event_start.weekday(), event_start.hour, drift_type or 'Unknown')
+        count, seconds = cells.get(key, (0, 0))
+        cells[key] = (count + 1, seconds + max(duration_seconds or 0, 0))
+    if not cells:
+        return
+    cursor.executemany("""
+        INSERT INTO drift_hour_histogram
+            (user_id, day_of_week, hour_of_day, drift_type, drift_count, total_seconds)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            drift_count = drift_count + VALUES(drift_count),
+            total_seconds = total_seconds + VALUES(total_seconds)
+    """, [(user_id, day, hour, drift_type, sign * count, sign * seconds)
+          for (day, hour, drift_type), (count, seconds) in cells.items()], query_name='drift_histogram.adjust')
+    if sign < 0:
+        cursor.execute("DELETE FROM drift_hour_histogram WHERE user_id = %s AND drift_count <= 0",
+                       (user_id,), query_name='drift_histogram.prune')
+
+
+# Driftiest hours with the most common drift type of each hour; takes (user_id,)
+DRIFTIEST_HOURS_QUERY = """
+    WITH per_type AS (
+        SELECT hour_of_day, drift_type, SUM(drift_count) AS drifts
+        FROM drift_hour_histogram
+        WHERE user_id = %s
+        GROUP BY hour_of_day, drift_type
+    ),
+    ranked AS (
+        SELECT hour_of_day, drift_type,
+               SUM(drifts) OVER (PARTITION BY hour_of_day) AS total_drifts,
+               ROW_NUMBER() OVER (PARTITION BY hour_of_day ORDER BY drifts DESC, drift_type) AS type_rank
+        FROM per_type
+    )
+    SELECT hour_of_day AS drift_hour, total_drifts, drift_type AS most_common_drift_type
+    FROM ranked
+    WHERE type_rank = 1
+    ORDER BY total_drifts DESC
+"""
+
+# All cells of the user's histogram; takes (user_id,)
+HEATMAP_QUERY = """
+    SELECT day_of_week, hour_of_day, drift_type, drift_count, total_seconds
+    FROM drift_hour_histogram
+    WHERE user_id = %s
+"""
+
+
+def build_heatmap(rows, drift_type=None):
+    """
+    7 x 24 count/duration matrices (rows Monday..Sunday) from HEATMAP_QUERY
+    rows, optionally for a single drift type, plus weekday/weekend totals
+    per hour and the drift types present.
+    """
+    counts = [[0] * 24 for _ in range(7)]
+    seconds = [[0] * 24 for _ in range(7)]
+    drift_types = set()
+    for day_of_week, hour_of_day, row_type, drift_count, total_seconds in rows:
+        drift_types.add(row_type)
+        if drift_type is not None and row_type != drift_type:
+            continue
+        counts[day_of_week][hour_of_day] += int(drift_count)
+        seconds[day_of_week][hour_of_day] += int(total_seconds)
+
+    weekday_hours = [sum(counts[day][hour] for day in range(7) if day not in WEEKEND_DAYS) for hour in range(24)]
+    weekend_hours = [sum(counts[day][hour] for day in WEEKEND_DAYS) for hour in range(24)]
+    return {
+        "days": list(WEEKDAY_NAMES),
+        "drift_type": drift_type,
+        "drift_types": sorted(drift_types),
+        "counts": counts,
+        "total_seconds": seconds,
+        "weekday_hours": weekday_hours,
+        "weekend_hours": weekend_hours,
+        "total_drifts": sum(map(sum, counts)),
+    }
@@ -0,0 +1,352 @@
+# backend/drift_rules.py
+"""
+Declarative drift rules, evaluated together in one pass over a session.
+
+Each drift type is a rule: a sequence pattern over a filtered event stream
+(SequenceRule), a gap between events (GapRule), a count of events within a
+time window (WindowCountRule) or a repeat within the last N events
+(RepeatRule). Limits are numbers or the names of DriftThresholds
+attributes, so per-user thresholds apply without changing the rules, and
+severity is a constant or a function of the match.
+
+DriftEngine compiles the active rules into matchers that each keep only
+their own small window, and feeds every event to all of them once. The
+batch analyzer streams a session's events through one engine and the
+ingest path feeds each batch to a per-session engine, so a new rule adds
+a matcher to the existing pass rather than another scan.
+
+Events are dicts with timestamp, event_type, tab_id, domain_name, category
+and url_flags, in timestamp order. DRIFT_RULES (comma-separated rule names,
+default all) and DRIFT_RULES_DISABLED choose the active rules per
+deployment.
+"""
+
+import os
+from collections import deque
+
+from drift_thresholds import DEFAULT_THRESHOLDS, RAPID_SWITCH_WINDOW_SECONDS
+from event_rollup import had_activity_between
+from url_classifier import URL_FLAG_SEARCH
+
+UNPRODUCTIVE_CATEGORIES = ('Unproductive', 'Social Media', 'Entertainment')
+FOCUS_CHANGE_EVENTS = ('TAB_FOCUS', 'URL_CHANGE')
+LOOP_WINDOW_EVENTS = 20
+LOOP_REVISITS = 3
+SEARCH_DRIFT_SECONDS = 120
+# Rules evaluated outside the engine (cross-session SQL in the batch analyzer)
+SQL_RULE_NAMES = ('drift_trigger',)
+
+
+def _limit(value, thresholds):
+    """A rule limit: a number, or the name of a DriftThresholds attribute."""
+    return getattr(thresholds, value) if isinstance(value, str) else value
+
+
+def _severity(severity, match, thresholds):
+    return severity(match, thresholds) if callable(severity) else severity
+
+
+def _drift(rule, match, thresholds):
+    return {
+        "event_start": match["start"], "event_end": match["end"], "drift_type": rule.drift_type,
+        "description": rule.describe(match), "severity": _severity(rule.severity, match, thresholds),
+        "tab_id": match.get("tab_id"),
+    }
+
+
+# Event predicates used by the rules
+def category_in(*categories):
+    return lambda event: event['category'] in categories
+
+
+def has_url_flag(flag):
+    return lambda event: bool((event.get('url_flags') or 0) & flag)
+
+
+productive = category_in('Productive')
+unproductive = category_in('Unproductive')
+any_unproductive = category_in(*UNPRODUCTIVE_CATEGORIES)
+
+
+class Step:
+    """One element of a sequence: a predicate and an optional limit on the seconds until the next element."""
+
+    def __init__(self, match, within=None):
+        self.match = match
+        self.within = within
+
+
+class SequenceRule:
+    """
+    Consecutive events of the stream filtered to event_types that match
+    steps in order. A match spans from the step at span_step to the event
+    after it, or, with span_from_previous_event, from the event (of any type)
+    before the last step to the last step. The drift is attributed to the
+    tab of the last step.
+    """
+
+    def __init__(self, name, drift_type, event_types, steps, describe, severity,
+                 span_step=0, span_from_previous_event=False):
+        if steps[-1].within is not None:
+            raise ValueError(f"rule {name}: the last step cannot limit the time to a following event")
+        self.name = name
+        self.drift_type = drift_type
+        self.event_types = frozenset(event_types)
+        self.steps = steps
+        self.describe = describe
+        self.severity = severity
+        self.span_step = span_step
+        self.span_from_previous_event = span_from_previous_event
+
+    def compile(self, thresholds, active_minutes):
+        return _SequenceMatcher(self, thresholds)
+
+
+class _SequenceMatcher:
+    def __init__(self, rule, thresholds):
+        self.rule = rule
+        self.thresholds = thresholds
+        self.limits = [_limit(step.within, thresholds) for step in rule.steps]
+        self.window = deque(maxlen=len(rule.steps))
+
+    def feed(self, event, previous_event):
+        rule = self.rule
+        if event['event_type'] not in rule.event_types:
+            return None
+        self.window.append(event)
+        if len(self.window) < len(rule.steps):
+            return None
+
+        events = list(self.window)
+        for index, step in enumerate(rule.steps):
+            if not step.match(events[index]):
+                return None
+            limit = self.limits[index]
+            if limit is not None:
+                # Whole seconds, like TIMESTAMPDIFF(SECOND, ...)
+                if int((events[index + 1]['timestamp'] - events[index]['timestamp']).total_seconds()) >= limit:
+                    return None
+
+        if rule.span_from_previous_event:
+            start, end = previous_event['timestamp'], event['timestamp']
+        else:
+            start, end = events[rule.span_step]['timestamp'], events[rule.span_step + 1]['timestamp']
+        match = {"events": events, "start": start, "end": end,
+                 "duration": int((end - start).total_seconds()), "tab_id": event['tab_id']}
+        return _drift(rule, match, self.thresholds)
+
+
+class GapRule:
+    """More than min_seconds between consecutive events with no engagement bucket in between."""
+
+    def __init__(self, name, drift_type, min_seconds, describe, severity):
+        self.name = name
+        self.drift_type = drift_type
+        self.min_seconds = min_seconds
+        self.describe = describe
+        self.severity = severity
+
+    def compile(self, thresholds, active_minutes):
+        return _GapMatcher(self, thresholds, active_minutes)
+
+
+class _GapMatcher:
+    def __init__(self, rule, thresholds, active_minutes):
+        self.rule = rule
+        self.thresholds = thresholds
+        self.min_seconds = _limit(rule.min_seconds, thresholds)
+        self.active_minutes = active_minutes
+
+    def feed(self, event, previous_event):
+        if previous_event is None:
+            return None
+        start, end = previous_event['timestamp'], event['timestamp']
+        gap = (end - start).total_seconds()
+        if gap <= self.min_seconds or had_activity_between(self.active_minutes, start, end):
+            return None
+        match = {"start": start, "end": end, "duration": gap, "tab_id": None}
+        return _drift(self.rule, match, self.thresholds)
+
+
+class WindowCountRule:
+    """At least min_count events of event_types within window_seconds; the window restarts after a match."""
+
+    def __init__(self, name, drift_type, event_types, window_seconds, min_count, describe, severity):
+        self.name = name
+        self.drift_type = drift_type
+        self.event_types = frozenset(event_types)
+        self.window_seconds = window_seconds
+        self.min_count = min_count
+        self.describe = describe
+        self.severity = severity
+
+    def compile(self, thresholds, active_minutes):
+        return _WindowCountMatcher(self, thresholds)
+
+
+class _WindowCountMatcher:
+    def __init__(self, rule, thresholds):
+        self.rule = rule
+        self.thresholds = thresholds
+        self.window_seconds = _limit(rule.window_seconds, thresholds)
+        self.min_count = _limit(rule.min_count, thresholds)
+        self.times = deque()
+
+    def feed(self, event, previous_event):
+        if event['event_type'] not in self.rule.event_types:
+            return None
+        event_time = event['timestamp']
+        self.times.append(event_time)
+        while (event_time - self.times[0]).total_seconds() > self.window_seconds:
+            self.times.popleft()
+        if len(self.times) < self.min_count:
+            return None
+        match = {"start": self.times[0], "end": event_time, "count": len(self.times),
+                 "window_seconds": self.window_seconds, "tab_id": event['tab_id']}
+        match["duration"] = (match["end"] - match["start"]).total_seconds()
+        self.times.clear()
+        return _drift(self.rule, match, self.thresholds)
+
+
+class RepeatRule:
+    """
+    An event matching `match` whose `key` already appeared on at least
+    min_repeats matching events among the last window_events events.
+    """
+
+    def __init__(self, name, drift_type, match, key, window_events, min_repeats, describe, severity):
+        self.name = name
+        self.drift_type = drift_type
+        self.match = match
+        self.key = key
+        self.window_events = window_events
+        self.min_repeats = min_repeats
+        self.describe = describe
+        self.severity = severity
+
+    def compile(self, thresholds, active_minutes):
+        return _RepeatMatcher(self, thresholds)
+
+
+class _RepeatMatcher:
+    def __init__(self, rule, thresholds):
+        self.rule = rule
+        self.thresholds = thresholds
+        self.min_repeats = _limit(rule.min_repeats, thresholds)
+        self.recent = deque(maxlen=_limit(rule.window_events, thresholds))
+
+    def feed(self, event, previous_event):
+        rule = self.rule
+        drift = None
+        if rule.match(event):
+            key = event.get(rule.key)
+            earlier = [e for e in self.recent if e.get(rule.key) == key and rule.match(e)]
+            if len(earlier) >= self.min_repeats:
+                match = {"start": earlier[0]['timestamp'], "end": event['timestamp'], "key": key,
+                         "count": len(earlier) + 1, "tab_id": event['tab_id']}
+                match["duration"] = (match["end"] - match["start"]).total_seconds()
+                drift = _drift(rule, match, self.thresholds)
+        self.recent.append(event)
+        return drift
+
+
+def _focus_break_severity(match, thresholds):
+    if match["duration"] > thresholds.focus_break_high_seconds:
+        return 'HIGH'
+    return 'MEDIUM' if match["duration"] > thresholds.focus_break_medium_seconds else 'LOW'
+
+
+def _quick_drift_severity(match, thresholds):
+    return 'HIGH' if match["duration"] < thresholds.quick_drift_seconds else 'MEDIUM'
+
+
+RULES = [
+    SequenceRule(
+        'unproductive_shift', 'Unproductive Shift', FOCUS_CHANGE_EVENTS,
+        [Step(productive), Step(any_unproductive)],
+        describe=lambda m: (f"Shifted from productive to {m['events'][-1]['category']} domain: "
+                            f"{m['events'][-1]['domain_name']}"),
+        severity='LOW', span_from_previous_event=True,
+    ),
+    GapRule(
+        'idle', 'Idle / Away', 'idle_gap_seconds',
+        describe=lambda m: f"User idle for {int(m['duration'] / 60)} minutes",
+        severity='LOW',
+    ),
+    WindowCountRule(
+        'rapid_switching', 'Rapid Tab Switching', ('TAB_FOCUS',), RAPID_SWITCH_WINDOW_SECONDS, 'rapid_switch_count',
+        describe=lambda m: f"Rapidly switched between {m['count']} tabs in {m['window_seconds']} seconds",
+        severity='MODERATE',
+    ),
+    RepeatRule(
+        'unproductive_loop', 'Unproductive Loop', any_unproductive, 'domain_name', LOOP_WINDOW_EVENTS, LOOP_REVISITS,
+        describe=lambda m: f"Repeatedly visited {m['key']} ({m['count']} times)",
+        severity='MODERATE',
+    ),
+    SequenceRule(
+        'focus_break', 'FOCUS_BREAK', ('TAB_FOCUS',),
+        [Step(productive), Step(unproductive, within='focus_break_seconds'), Step(productive)],
+        describe=lambda m: f"Focus break for {m['duration']}s",
+        severity=_focus_break_severity, span_step=1,
+    ),
+    SequenceRule(
+        'task_abandonment', 'TASK_ABANDONMENT', ('TAB_FOCUS',),
+        [Step(productive, within='abandonment_seconds'), Step(unproductive)],
+        describe=lambda m: f"Abandoned productive task after {m['duration']}s",
+        severity=_quick_drift_severity,
+    ),
+    SequenceRule(
+        'search_to_unproductive', 'SEARCH_TO_UNPRODUCTIVE', FOCUS_CHANGE_EVENTS,
+        [Step(has_url_flag(URL_FLAG_SEARCH), within=SEARCH_DRIFT_SECONDS), Step(unproductive)],
+        describe=lambda m: f"Search to unproductive in {m['duration']}s",
+        severity=_quick_drift_severity,
+    ),
+]
+RULE_NAMES = [rule.name for rule in RULES]
+
+
+def _names_from_env(variable):
+    value = os.getenv(variable, '')
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def active_rules():
+    """RULES filtered by DRIFT_RULES / DRIFT_RULES_DISABLED."""
+    enabled = _names_from_env('DRIFT_RULES') or set(RULE_NAMES)
+    disabled = _names_from_env('DRIFT_RULES_DISABLED')
+    unknown = (enabled | disabled) - set(RULE_NAMES) - set(SQL_RULE_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown drift rules: {', '.join(sorted(unknown))}")
+    return [rule for rule in RULES if rule.name in enabled and rule.name not in disabled]
+
+
+def rule_enabled(name):
+    """Whether a rule, including those in SQL_RULE_NAMES, is active."""
+    enabled = _names_from_env('DRIFT_RULES')
+    return (not enabled or name in enabled) and name not in _names_from_env('DRIFT_RULES_DISABLED')
+
+
+class DriftEngine:
+    """
+    The active rules compiled for one session: feed() takes each event once,
+    in timestamp order, and returns the drifts it completes.
+    """
+
+    def __init__(self, thresholds=None, active_minutes=None, rules=None):
+        thresholds = thresholds or DEFAULT_THRESHOLDS
+        self.matchers = [rule.compile(thresholds, active_minutes)
+                         for rule in (active_rules() if rules is None else rules)]
+        self.last_event = None
+
+    @property
+    def last_event_time(self):
+        return self.last_event['timestamp'] if self.last_event else None
+
+    def feed(self, event):
+        drifts = []
+        for matcher in self.matchers:
+            drift = matcher.feed(event, self.last_event)
+            if drift is not None:
+                drifts.append(drift)
+        self.last_event = event
+        return drifts
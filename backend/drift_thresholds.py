@@ -0,0 +1,190 @@
+# backend/drift_thresholds.py
+"""
+Per-user drift thresholds from incrementally maintained quantile sketches.
+
+The ingest path (live_drift.py) measures two behaviours of every committed
+batch with a BehaviorObserver and merges them into the user's rows of
+user_behavior_sketch, in the batch's transaction:
+
+- focus_span: seconds spent on a tab before focus moved to another one
+- switch_rate: tab switches within the RAPID_SWITCH_WINDOW_SECONDS ending
+  at each switch
+
+load_thresholds reads those two KLL sketches and derives the user's idle
+gap, rapid-switch count, focus-break and abandonment limits and severity
+cutoffs from their quantiles, clamped to a range around the fixed defaults.
+Users with fewer than ADAPTIVE_MIN_SAMPLES observations of a behaviour keep
+the defaults for the limits derived from it. Baselines only grow while live
+detection is enabled.
+"""
+
+import math
+import os
+
+from sketches import KLLSketch
+
+ADAPTIVE_THRESHOLDS_ENABLED = os.getenv('ADAPTIVE_THRESHOLDS_ENABLED', '1') != '0'
+ADAPTIVE_MIN_SAMPLES = int(os.getenv('ADAPTIVE_MIN_SAMPLES', '200'))
+
+METRIC_FOCUS_SPAN = 'focus_span'
+METRIC_SWITCH_RATE = 'switch_rate'
+BEHAVIOR_METRICS = (METRIC_FOCUS_SPAN, METRIC_SWITCH_RATE)
+
+KLL_K = 200
+# Longer spans are idle time or a forgotten tab rather than focus
+MAX_FOCUS_SPAN_SECONDS = 3600
+
+# Default limits, used until a user has enough observations
+IDLE_GAP_SECONDS = 300
+RAPID_SWITCH_WINDOW_SECONDS = 30
+RAPID_SWITCH_COUNT = 5
+FOCUS_BREAK_SECONDS = 180
+ABANDONMENT_SECONDS = 60
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+class DriftThresholds:
+    """Limits used by the drift rules; the defaults are the original constants."""
+
+    def __init__(self, idle_gap_seconds=IDLE_GAP_SECONDS, rapid_switch_count=RAPID_SWITCH_COUNT,
+                 focus_break_seconds=FOCUS_BREAK_SECONDS, abandonment_seconds=ABANDONMENT_SECONDS,
+                 personalized=()):
+        self.idle_gap_seconds = idle_gap_seconds
+        self.rapid_switch_count = rapid_switch_count
+        # Unproductive visits between productive ones shorter than this are focus breaks
+        self.focus_break_seconds = focus_break_seconds
+        # Productive tabs left for an unproductive one within this are abandoned
+        self.abandonment_seconds = abandonment_seconds
+        self.personalized = tuple(personalized)
+
+    # Severity cutoffs scale with the limits: 60/120 s and 30 s by default
+    @property
+    def focus_break_medium_seconds(self):
+        return self.focus_break_seconds // 3
+
+    @property
+    def focus_break_high_seconds(self):
+        return 2 * self.focus_break_seconds // 3
+
+    @property
+    def quick_drift_seconds(self):
+        """Abandonment and search-to-unproductive drifts faster than this are HIGH."""
+        return self.abandonment_seconds // 2
+
+    def to_dict(self):
+        return {
+            "idle_gap_seconds": self.idle_gap_seconds,
+            "rapid_switch_count": self.rapid_switch_count,
+            "focus_break_seconds": self.focus_break_seconds,
+            "abandonment_seconds": self.abandonment_seconds,
+            "focus_break_medium_seconds": self.focus_break_medium_seconds,
+            "focus_break_high_seconds": self.focus_break_high_seconds,
+            "quick_drift_seconds": self.quick_drift_seconds,
+            "personalized": list(self.personalized),
+        }
+
+
+DEFAULT_THRESHOLDS = DriftThresholds()
+
+
+def thresholds_from_sketches(sketches):
+    """DriftThresholds from {metric: KLLSketch}; metrics with too few samples keep the defaults."""
+    values = {}
+    personalized = []
+
+    spans = sketches.get(METRIC_FOCUS_SPAN)
+    if spans is not None and spans.count >= ADAPTIVE_MIN_SAMPLES:
+        # A gap longer than nine in ten of the user's focus spans is idle, never less than the default
+        values["idle_gap_seconds"] = int(_clamp(spans.quantile(0.9), IDLE_GAP_SECONDS, 3 * IDLE_GAP_SECONDS))
+        # An unproductive visit shorter than the user's median span is a break, not a new task
+        values["focus_break_seconds"] = int(_clamp(spans.quantile(0.5), FOCUS_BREAK_SECONDS // 2,
+                                                   2 * FOCUS_BREAK_SECONDS))
+        # Leaving a productive tab faster than a quarter of the user's spans is abandonment
+        values["abandonment_seconds"] = int(_clamp(spans.quantile(0.25), ABANDONMENT_SECONDS // 2,
+                                                   2 * ABANDONMENT_SECONDS))
+        personalized.append(METRIC_FOCUS_SPAN)
+
+    switches = sketches.get(METRIC_SWITCH_RATE)
+    if switches is not None and switches.count >= ADAPTIVE_MIN_SAMPLES:
+        # Rapid switching is more switches per window than 95% of the user's switches saw
+        values["rapid_switch_count"] = int(_clamp(math.ceil(switches.quantile(0.95)) + 1,
+                                                  RAPID_SWITCH_COUNT - 2, 2 * RAPID_SWITCH_COUNT))
+        personalized.append(METRIC_SWITCH_RATE)
+
+    return DriftThresholds(personalized=personalized, **values)
+
+
+def load_sketches(cursor, user_id, for_update=False):
+    """{metric: KLLSketch} stored for user_id."""
+    cursor.execute(f"""
+        SELECT metric_name, sketch FROM user_behavior_sketch
+        WHERE user_id = %s{' FOR UPDATE' if for_update else ''}
+    """, (user_id,), query_name='drift_thresholds.load')
+    return {metric: KLLSketch.from_bytes(bytes(data)) for metric, data in cursor.fetchall()}
+
+
+def load_thresholds(cursor, user_id):
+    """The user's DriftThresholds (the defaults when adaptive thresholds are off)."""
+    if not ADAPTIVE_THRESHOLDS_ENABLED:
+        return DEFAULT_THRESHOLDS
+    return thresholds_from_sketches(load_sketches(cursor, user_id))
+
+
+class BehaviorObserver:
+    """
+    Measures focus spans and switch rates of one session's events, fed in
+    timestamp order like drift_rules.DriftEngine; drain() hands over the
+    observations made since the last call.
+    """
+
+    def __init__(self):
+        self.focus_started = None
+        self.recent_switches = []
+        self.pending = {metric: [] for metric in BEHAVIOR_METRICS}
+
+    def feed(self, event):
+        if event['event_type'] != 'TAB_FOCUS':
+            return
+        event_time = event['timestamp']
+        if self.focus_started is not None:
+            span = (event_time - self.focus_started).total_seconds()
+            if 0 <= span <= MAX_FOCUS_SPAN_SECONDS:
+                self.pending[METRIC_FOCUS_SPAN].append(span)
+        self.focus_started = event_time
+
+        self.recent_switches = [ts for ts in self.recent_switches
+                                if (event_time - ts).total_seconds() <= RAPID_SWITCH_WINDOW_SECONDS]
+        self.recent_switches.append(event_time)
+        self.pending[METRIC_SWITCH_RATE].append(len(self.recent_switches))
+
+    def drain(self):
+        pending = self.pending
+        self.pending = {metric: [] for metric in BEHAVIOR_METRICS}
+        return pending
+
+
+def record_observations(cursor, user_id, observations):
+    """
+    Merge {metric: [values]} into the user's stored sketches. The rows are
+    locked for the rest of the caller's transaction so concurrent sessions
+    of the same user do not overwrite each other's updates.
+    """
+    if not any(observations.values()):
+        return
+    sketches = load_sketches(cursor, user_id, for_update=True)
+    rows = []
+    for metric, values in observations.items():
+        if not values:
+            continue
+        sketch = sketches.get(metric) or KLLSketch(KLL_K)
+        for value in values:
+            sketch.add(value)
+        rows.append((user_id, metric, sketch.count, sketch.to_bytes()))
+    cursor.executemany("""
+        INSERT INTO user_behavior_sketch (user_id, metric_name, sample_count, sketch)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE sample_count = VALUES(sample_count), sketch = VALUES(sketch)
+    """, rows, query_name='drift_thresholds.store')
@@ -0,0 +1,171 @@
+# backend/drift_timeline.py
+"""
+Drift timeline aggregated in MySQL.
+
+Instead of shipping every drift_event row to the dashboard, the timeline
+endpoint returns count and total duration per (bucket, drift_type) for
+hour, day or week buckets. Every bucket of the period is present (zeros
+included), so the payload size depends only on the period and bucket size,
+never on how many drifts the user has. The period is aligned to bucket
+boundaries, so repeated requests within a bucket share a cache key; results
+are kept for TIMELINE_CACHE_SECONDS and served with an ETag.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from streaming import dumps
+
+TIMELINE_BUCKETS = ('auto', 'hour', 'day', 'week')
+# Periods with more buckets than this are rejected (fixed upper bound on payload size)
+TIMELINE_MAX_BUCKETS = int(os.getenv('TIMELINE_MAX_BUCKETS', '400'))
+TIMELINE_CACHE_SECONDS = float(os.getenv('TIMELINE_CACHE_SECONDS', '30'))
+TIMELINE_CACHE_SIZE = int(os.getenv('TIMELINE_CACHE_SIZE', '1000'))
+
+# bucket -> SQL expression mapping event_start to the bucket start
+BUCKET_EXPRESSIONS = {
+    'hour': "TIMESTAMP(DATE(de.event_start), MAKETIME(HOUR(de.event_start), 0, 0))",
+    'day': "TIMESTAMP(DATE(de.event_start))",
+    'week': "TIMESTAMP(DATE_SUB(DATE(de.event_start), INTERVAL WEEKDAY(de.event_start) DAY))",
+}
+BUCKET_STEPS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+# Longest period (in days) served at each bucket size by bucket=auto
+HOUR_BUCKET_MAX_DAYS = 2
+DAY_BUCKET_MAX_DAYS = 90
+
+
+def choose_bucket(period_days):
+    if period_days <= HOUR_BUCKET_MAX_DAYS:
+        return 'hour'
+    if period_days <= DAY_BUCKET_MAX_DAYS:
+        return 'day'
+    return 'week'
+
+
+def bucket_floor(bucket, moment):
+    """Start of the bucket containing moment (weeks start on Monday)."""
+    if bucket == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def timeline_period(bucket, period_days, now=None):
+    """
+    [start, end) covering the last period_days, aligned to whole buckets.
+    Raises ValueError when it would exceed TIMELINE_MAX_BUCKETS.
+    """
+    now = now or datetime.now()
+    step = BUCKET_STEPS[bucket]
+    # Checked before any date arithmetic, which overflows for huge period_days
+    if period_days > TIMELINE_MAX_BUCKETS * (step / timedelta(days=1)):
+        raise ValueError(f"{period_days} days of {bucket} buckets exceeds {TIMELINE_MAX_BUCKETS} buckets")
+    end = bucket_floor(bucket, now) + step
+    start = bucket_floor(bucket, now - timedelta(days=period_days))
+    if (end - start) // step > TIMELINE_MAX_BUCKETS:
+        raise ValueError(f"{period_days} days of {bucket} buckets exceeds {TIMELINE_MAX_BUCKETS} buckets")
+    return start, end
+
+
+def timeline_query(bucket):
+    """Aggregate query taking (user_id, start, end)."""
+    return f"""
+        SELECT {BUCKET_EXPRESSIONS[bucket]} AS bucket_start, de.drift_type,
+               COUNT(*) AS drift_count, COALESCE(SUM(de.duration_seconds), 0) AS total_seconds
+        FROM drift_event de
+        JOIN sessions s ON de.session_id = s.sid
+        WHERE s.user_id = %s AND de.event_start >= %s AND de.event_start < %s
+        GROUP BY bucket_start, de.drift_type
+    """
+
+
+def build_timeline(rows, bucket, start, end):
+    """
+    Dense timeline payload from (bucket_start, drift_type, count, seconds) rows.
+
+    points has one entry per bucket with `<type>_count` and
+    `<type>_duration` keys for every drift type seen in the period.
+    """
+    step = BUCKET_STEPS[bucket]
+    drift_types = sorted({row[1] or 'Unknown' for row in rows})
+    points = OrderedDict()
+    moment = start
+    while moment < end:
+        point = {"bucket_start": moment}
+        for drift_type in drift_types:
+            point[f"{drift_type}_count"] = 0
+            point[f"{drift_type}_duration"] = 0
+        points[moment] = point
+        moment += step
+
+    totals = {drift_type: {"count": 0, "duration": 0} for drift_type in drift_types}
+    for bucket_start, drift_type, drift_count, total_seconds in rows:
+        drift_type = drift_type or 'Unknown'
+        point = points.get(bucket_start)
+        if point is None:
+            continue
+        point[f"{drift_type}_count"] += int(drift_count)
+        point[f"{drift_type}_duration"] += int(total_seconds)
+        totals[drift_type]["count"] += int(drift_count)
+        totals[drift_type]["duration"] += int(total_seconds)
+
+    return {
+        "bucket": bucket,
+        "period_start": start,
+        "period_end": end,
+        "drift_types": drift_types,
+        "totals": totals,
+        "points": list(points.values()),
+    }
+
+
+# (user_id, bucket, start) -> (expires_at, body, etag)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_timeline(conn_factory, user_id, bucket, period_days):
+    """
+    Serialized timeline and its ETag for the user, from the cache when fresh.
+
+    conn_factory is called for a connection only on a cache miss.
+    """
+    start, end = timeline_period(bucket, period_days)
+    key = (user_id, bucket, start)
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] > now:
+            _cache.move_to_end(key)
+            return entry[1], entry[2]
+
+    conn = conn_factory()
+    if conn is None:
+        raise ConnectionError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        cursor.execute(timeline_query(bucket), (user_id, start, end), query_name=f'timeline.{bucket}')
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    body = dumps(build_timeline(rows, bucket, start, end))
+    etag = '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"'
+    with _cache_lock:
+        _cache[key] = (now + TIMELINE_CACHE_SECONDS, body, etag)
+        _cache.move_to_end(key)
+        while len(_cache) > TIMELINE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return body, etag
@@ -0,0 +1,153 @@
+# backend/event_rollup.py
+"""
+Ingest-time compaction of high-frequency interaction events.
+
+MOUSE_MOVE and SCROLL events arrive up to once per second per tab and are
+only needed for "is the user active on this tab" signal. They are folded
+into per-(tab, minute) rows of tab_minute_engagement as batches arrive, and
+the raw rows are purged once they fall outside RAW_EVENT_RETENTION_HOURS.
+
+A bucket records the seconds of its minute that saw interaction as a
+60-bit mask, so a second that appears in two batches (e.g. a batch boundary
+falling inside it) is counted once in active_seconds.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+# Raw rows of these types are only kept within the retention window
+HIGH_FREQUENCY_EVENT_TYPES = ('MOUSE_MOVE', 'SCROLL')
+
+# Interaction events counted into the engagement buckets
+ENGAGEMENT_EVENT_TYPES = HIGH_FREQUENCY_EVENT_TYPES + ('CLICK',)
+
+RAW_EVENT_RETENTION_HOURS = int(os.getenv('RAW_EVENT_RETENTION_HOURS', '48'))
+
+
+def _bucket_start(ts):
+    return ts.replace(second=0, microsecond=0, tzinfo=None)
+
+
+def build_engagement_buckets(session_id, user_id, events):
+    """Fold a batch of ActivityEvent models into per-(tab, minute) buckets."""
+    buckets = {}
+    for event in events:
+        if event.event_type not in ENGAGEMENT_EVENT_TYPES:
+            continue
+        key = (event.tab_id, _bucket_start(event.timestamp))
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = {
+                "move_count": 0,
+                "scroll_count": 0,
+                "click_count": 0,
+                "max_scroll_percent": None,
+                "second_mask": 0,
+            }
+            buckets[key] = bucket
+
+        if event.event_type == 'MOUSE_MOVE':
+            bucket["move_count"] += 1
+        elif event.event_type == 'SCROLL':
+            bucket["scroll_count"] += 1
+            if event.scroll_y_percent is not None:
+                if bucket["max_scroll_percent"] is None or event.scroll_y_percent > bucket["max_scroll_percent"]:
+                    bucket["max_scroll_percent"] = event.scroll_y_percent
+        else:
+            bucket["click_count"] += 1
+        bucket["second_mask"] |= 1 << event.timestamp.second
+
+    rows = []
+    for (tab_id, bucket_start), bucket in buckets.items():
+        rows.append((
+            tab_id,
+            bucket_start,
+            session_id,
+            user_id,
+            bucket["move_count"],
+            bucket["scroll_count"],
+            bucket["click_count"],
+            bucket["max_scroll_percent"],
+            bucket["second_mask"],
+            bucket["second_mask"].bit_count(),
+        ))
+    return rows
+
+
+def upsert_engagement_buckets(cursor, rows):
+    """Merge bucket rows into tab_minute_engagement, OR-ing the second masks."""
+    if not rows:
+        return 0
+    # Assignments apply in order, so BIT_COUNT sees the merged mask
+    query = """
+        INSERT INTO tab_minute_engagement (
+            tab_id, bucket_start, session_id, user_id,
+            move_count, scroll_count, click_count, max_scroll_percent,
+            active_second_mask, active_seconds
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            move_count = move_count + VALUES(move_count),
+            scroll_count = scroll_count + VALUES(scroll_count),
+            click_count = click_count + VALUES(click_count),
+            max_scroll_percent = GREATEST(
+                COALESCE(max_scroll_percent, VALUES(max_scroll_percent)),
+                COALESCE(VALUES(max_scroll_percent), max_scroll_percent)
+            ),
+            active_second_mask = active_second_mask | VALUES(active_second_mask),
+            active_seconds = BIT_COUNT(active_second_mask)
+    """
+    cursor.executemany(query, rows)
+    return len(rows)
+
+
+def get_active_minutes(cursor, session_id):
+    """Return the set of minute buckets in which the session had any interaction."""
+    cursor.execute(
+        """
+        SELECT DISTINCT bucket_start
+        FROM tab_minute_engagement
+        WHERE session_id = %s AND active_seconds > 0
+        """,
+        (session_id,),
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def had_activity_between(active_minutes, start, end):
+    """True if any engagement bucket falls strictly inside (start, end)."""
+    if not active_minutes:
+        return False
+    first = _bucket_start(start) + timedelta(minutes=1)
+    last = _bucket_start(end)
+    return any(first <= minute < last for minute in active_minutes)
+
+
+def purge_expired_raw_events(conn, retention_hours=RAW_EVENT_RETENTION_HOURS,
+                             batch_size=5000, pause_seconds=0.1):
+    """Delete raw high-frequency rows older than the retention window in small batches."""
+    cutoff = datetime.now() - timedelta(hours=retention_hours)
+    placeholders = ', '.join(['%s'] * len(HIGH_FREQUENCY_EVENT_TYPES))
+    cursor = conn.cursor()
+    total_deleted = 0
+    try:
+        while True:
+            cursor.execute(
+                f"""
+                DELETE FROM activity_event
+                WHERE event_type IN ({placeholders})
+                AND timestamp < %s
+                LIMIT %s
+                """,
+                (*HIGH_FREQUENCY_EVENT_TYPES, cutoff, batch_size),
+            )
+            deleted = cursor.rowcount
+            conn.commit()
+            total_deleted += deleted
+            if deleted < batch_size:
+                break
+            # Give ingest a chance at the locks between batches
+            time.sleep(pause_seconds)
+    finally:
+        cursor.close()
+    return total_deleted
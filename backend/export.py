@@ -0,0 +1,215 @@
+# backend/export.py
+"""
+Bulk export of activity_event, tab and drift_event history.
+
+Rows are read in keyset-paginated chunks (WHERE key > last_key ORDER BY key
+LIMIT n), so every chunk is a short index range scan and no long-running
+cursor or transaction is held. Between chunks the export sleeps in
+proportion to the time the chunk query took (EXPORT_DUTY_CYCLE) and at most
+EXPORT_MAX_CONCURRENT exports run at once, so exports can't starve ingest.
+
+Output is NDJSON, or Parquet with one row group per chunk when pyarrow is
+installed.
+"""
+
+import io
+import os
+import threading
+import time
+
+from streaming import ConnectionStream, dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '5000'))
+EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', '2'))
+# Fraction of wall time an export may spend querying; 0.5 sleeps as long as each chunk took
+EXPORT_DUTY_CYCLE = float(os.getenv('EXPORT_DUTY_CYCLE', '0.5'))
+
+export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+# resource -> query parts. Columns are (name, parquet type).
+EXPORT_RESOURCES = {
+    'events': {
+        'key': 'ae.event_id',
+        'time': 'ae.timestamp',
+        'type': 'ae.event_type',
+        'user': 'ae.user_id',
+        'select': """
+            SELECT ae.event_id, ae.session_id, ae.user_id, ae.tab_id, ae.event_type, ae.timestamp,
+                   COALESCE(ae.url, ud.url) AS url, COALESCE(ud.url_flags, 0) AS url_flags,
+                   ae.mouse_x, ae.mouse_y, ae.scroll_y_pixels, ae.scroll_y_percent,
+                   COALESCE(ae.target_element_id, ed.element_value) AS target_element_id,
+                   d.domain_name, d.category
+            FROM activity_event ae
+            JOIN tab t ON ae.tab_id = t.tid
+            JOIN domains d ON t.domain_id = d.id
+            LEFT JOIN url_dict ud ON ae.url_id = ud.url_id
+            LEFT JOIN element_dict ed ON ae.target_element_ref = ed.element_id
+        """,
+        'columns': [
+            ('event_id', 'int64'), ('session_id', 'int64'), ('user_id', 'int64'), ('tab_id', 'int64'),
+            ('event_type', 'string'), ('timestamp', 'timestamp'), ('url', 'string'), ('url_flags', 'int64'),
+            ('mouse_x', 'int64'), ('mouse_y', 'int64'), ('scroll_y_pixels', 'int64'),
+            ('scroll_y_percent', 'float64'), ('target_element_id', 'string'),
+            ('domain_name', 'string'), ('category', 'string'),
+        ],
+    },
+    'tabs': {
+        'key': 't.tid',
+        'time': 't.opened_at',
+        'type': None,
+        'user': 's.user_id',
+        'select': """
+            SELECT t.tid, t.session_id, s.user_id, t.domain_id, d.domain_name, d.category,
+                   t.url, t.title, t.is_active, t.opened_at, t.closed_at
+            FROM tab t
+            JOIN sessions s ON t.session_id = s.sid
+            JOIN domains d ON t.domain_id = d.id
+        """,
+        'columns': [
+            ('tid', 'int64'), ('session_id', 'int64'), ('user_id', 'int64'), ('domain_id', 'int64'),
+            ('domain_name', 'string'), ('category', 'string'), ('url', 'string'), ('title', 'string'),
+            ('is_active', 'int64'), ('opened_at', 'timestamp'), ('closed_at', 'timestamp'),
+        ],
+    },
+    'drifts': {
+        'key': 'de.drift_id',
+        'time': 'de.event_start',
+        'type': 'de.drift_type',
+        'user': 's.user_id',
+        'select': """
+            SELECT de.drift_id, de.session_id, s.user_id, de.drift_type, de.description, de.severity,
+                   de.event_start, de.event_end, de.duration_seconds
+            FROM drift_event de
+            JOIN sessions s ON de.session_id = s.sid
+        """,
+        'columns': [
+            ('drift_id', 'int64'), ('session_id', 'int64'), ('user_id', 'int64'), ('drift_type', 'string'),
+            ('description', 'string'), ('severity', 'string'), ('event_start', 'timestamp'),
+            ('event_end', 'timestamp'), ('duration_seconds', 'int64'),
+        ],
+    },
+}
+
+
+def parquet_available():
+    return pq is not None
+
+
+def build_chunk_query(resource, user_id=None, start=None, end=None, types=None):
+    """Return (sql, params) for one chunk; the caller appends (after_id, limit)."""
+    spec = EXPORT_RESOURCES[resource]
+    conditions = []
+    params = []
+    if user_id is not None:
+        conditions.append(f"{spec['user']} = %s")
+        params.append(user_id)
+    if start is not None:
+        conditions.append(f"{spec['time']} >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append(f"{spec['time']} < %s")
+        params.append(end)
+    if types and spec['type']:
+        conditions.append(f"{spec['type']} IN ({', '.join(['%s'] * len(types))})")
+        params.extend(types)
+    conditions.append(f"{spec['key']} > %s")
+    sql = spec['select'] + " WHERE " + " AND ".join(conditions) + f" ORDER BY {spec['key']} LIMIT %s"
+    return sql, params
+
+
+def iter_export_chunks(conn, resource, user_id=None, start=None, end=None, types=None,
+                       after_id=0, limit=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield (columns, rows) chunks in key order, throttling between chunks."""
+    sql, params = build_chunk_query(resource, user_id, start, end, types)
+    remaining = limit
+    last_id = after_id
+    cursor = conn.cursor()
+    try:
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            started = time.perf_counter()
+            cursor.execute(sql, tuple(params) + (last_id, size), query_name=f"export.{resource}")
+            rows = cursor.fetchall()
+            elapsed = time.perf_counter() - started
+            if not rows:
+                break
+            columns = [desc[0] for desc in cursor.description]
+            yield columns, rows
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                break
+            # Back off so the export uses at most EXPORT_DUTY_CYCLE of the database's time
+            if 0 < EXPORT_DUTY_CYCLE < 1:
+                time.sleep(elapsed * (1 - EXPORT_DUTY_CYCLE) / EXPORT_DUTY_CYCLE)
+    finally:
+        cursor.close()
+
+
+def ndjson_export(chunks):
+    for columns, rows in chunks:
+        yield ''.join(dumps(dict(zip(columns, row))) + '\n' for row in rows).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every row group."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_schema(resource):
+    types = {
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'string': pa.string(),
+        'timestamp': pa.timestamp('ms'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_RESOURCES[resource]['columns']])
+
+
+def parquet_export(resource, chunks):
+    """Encode chunks as a Parquet file, one row group per chunk, streaming bytes as they are produced."""
+    schema = _parquet_schema(resource)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for columns, rows in chunks:
+            data = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+class ExportStream(ConnectionStream):
+    """Response body that owns an export's connection and slot (see ConnectionStream)."""
+
+    def __init__(self, body, conn):
+        super().__init__(body, conn, release=export_slots.release)
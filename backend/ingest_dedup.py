@@ -0,0 +1,136 @@
+# backend/ingest_dedup.py
+"""
+Idempotent event batch ingest.
+
+The extension tags every batch with a client-generated batch_id and keeps
+resending it, unchanged, until the API acknowledges it. If a response is
+lost after the server committed, the retry must not insert the events a
+second time: activity_event has no natural key, so duplicates would
+inflate focus time, total_events and drift counts.
+
+The API claims (user_id, batch_id) in ingest_batch inside the batch's own
+transaction, before inserting the events. A retry of a committed batch
+finds the claim taken and is acknowledged without writing anything; a
+retry arriving while the first attempt is still running waits on the row
+lock and then sees the claim, or takes it if that attempt rolled back.
+Batches seen by this process are also kept in a bounded in-memory index,
+so most retries are answered without touching the database.
+
+Claims expire after INGEST_DEDUP_TTL_HOURS (purged by
+jobs/run_event_compaction.py); a batch retried later than that would be
+inserted again.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import metrics
+
+INGEST_DEDUP_TTL_HOURS = int(os.getenv('INGEST_DEDUP_TTL_HOURS', '24'))
+INGEST_DEDUP_CACHE_SIZE = int(os.getenv('INGEST_DEDUP_CACHE_SIZE', '100000'))
+
+
+class SeenBatches:
+    """Bounded, expiring set of (user_id, batch_id) keys committed by this process."""
+
+    def __init__(self, max_size=INGEST_DEDUP_CACHE_SIZE, ttl_seconds=INGEST_DEDUP_TTL_HOURS * 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            seen_at = self._items.get(key)
+            if seen_at is None:
+                return False
+            if time.monotonic() - seen_at > self.ttl_seconds:
+                del self._items[key]
+                return False
+            return True
+
+    def add(self, key):
+        with self._lock:
+            self._items[key] = time.monotonic()
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+seen_batches = SeenBatches()
+
+_duplicates = metrics.counter('ddt_ingest_duplicate_batches_total',
+                              'Retried event batches acknowledged without inserting', ('source',))
+metrics.gauge('ddt_ingest_seen_batches', 'Batch ids held in the in-memory dedup index').set_function(
+    seen_batches.__len__)
+
+
+def dedupe_events(events):
+    """Drop events repeating a seq number already present in the batch (events without seq are kept)."""
+    seen = set()
+    unique = []
+    for event in events:
+        if event.seq is not None:
+            if event.seq in seen:
+                continue
+            seen.add(event.seq)
+        unique.append(event)
+    return unique
+
+
+def already_ingested(user_id, batch_id):
+    """True when this process has committed the batch before."""
+    if batch_id is not None and (user_id, batch_id) in seen_batches:
+        _duplicates.inc(source='memory')
+        return True
+    return False
+
+
+def claim_batch(cursor, user_id, batch_id, session_id, events):
+    """
+    Record the batch in ingest_batch within the caller's transaction.
+    Returns False when the batch was already ingested, in which case the
+    caller should roll back and acknowledge it.
+    """
+    seqs = [event.seq for event in events if event.seq is not None]
+    cursor.execute("""
+        INSERT IGNORE INTO ingest_batch (user_id, batch_id, session_id, event_count, first_seq, last_seq)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (user_id, batch_id, session_id, len(events), min(seqs, default=None), max(seqs, default=None)),
+        query_name='ingest.claim_batch')
+    if cursor.rowcount == 0:
+        _duplicates.inc(source='database')
+        seen_batches.add((user_id, batch_id))
+        return False
+    return True
+
+
+def mark_ingested(user_id, batch_id):
+    """Remember a committed batch in the in-memory index."""
+    if batch_id is not None:
+        seen_batches.add((user_id, batch_id))
+
+
+def purge_expired_batches(conn, ttl_hours=INGEST_DEDUP_TTL_HOURS, batch_size=5000):
+    """Delete ingest_batch claims older than the TTL in small batches."""
+    cutoff = datetime.now() - timedelta(hours=ttl_hours)
+    cursor = conn.cursor()
+    total_deleted = 0
+    try:
+        while True:
+            cursor.execute("DELETE FROM ingest_batch WHERE received_at < %s LIMIT %s",
+                           (cutoff, batch_size), query_name='ingest.purge_batches')
+            deleted = cursor.rowcount
+            conn.commit()
+            total_deleted += deleted
+            if deleted < batch_size:
+                break
+    finally:
+        cursor.close()
+    return total_deleted
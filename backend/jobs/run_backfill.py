@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Backfill Job
+
+Recomputes drift_event and/or daily_domain_summary for a date range after
+a detector or summary change, partitioned by (user, day) across a pool of
+worker processes (see backfill.py). Every committed partition is appended
+to a checkpoint file, so an interrupted run continues where it stopped
+with --resume. When summaries were recomputed, the weekly/monthly rollups
+and admin statistic sketches of the range are refreshed at the end.
+
+Summaries of days whose raw MOUSE_MOVE / SCROLL rows were already purged
+(older than RAW_EVENT_RETENTION_HOURS) would lose those events' counts and
+durations, so such days are skipped unless --include-compacted is given.
+"""
+
+import sys
+import os
+import json
+import time
+from datetime import date, timedelta
+from multiprocessing import Pool
+
+# Add parent directory to path to import database module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection, INTENT_READ
+from backfill import Throttle, backfill_daily_summary, backfill_drifts, compacted_before, list_partitions
+from rollups import refresh_rollups
+from stat_sketches import build_daily_sketches
+import profiling
+
+DEFAULT_CHECKPOINT = 'backfill_checkpoint.jsonl'
+
+# Per-process state of pool workers
+_worker = {}
+
+
+def _init_worker(drifts, summaries, summary_start):
+    _worker.update(conn=None, throttle=Throttle(), drifts=drifts, summaries=summaries, summary_start=summary_start)
+
+
+def _worker_connection():
+    conn = _worker.get('conn')
+    if conn is None or not conn.is_connected():
+        conn = get_db_connection()
+        if conn is None:
+            raise RuntimeError("Database connection failed")
+        _worker['conn'] = conn
+    return conn
+
+
+def run_partition(partition):
+    """Recompute one (user_id, day) partition in its own transaction; returns a result dict."""
+    user_id, day = partition
+    result = {"user_id": user_id, "day": day.isoformat(), "drifts_removed": 0, "drifts_inserted": 0,
+              "summary_domains": None, "error": None}
+    throttle = _worker['throttle']
+    try:
+        conn = _worker_connection()
+        throttle.wait_for_capacity(conn)
+        started = time.perf_counter()
+        try:
+            if _worker['drifts']:
+                with profiling.phase('backfill_drifts'):
+                    result["drifts_removed"], result["drifts_inserted"] = backfill_drifts(conn, user_id, day)
+            if _worker['summaries'] and day >= _worker['summary_start']:
+                with profiling.phase('backfill_daily_summary'):
+                    result["summary_domains"] = backfill_daily_summary(conn, user_id, day)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        throttle.rest_after(time.perf_counter() - started)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def read_checkpoint(path):
+    """(user_id, day) pairs recorded as done in a checkpoint file."""
+    done = set()
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                done.add((entry["user_id"], date.fromisoformat(entry["day"])))
+    return done
+
+
+def refresh_derived(start_date, end_date, user_id=None):
+    """Rollups and stat sketches over the recomputed summaries."""
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        with profiling.phase('refresh_rollups'):
+            refresh_rollups(cursor, start_date, end_date, user_id=user_id)
+        conn.commit()
+        day = start_date
+        while day <= end_date:
+            with profiling.phase('build_daily_sketches'):
+                build_daily_sketches(cursor, day)
+            conn.commit()
+            day += timedelta(days=1)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_backfill(start_date: date, end_date: date, user_id: int | None = None, drifts: bool = True,
+                 summaries: bool = True, workers: int = 4, checkpoint: str = DEFAULT_CHECKPOINT,
+                 resume: bool = False, include_compacted: bool = False) -> None:
+    if os.path.exists(checkpoint) and not resume:
+        print(f"ERROR: Checkpoint {checkpoint} exists; pass --resume to continue that run or remove it")
+        sys.exit(1)
+
+    with profiling.phase('list_partitions'):
+        conn = get_db_connection(INTENT_READ)
+        if conn is None:
+            print("ERROR: Database connection failed")
+            sys.exit(1)
+        cursor = conn.cursor()
+        try:
+            partitions = list_partitions(cursor, start_date, end_date, user_id)
+        finally:
+            cursor.close()
+            conn.close()
+
+    done = read_checkpoint(checkpoint) if resume and os.path.exists(checkpoint) else set()
+    pending = [partition for partition in partitions if partition not in done]
+    summary_start = start_date if include_compacted else max(start_date, compacted_before())
+    if summaries and summary_start > start_date:
+        print(f"Summaries before {summary_start} are skipped: their raw mouse/scroll events were purged "
+              f"(use --include-compacted to recompute them anyway)")
+    print(f"Backfilling {len(pending)} of {len(partitions)} (user, day) partitions "
+          f"from {start_date} to {end_date} with {workers} worker(s)...")
+
+    failed = 0
+    totals = {"drifts_removed": 0, "drifts_inserted": 0, "summary_domains": 0}
+    started = time.perf_counter()
+    init_args = (drifts, summaries, summary_start)
+    with open(checkpoint, 'a') as checkpoint_file:
+        if workers == 1:
+            # In-process, so --profile covers the partitions
+            _init_worker(*init_args)
+            results = map(run_partition, pending)
+            pool = None
+        else:
+            pool = Pool(workers, initializer=_init_worker, initargs=init_args)
+            results = pool.imap_unordered(run_partition, pending)
+        try:
+            for index, result in enumerate(results, 1):
+                if result["error"]:
+                    failed += 1
+                    print(f"  user {result['user_id']} {result['day']}: ERROR {result['error']}")
+                    continue
+                checkpoint_file.write(json.dumps(result) + '\n')
+                checkpoint_file.flush()
+                for key in totals:
+                    totals[key] += result[key] or 0
+                if index % 100 == 0 or index == len(pending):
+                    elapsed = time.perf_counter() - started
+                    print(f"  {index}/{len(pending)} partitions, {index / elapsed:.1f}/s")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    print(f"Drifts: {totals['drifts_removed']} removed, {totals['drifts_inserted']} inserted; "
+          f"summary rows for {totals['summary_domains']} (domain, day) pairs")
+    if summaries and summary_start <= end_date:
+        print("Refreshing rollups and stat sketches...")
+        try:
+            refresh_derived(summary_start, end_date, user_id)
+        except Exception as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+    if failed:
+        print(f"ERROR: {failed} partition(s) failed; re-run with --resume to retry them")
+        sys.exit(1)
+    print(f"[OK] Backfill complete for {start_date}..{end_date}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Recompute drifts and daily summaries for past days.')
+    parser.add_argument('--start', type=str, required=True, help='First date (YYYY-MM-DD).')
+    parser.add_argument('--end', type=str, help='Last date (YYYY-MM-DD). Defaults to yesterday.')
+    parser.add_argument('--user', type=int, help='Only backfill this user.')
+    parser.add_argument('--only', choices=['drifts', 'summaries'], help='Recompute only drifts or only summaries.')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes (default 4).')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                        help=f'File recording finished partitions (default {DEFAULT_CHECKPOINT}).')
+    parser.add_argument('--resume', action='store_true', help='Skip partitions already in the checkpoint file.')
+    parser.add_argument('--include-compacted', action='store_true',
+                        help='Also recompute summaries of days whose raw mouse/scroll events were purged.')
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    try:
+        arg_start = date.fromisoformat(args.start)
+        arg_end = date.fromisoformat(args.end) if args.end else date.today() - timedelta(days=1)
+    except ValueError:
+        print("Invalid date format. Use YYYY-MM-DD")
+        sys.exit(1)
+    if arg_end < arg_start:
+        print("--end must not be before --start")
+        sys.exit(1)
+    if args.workers <= 0:
+        print("--workers must be positive")
+        sys.exit(1)
+
+    run_backfill(arg_start, arg_end, user_id=args.user, drifts=args.only != 'summaries',
+                 summaries=args.only != 'drifts', workers=args.workers, checkpoint=args.checkpoint,
+                 resume=args.resume, include_compacted=args.include_compacted)
+    profiling.finish()
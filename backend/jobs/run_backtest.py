@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Drift Backtest
+
+Replays recorded event corpora through the drift rules entirely in memory
+and reports drift counts by type and severity, event throughput and, given
+a baseline, the change per drift type. Nothing is read from or written to
+the database, so detector changes can be checked before they are deployed.
+
+A corpus is one or more exports of GET /api/export/events: NDJSON (plain or
+.gz) or Parquet (requires pyarrow). Each file is a shard replayed by one
+worker process; sessions are grouped and ordered within a file, so a
+session must not be split across files (export per user, or cut date
+ranges at quiet hours). Idle gaps are confirmed against engagement minutes
+derived from the corpus's own MOUSE_MOVE / SCROLL / CLICK rows. The
+cross-session drift trigger analysis is not replayed.
+"""
+
+import sys
+import os
+import gzip
+import json
+import time
+from collections import Counter
+from datetime import datetime
+from multiprocessing import Pool
+
+# Add parent directory to path to import backend modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drift_rules import DriftEngine, RULES, RULE_NAMES, active_rules
+from drift_thresholds import DriftThresholds
+from event_rollup import ENGAGEMENT_EVENT_TYPES
+import profiling
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet corpora are optional
+    pq = None
+
+CORPUS_COLUMNS = ('event_id', 'session_id', 'tab_id', 'event_type', 'timestamp',
+                  'domain_name', 'category', 'url_flags')
+PARQUET_BATCH_ROWS = 65536
+# DriftThresholds limits that --threshold can override; severity cutoffs follow them
+TUNABLE_THRESHOLDS = ('idle_gap_seconds', 'rapid_switch_count', 'focus_break_seconds', 'abandonment_seconds')
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+
+def iter_rows(path, columns=None):
+    """Yield dict rows of an NDJSON (optionally gzipped) or Parquet file."""
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError(f"{path}: reading Parquet requires pyarrow to be installed")
+        parquet_file = pq.ParquetFile(path)
+        names = set(parquet_file.schema_arrow.names)
+        selected = [c for c in columns if c in names] if columns else None
+        for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_ROWS, columns=selected):
+            yield from batch.to_pylist()
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_sessions(path):
+    """
+    Group a corpus file into {session_id: (events, active_minutes)} with
+    each session's events in timestamp order.
+    """
+    sessions = {}
+    for row in iter_rows(path, CORPUS_COLUMNS):
+        ts = _timestamp(row['timestamp'])
+        events, active_minutes = sessions.setdefault(row['session_id'], ([], set()))
+        if row['event_type'] in ENGAGEMENT_EVENT_TYPES:
+            active_minutes.add(ts.replace(second=0, microsecond=0))
+        events.append({
+            "event_id": row.get('event_id') or 0, "timestamp": ts, "event_type": row['event_type'],
+            "tab_id": row.get('tab_id'), "domain_name": row.get('domain_name'),
+            "category": row.get('category'), "url_flags": row.get('url_flags') or 0,
+        })
+    for events, _ in sessions.values():
+        events.sort(key=lambda e: (e['timestamp'], e['event_id']))
+    return sessions
+
+
+def backtest_shard(task):
+    """Replay one corpus file; returns a picklable summary."""
+    path, threshold_values, rule_names = task
+    thresholds = DriftThresholds(**threshold_values)
+    rules = [rule for rule in RULES if rule.name in rule_names]
+
+    started = time.perf_counter()
+    with profiling.phase('load_corpus'):
+        sessions = load_sessions(path)
+    load_seconds = time.perf_counter() - started
+
+    drift_counts = Counter()
+    severity_counts = Counter()
+    event_count = 0
+    started = time.perf_counter()
+    for events, active_minutes in sessions.values():
+        with profiling.phase('rule_engine', events=len(events)):
+            engine = DriftEngine(thresholds, active_minutes, rules)
+            for event in events:
+                for drift in engine.feed(event):
+                    drift_counts[drift['drift_type']] += 1
+                    severity_counts[f"{drift['drift_type']}:{drift['severity']}"] += 1
+        event_count += len(events)
+    detect_seconds = time.perf_counter() - started
+
+    return {
+        "path": path,
+        "sessions": len(sessions),
+        "events": event_count,
+        "load_seconds": load_seconds,
+        "detect_seconds": detect_seconds,
+        "drift_counts": dict(drift_counts),
+        "severity_counts": dict(severity_counts),
+    }
+
+
+def load_baseline(path):
+    """Drift counts by type from an earlier --out report or a drifts export."""
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            return json.load(f)["drift_counts"]
+    return dict(Counter(row['drift_type'] for row in iter_rows(path, ('drift_type',))))
+
+
+def diff_counts(baseline, current):
+    """{drift_type: {baseline, current, change, change_pct}} over both sides' types."""
+    diff = {}
+    for drift_type in sorted(baseline.keys() | current.keys()):
+        before, after = baseline.get(drift_type, 0), current.get(drift_type, 0)
+        diff[drift_type] = {
+            "baseline": before,
+            "current": after,
+            "change": after - before,
+            "change_pct": round(100.0 * (after - before) / before, 2) if before else None,
+        }
+    return diff
+
+
+def print_report(report):
+    print()
+    print(f"Sessions: {report['sessions']:,}   Events: {report['events']:,}   "
+          f"Shards: {len(report['shards'])}   Workers: {report['workers']}")
+    print(f"Wall time: {report['wall_seconds']:.2f}s ({report['events_per_second']:,.0f} events/s); "
+          f"detection only: {report['detect_events_per_second']:,.0f} events/s per worker")
+    print()
+    print(f"{'drift type':<28}{'count':>10}  severities")
+    for drift_type, count in sorted(report['drift_counts'].items(), key=lambda item: -item[1]):
+        severities = ', '.join(f"{key.split(':', 1)[1]} {n}" for key, n in sorted(report['severity_counts'].items())
+                               if key.split(':', 1)[0] == drift_type)
+        print(f"{drift_type:<28}{count:>10}  {severities}")
+
+    if report.get('baseline_diff') is not None:
+        print()
+        print(f"{'vs baseline':<28}{'baseline':>10}{'current':>10}{'change':>10}{'change %':>10}")
+        for drift_type, row in report['baseline_diff'].items():
+            pct = f"{row['change_pct']:+.1f}" if row['change_pct'] is not None else 'new'
+            print(f"{drift_type:<28}{row['baseline']:>10}{row['current']:>10}{row['change']:>+10}{pct:>10}")
+
+
+def run_backtest(paths, workers=None, threshold_values=None, rule_names=None,
+                 baseline=None, out=None, max_change_pct=None):
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        print(f"ERROR: Corpus file(s) not found: {', '.join(missing)}")
+        sys.exit(1)
+    threshold_values = threshold_values or {}
+    if rule_names is None:
+        rule_names = [rule.name for rule in active_rules()]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+    tasks = [(path, threshold_values, rule_names) for path in paths]
+
+    print(f"Backtesting {len(paths)} shard(s) with {workers} worker(s); rules: {', '.join(rule_names)}")
+    started = time.perf_counter()
+    try:
+        if workers == 1:
+            # In-process, so --profile and the profiling outputs cover the detectors
+            summaries = [backtest_shard(task) for task in tasks]
+        else:
+            with Pool(workers) as pool:
+                summaries = []
+                for summary in pool.imap_unordered(backtest_shard, tasks):
+                    print(f"  {summary['path']}: {summary['events']:,} events, "
+                          f"{sum(summary['drift_counts'].values()):,} drifts")
+                    summaries.append(summary)
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    wall_seconds = time.perf_counter() - started
+
+    drift_counts = Counter()
+    severity_counts = Counter()
+    for summary in summaries:
+        drift_counts.update(summary['drift_counts'])
+        severity_counts.update(summary['severity_counts'])
+    events = sum(summary['events'] for summary in summaries)
+    detect_seconds = sum(summary['detect_seconds'] for summary in summaries)
+    report = {
+        "rules": rule_names,
+        "thresholds": DriftThresholds(**threshold_values).to_dict(),
+        "workers": workers,
+        "sessions": sum(summary['sessions'] for summary in summaries),
+        "events": events,
+        "wall_seconds": round(wall_seconds, 3),
+        "events_per_second": round(events / wall_seconds, 1) if wall_seconds > 0 else None,
+        "detect_events_per_second": round(events / detect_seconds, 1) if detect_seconds > 0 else None,
+        "drift_counts": dict(drift_counts),
+        "severity_counts": dict(severity_counts),
+        "shards": sorted(summaries, key=lambda summary: summary['path']),
+        "baseline_diff": diff_counts(load_baseline(baseline), drift_counts) if baseline else None,
+    }
+    print_report(report)
+
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {out}")
+
+    if max_change_pct is not None and report['baseline_diff']:
+        exceeded = [drift_type for drift_type, row in report['baseline_diff'].items()
+                    if row['change'] and (row['change_pct'] is None or abs(row['change_pct']) > max_change_pct)]
+        if exceeded:
+            print(f"ERROR: Drift counts changed by more than {max_change_pct}% for: {', '.join(exceeded)}")
+            sys.exit(1)
+    print("[OK] Backtest complete")
+    return report
+
+
+def _parse_threshold(value):
+    name, sep, number = value.partition('=')
+    if not sep:
+        raise ValueError(f"expected name=value, got {value!r}")
+    if name not in TUNABLE_THRESHOLDS:
+        raise ValueError(f"unknown threshold {name!r} (known: {', '.join(TUNABLE_THRESHOLDS)})")
+    return name, int(number)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay exported event corpora through the drift rules in memory.')
+    parser.add_argument('corpus', nargs='+', help='Corpus shards: /api/export/events NDJSON (.gz) or Parquet files.')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU, at most one per shard).')
+    parser.add_argument('--rules', help=f"Comma-separated rules to run (default: the active rules; "
+                                        f"known: {', '.join(RULE_NAMES)}).")
+    parser.add_argument('--disable', help='Comma-separated rules to leave out.')
+    parser.add_argument('--threshold', action='append', default=[], metavar='NAME=VALUE',
+                        help='Override a threshold, e.g. idle_gap_seconds=240 (repeatable).')
+    parser.add_argument('--baseline', help='Earlier --out report (.json) or a drifts export to compare against.')
+    parser.add_argument('--out', help='Write the report as JSON to this file.')
+    parser.add_argument('--max-change', type=float, metavar='PCT',
+                        help='Exit with an error if any drift type changed by more than PCT%% vs --baseline.')
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    try:
+        arg_thresholds = dict(_parse_threshold(value) for value in args.threshold)
+        arg_rules = [name.strip() for name in args.rules.split(',') if name.strip()] if args.rules else None
+        disabled = {name.strip() for name in args.disable.split(',') if name.strip()} if args.disable else set()
+        unknown = (set(arg_rules or ()) | disabled) - set(RULE_NAMES)
+        if unknown:
+            raise ValueError(f"unknown rule(s): {', '.join(sorted(unknown))}")
+    except ValueError as e:
+        print(f"Invalid arguments: {e}")
+        sys.exit(1)
+    if disabled:
+        arg_rules = [name for name in (arg_rules or [rule.name for rule in active_rules()]) if name not in disabled]
+
+    run_backtest(args.corpus, workers=args.workers, threshold_values=arg_thresholds, rule_names=arg_rules,
+                 baseline=args.baseline, out=args.out, max_change_pct=args.max_change)
+    profiling.finish()
@@ -14,13 +14,15 @@ from datetime import date
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import get_db_connection
+import profiling
 
 
 def run_daily_summary(target_date: date | None = None) -> None:
     if target_date is None:
         target_date = date.today()
 
-    conn = get_db_connection()
+    with profiling.phase('connect'):
+        conn = get_db_connection()
     if conn is None:
         print("ERROR: Database connection failed")
         sys.exit(1)
@@ -29,14 +31,16 @@ def run_daily_summary(target_date: date | None = None) -> None:
     try:
         print(f"Running daily summary for {target_date}...")
         # Call stored procedure - it only takes date parameter
-        cursor.callproc('sp_UpdateDailySummaries', [target_date])
-        # Consume any result sets to keep connector happy
-        try:
-            for _ in cursor.stored_results():
+        with profiling.phase('sp_UpdateDailySummaries'):
+            cursor.callproc('sp_UpdateDailySummaries', [target_date])
+            # Consume any result sets to keep connector happy
+            try:
+                for _ in cursor.stored_results():
+                    pass
+            except Exception:
                 pass
-        except Exception:
-            pass
-        conn.commit()
+        with profiling.phase('commit'):
+            conn.commit()
         print(f"[OK] Daily summary updated for {target_date}")
     except Exception as e:
         conn.rollback()
@@ -53,7 +57,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run daily summary job for a specific date and user.')
     parser.add_argument('--date', type=str, help='Date in YYYY-MM-DD format. Defaults to today.')
     parser.add_argument('--user', type=int, help='User ID (deprecated - procedure runs for all users).')
+    profiling.add_profile_arguments(parser)
     args = parser.parse_args()
+    profiling.enable_from_args(args)
 
     arg_date = None
     if args.date:
@@ -64,3 +70,4 @@ if __name__ == "__main__":
             sys.exit(1)
 
     run_daily_summary(target_date=arg_date)
+    profiling.finish()
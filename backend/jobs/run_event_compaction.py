@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Event Compaction Job
+
+Purges raw MOUSE_MOVE / SCROLL rows from activity_event once they are older
+than the retention window. Their engagement signal has already been folded
+into tab_minute_engagement at ingest time. Also drops batch idempotency
+claims older than INGEST_DEDUP_TTL_HOURS (see ingest_dedup.py).
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import database module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from event_rollup import RAW_EVENT_RETENTION_HOURS, purge_expired_raw_events
+from ingest_dedup import purge_expired_batches
+
+
+def run_event_compaction(retention_hours: int = RAW_EVENT_RETENTION_HOURS, batch_size: int = 5000) -> None:
+    conn = get_db_connection()
+    if conn is None:
+        print("ERROR: Database connection failed")
+        sys.exit(1)
+
+    try:
+        print(f"Purging raw high-frequency events older than {retention_hours}h...")
+        deleted = purge_expired_raw_events(conn, retention_hours=retention_hours, batch_size=batch_size)
+        print(f"[OK] Purged {deleted} raw events")
+        expired = purge_expired_batches(conn, batch_size=batch_size)
+        print(f"[OK] Purged {expired} expired ingest batch ids")
+    except Exception as e:
+        conn.rollback()
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Purge raw mouse/scroll events outside the retention window.')
+    parser.add_argument('--hours', type=int, default=RAW_EVENT_RETENTION_HOURS,
+                        help='Retention window in hours for raw MOUSE_MOVE/SCROLL rows.')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per transaction.')
+    args = parser.parse_args()
+
+    run_event_compaction(retention_hours=args.hours, batch_size=args.batch_size)
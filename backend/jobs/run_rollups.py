@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Rollup Job
+
+Recomputes the weekly and monthly domain summaries for every bucket that
+overlaps the given date range (defaults to yesterday and today) from
+daily_domain_summary. Run it after the daily summary job.
+"""
+
+import sys
+import os
+from datetime import date, timedelta
+
+# Add parent directory to path to import database module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from rollups import refresh_rollups
+import profiling
+
+
+def run_rollups(start_date: date | None = None, end_date: date | None = None, user_id: int | None = None) -> None:
+    if end_date is None:
+        end_date = date.today()
+    if start_date is None:
+        # Include yesterday so the buckets are final once a day rolls over
+        start_date = end_date - timedelta(days=1)
+
+    with profiling.phase('connect'):
+        conn = get_db_connection()
+    if conn is None:
+        print("ERROR: Database connection failed")
+        sys.exit(1)
+
+    cursor = conn.cursor()
+    try:
+        print(f"Refreshing weekly/monthly rollups for {start_date}..{end_date}...")
+        with profiling.phase('refresh_rollups'):
+            affected = refresh_rollups(cursor, start_date, end_date, user_id=user_id)
+        with profiling.phase('commit'):
+            conn.commit()
+        print(f"[OK] Rollups refreshed (week rows: {affected['week']}, month rows: {affected['month']})")
+    except Exception as e:
+        conn.rollback()
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Refresh weekly and monthly domain summary rollups.')
+    parser.add_argument('--start', type=str, help='First date (YYYY-MM-DD). Defaults to the day before --end.')
+    parser.add_argument('--end', type=str, help='Last date (YYYY-MM-DD). Defaults to today.')
+    parser.add_argument('--user', type=int, help='Only refresh this user.')
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    try:
+        arg_start = date.fromisoformat(args.start) if args.start else None
+        arg_end = date.fromisoformat(args.end) if args.end else None
+    except ValueError:
+        print("Invalid date format. Use YYYY-MM-DD")
+        sys.exit(1)
+
+    run_rollups(start_date=arg_start, end_date=arg_end, user_id=args.user)
+    profiling.finish()
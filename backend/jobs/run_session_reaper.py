@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Session Reaper Job
+
+Closes sessions with no activity for SESSION_IDLE_MINUTES (their close call
+never arrived), setting end_time to the last activity. The closed sessions
+then get a final drift analysis pass, and the weekly/monthly rollups
+covering their days are refreshed.
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import database module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from rollups import refresh_rollups
+from session_lifecycle import SESSION_IDLE_MINUTES, reap_idle_sessions
+from run_drift_analysis import analyze_drifts_for_session
+import profiling
+
+
+def run_session_reaper(idle_minutes: int = SESSION_IDLE_MINUTES, batch_size: int = 500,
+                       analyze: bool = True) -> None:
+    with profiling.phase('connect'):
+        conn = get_db_connection()
+    if conn is None:
+        print("ERROR: Database connection failed")
+        sys.exit(1)
+
+    try:
+        print(f"Closing sessions idle for more than {idle_minutes} minutes...")
+        with profiling.phase('reap'):
+            closed = reap_idle_sessions(conn, idle_minutes=idle_minutes, batch_size=batch_size)
+        print(f"[OK] Closed {len(closed)} idle sessions")
+        if not closed:
+            return
+
+        # Hand the sessions to the aggregate pipeline: the daily summary job
+        # picks their events up on its own schedule, the rollups are
+        # idempotent so they are refreshed here for the days involved
+        first_day = min(start_time for _, _, start_time, _ in closed).date()
+        last_day = max(end_time for _, _, _, end_time in closed).date()
+        cursor = conn.cursor()
+        try:
+            with profiling.phase('refresh_rollups'):
+                refresh_rollups(cursor, first_day, last_day)
+            conn.commit()
+        finally:
+            cursor.close()
+        print(f"[OK] Rollups refreshed for {first_day}..{last_day}")
+    except Exception as e:
+        conn.rollback()
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    if analyze:
+        for session_id, _, _, _ in closed:
+            with profiling.phase('analyze_drifts'):
+                analyze_drifts_for_session(session_id)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Close idle sessions and run their final drift analysis.')
+    parser.add_argument('--idle-minutes', type=int, default=SESSION_IDLE_MINUTES,
+                        help='Minutes without activity after which an open session is closed.')
+    parser.add_argument('--batch-size', type=int, default=500, help='Sessions closed per transaction.')
+    parser.add_argument('--no-analyze', action='store_true', help='Skip the drift analysis of closed sessions.')
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    run_session_reaper(idle_minutes=args.idle_minutes, batch_size=args.batch_size, analyze=not args.no_analyze)
+    profiling.finish()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Stat Sketch Job
+
+Builds the per-day admin statistic sketches (distinct active users and
+focused time per domain) for the given days, by default yesterday and
+today, and refreshes the catalog's default domain categories. Run it
+after the daily summary job; use --days to backfill.
+"""
+
+import sys
+import os
+from datetime import date, timedelta
+
+# Add parent directory to path to import database module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from domain_catalog import refresh_default_categories
+from stat_sketches import build_daily_sketches
+import profiling
+
+
+def run_stat_sketches(end_date: date | None = None, days: int = 2) -> None:
+    if end_date is None:
+        end_date = date.today()
+
+    with profiling.phase('connect'):
+        conn = get_db_connection()
+    if conn is None:
+        print("ERROR: Database connection failed")
+        sys.exit(1)
+
+    cursor = conn.cursor()
+    try:
+        for offset in range(days - 1, -1, -1):
+            day = end_date - timedelta(days=offset)
+            with profiling.phase('build_daily_sketches'):
+                built = build_daily_sketches(cursor, day)
+            # Commit per day so a long backfill does not hold one transaction
+            conn.commit()
+            print(f"  {day}: ~{built['active_users'].count()} active users, "
+                  f"{len(built['domain_seconds'].counters)} domains")
+        with profiling.phase('refresh_default_categories'):
+            changed = refresh_default_categories(cursor)
+        conn.commit()
+        print(f"  {changed} catalog default categories changed")
+        print(f"[OK] Stat sketches built for {days} day(s) ending {end_date}")
+    except Exception as e:
+        conn.rollback()
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build per-day sketches for the admin statistics.')
+    parser.add_argument('--end', type=str, help='Last date (YYYY-MM-DD). Defaults to today.')
+    parser.add_argument('--days', type=int, default=2, help='Number of days ending at --end (default 2).')
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    try:
+        arg_end = date.fromisoformat(args.end) if args.end else None
+    except ValueError:
+        print("Invalid date format. Use YYYY-MM-DD")
+        sys.exit(1)
+    if args.days <= 0:
+        print("--days must be positive")
+        sys.exit(1)
+
+    run_stat_sketches(end_date=arg_end, days=args.days)
+    profiling.finish()
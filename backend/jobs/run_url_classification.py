@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+URL Classification Job
+
+(Re)classifies url_dict entries with the current classifier rule set. New
+URLs are classified at ingest; run this after the migration or whenever
+URL_RULES_FILE changes. API processes pick up the rewritten url_flags as
+their cached URL entries expire (URL_CACHE_TTL_SECONDS, default 5
+minutes); they classify new URLs with the rules loaded at startup, so
+restart them after changing URL_RULES_FILE.
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import database module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from url_classifier import classify_url
+
+
+def run_url_classification(batch_size: int = 2000) -> None:
+    conn = get_db_connection()
+    if conn is None:
+        print("ERROR: Database connection failed")
+        sys.exit(1)
+
+    cursor = conn.cursor()
+    last_id = 0
+    scanned = 0
+    changed = 0
+    try:
+        while True:
+            # Keyset pagination keeps each batch an index range scan
+            cursor.execute(
+                """
+                SELECT url_id, url, url_flags, rule_code FROM url_dict
+                WHERE url_id > %s
+                ORDER BY url_id
+                LIMIT %s
+                """,
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for url_id, url, url_flags, rule_code in rows:
+                new_flags, new_code = classify_url(url)
+                if (new_flags, new_code) != (url_flags, rule_code):
+                    updates.append((new_flags, new_code, url_id))
+            if updates:
+                cursor.executemany("UPDATE url_dict SET url_flags = %s, rule_code = %s WHERE url_id = %s", updates)
+                conn.commit()
+
+            scanned += len(rows)
+            changed += len(updates)
+            last_id = rows[-1][0]
+
+        print(f"[OK] Classified {scanned} URLs ({changed} changed)")
+    except Exception as e:
+        conn.rollback()
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Reclassify url_dict entries with the current rule set.')
+    parser.add_argument('--batch-size', type=int, default=2000, help='URLs classified per batch.')
+    args = parser.parse_args()
+
+    run_url_classification(batch_size=args.batch_size)
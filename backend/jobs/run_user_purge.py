@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+User Purge Job
+
+Runs a queued purge job (--job) or resumes every queued/running job that
+has made no progress for PURGE_STALE_MINUTES, e.g. after an API restart
+(--resume). Jobs continue from the step recorded in purge_job.
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import database module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from purge import PURGE_BATCH_SIZE, PURGE_STALE_MINUTES, find_resumable_jobs, run_purge_job
+
+
+def resume_purge_jobs(stale_minutes: int = PURGE_STALE_MINUTES, include_failed: bool = False,
+                      batch_size: int = PURGE_BATCH_SIZE) -> None:
+    conn = get_db_connection()
+    if conn is None:
+        print("ERROR: Database connection failed")
+        sys.exit(1)
+
+    cursor = conn.cursor()
+    try:
+        job_ids = find_resumable_jobs(cursor, stale_minutes=stale_minutes, include_failed=include_failed)
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not job_ids:
+        print("No purge jobs to resume")
+        return
+    for job_id in job_ids:
+        print(f"Resuming purge job {job_id}...")
+        status = run_purge_job(job_id, batch_size=batch_size)
+        if status == 'running':
+            print(f"Purge job {job_id} is being run by another runner")
+            continue
+        print(f"[{'OK' if status == 'completed' else 'FAILED'}] Purge job {job_id}: {status}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run or resume background user purges.')
+    parser.add_argument('--job', type=int, help='Run this purge job.')
+    parser.add_argument('--resume', action='store_true', help='Resume stale queued/running jobs.')
+    parser.add_argument('--include-failed', action='store_true', help='With --resume, also retry failed jobs.')
+    parser.add_argument('--stale-minutes', type=int, default=PURGE_STALE_MINUTES,
+                        help='Minutes without progress before a job counts as abandoned.')
+    parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE, help='Rows deleted per statement.')
+    args = parser.parse_args()
+
+    if args.job:
+        status = run_purge_job(args.job, batch_size=args.batch_size)
+        print(f"Purge job {args.job}: {status}")
+        sys.exit(0 if status == 'completed' else 1)
+    elif args.resume:
+        resume_purge_jobs(args.stale_minutes, args.include_failed, args.batch_size)
+    else:
+        parser.print_help()
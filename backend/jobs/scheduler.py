@@ -3,19 +3,20 @@ import time
 import subprocess
 import os
 import sys
+from functools import wraps
 
 # Add parent directory to path to import database module
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.dirname(script_dir))
 
-from database import get_db_connection
+from database import get_db_connection, INTENT_READ
+import metrics
 
 def get_all_user_ids():
-    """Get all user IDs from the database."""
-    conn = get_db_connection()
+    """Get all user IDs from the database; raises when they cannot be read."""
+    conn = get_db_connection(INTENT_READ)
     if not conn:
-        print("Failed to connect to database")
-        return []
+        raise RuntimeError("Failed to connect to database")
     
     cursor = conn.cursor()
     
@@ -23,55 +24,105 @@ def get_all_user_ids():
         cursor.execute("SELECT uid FROM user ORDER BY uid")
         user_ids = [row[0] for row in cursor.fetchall()]
         return user_ids
-    except Exception as e:
-        print(f"Error fetching user IDs: {e}")
-        return []
     finally:
         cursor.close()
         conn.close()
 
+def _now():
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+def run_script(label, script, *args):
+    """Runs a job script and prints its output; raises CalledProcessError when it fails."""
+    try:
+        result = subprocess.run(["python", os.path.join(script_dir, script), *args],
+                                capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as e:
+        print(f"[{_now()}] Error in {label}: {e}")
+        print(f"Stderr: {e.stderr}")
+        raise
+    print(f"[{_now()}] {label.capitalize()} output: {result.stdout.strip()}")
+    return result
+
+def keep_scheduling(job):
+    """Lets the scheduler carry on after a failed cycle; timed_job has already counted the failure."""
+    @wraps(job)
+    def wrapper():
+        try:
+            job()
+        except Exception as e:
+            print(f"[{_now()}] {job.__name__} failed: {e}")
+    return wrapper
+
+@metrics.timed_job('drift_analysis')
 def run_drift_analysis_job():
-    """Runs the drift analysis script for all users."""
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Starting drift analysis job...")
+    """Runs the drift analysis script for all users; the cycle fails if any user's analysis did."""
+    print(f"[{_now()}] Starting drift analysis job...")
     
     # Get all user IDs from database
     user_ids = get_all_user_ids()
     
     if not user_ids:
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] No users found in database")
+        print(f"[{_now()}] No users found in database")
         return
     
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Found {len(user_ids)} users to analyze")
+    print(f"[{_now()}] Found {len(user_ids)} users to analyze")
     
-    # Run drift analysis for each user
+    # Run drift analysis for each user, carrying on past failures
+    failed = 0
     for user_id in user_ids:
         try:
-            result = subprocess.run(["python", os.path.join(script_dir, "run_drift_analysis.py"), "--user", str(user_id)], 
-                                    capture_output=True, text=True, check=True)
-            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Drift analysis completed for user {user_id}")
+            subprocess.run(["python", os.path.join(script_dir, "run_drift_analysis.py"), "--user", str(user_id)],
+                           capture_output=True, text=True, check=True)
+            print(f"[{_now()}] Drift analysis completed for user {user_id}")
         except subprocess.CalledProcessError as e:
-            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error in drift analysis for user {user_id}: {e}")
+            failed += 1
+            print(f"[{_now()}] Error in drift analysis for user {user_id}: {e}")
             print(f"Stderr: {e.stderr}")
     
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Drift analysis job finished.")
+    print(f"[{_now()}] Drift analysis job finished.")
+    if failed:
+        raise RuntimeError(f"drift analysis failed for {failed} of {len(user_ids)} users")
 
+@metrics.timed_job('daily_summary')
 def run_daily_summary_job():
-    """Runs the daily summary script for all users."""
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Starting daily summary job...")
+    """Runs the daily summary script for all users, then refreshes the rollups and stat sketches."""
+    print(f"[{_now()}] Starting daily summary job...")
     # Run for today's date - the script now handles all users internally
-    try:
-        result = subprocess.run(["python", os.path.join(script_dir, "run_daily_summary.py")], 
-                                capture_output=True, text=True, check=True)
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Daily summary output: {result.stdout.strip()}")
-    except subprocess.CalledProcessError as e:
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error in daily summary: {e}")
-        print(f"Stderr: {e.stderr}")
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Daily summary job finished.")
+    run_script("daily summary", "run_daily_summary.py")
+    # Part of this cycle (and its timing), not separate jobs
+    run_script("rollups", "run_rollups.py")
+    run_script("stat sketches", "run_stat_sketches.py")
+    print(f"[{_now()}] Daily summary job finished.")
+
+@metrics.timed_job('event_compaction')
+def run_event_compaction_job():
+    """Purges raw mouse/scroll events that have aged out of the retention window."""
+    print(f"[{_now()}] Starting event compaction job...")
+    run_script("event compaction", "run_event_compaction.py")
+    print(f"[{_now()}] Event compaction job finished.")
+
+@metrics.timed_job('session_reaper')
+def run_session_reaper_job():
+    """Closes sessions left open by a browser that never sent /api/session/close."""
+    run_script("session reaper", "run_session_reaper.py")
+
+@metrics.timed_job('user_purge_resume')
+def run_user_purge_resume_job():
+    """Resumes user purges abandoned by a restarted API process."""
+    run_script("user purge resume", "run_user_purge.py", "--resume")
 
 if __name__ == "__main__":
     # Schedule the jobs - updated for more frequent testing
-    schedule.every(30).seconds.do(run_drift_analysis_job)  # Every 30 seconds for testing
-    schedule.every(1).minute.do(run_daily_summary_job)     # Every 1 minute for testing
+    schedule.every(30).seconds.do(keep_scheduling(run_drift_analysis_job))  # Every 30 seconds for testing
+    schedule.every(1).minute.do(keep_scheduling(run_daily_summary_job))     # Every 1 minute for testing
+    schedule.every(1).hour.do(keep_scheduling(run_event_compaction_job))
+    schedule.every(5).minutes.do(keep_scheduling(run_user_purge_resume_job))
+    schedule.every(5).minutes.do(keep_scheduling(run_session_reaper_job))
+
+    # Expose job cycle timings for Prometheus
+    metrics_port = int(os.getenv('SCHEDULER_METRICS_PORT', '9101'))
+    metrics.start_metrics_server(metrics_port)
+    print(f"Scheduler metrics on http://127.0.0.1:{metrics_port}/metrics")
 
     print("Scheduler started. Running pending jobs...")
     
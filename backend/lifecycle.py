@@ -0,0 +1,184 @@
+# backend/lifecycle.py
+"""
+Startup and shutdown of the API process.
+
+- Configuration: the credential files .env.admin and .env.user are read
+  once, by load_config() at import of main.py, instead of on every
+  request. Like before, they only fill variables not already set.
+- Warm-up: once the server is up, a background task creates the shared
+  connection pools (primary and healthy replicas) and preloads the
+  domain-catalog and URL/element intern caches, retrying every
+  WARMUP_RETRY_SECONDS until the pools can be created. GET /health/ready
+  answers 503 until then; GET /health/live answers 200 as long as the
+  process serves requests. Requests are served while warming, just cold.
+- Drain: on SIGTERM the process turns not-ready, ends the open drift
+  streams and hands the signal on to the server, which stops accepting
+  connections and waits for running requests. Shutdown then runs the
+  registered drain hooks (on_drain) in order, each bounded by
+  DRAIN_TIMEOUT_SECONDS, so buffers holding pending writes can flush them.
+  Run uvicorn with --timeout-graceful-shutdown so a stuck request cannot
+  hold the process forever.
+"""
+
+import asyncio
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+import database
+import domain_catalog
+import live_drift
+import metrics
+import url_dictionary
+
+WARMUP_RETRY_SECONDS = float(os.getenv('WARMUP_RETRY_SECONDS', '5'))
+# Entries loaded into each hot cache at startup
+WARMUP_CACHE_ROWS = int(os.getenv('WARMUP_CACHE_ROWS', '20000'))
+# Users with a session active within this many hours get their domain mappings preloaded
+WARMUP_ACTIVE_USER_HOURS = int(os.getenv('WARMUP_ACTIVE_USER_HOURS', '24'))
+DRAIN_TIMEOUT_SECONDS = float(os.getenv('DRAIN_TIMEOUT_SECONDS', '20'))
+
+PHASE_STARTING = 'starting'
+PHASE_READY = 'ready'
+PHASE_DRAINING = 'draining'
+PHASES = (PHASE_STARTING, PHASE_READY, PHASE_DRAINING)
+
+
+class ProcessState:
+    """Lifecycle phase of this API process and what its warm-up did."""
+
+    def __init__(self):
+        self.phase = PHASE_STARTING
+        self.started_at = time.time()
+        self.ready_at = None
+        self.warmup = {}  # step -> result or error
+
+    @property
+    def ready(self):
+        return self.phase == PHASE_READY
+
+    def to_dict(self):
+        return {
+            "phase": self.phase,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "warmup_seconds": round(self.ready_at - self.started_at, 1) if self.ready_at else None,
+            "warmup": dict(self.warmup),
+        }
+
+
+state = ProcessState()
+_drain_hooks = []  # (name, fn)
+_config_loaded = False
+
+_phase = metrics.gauge('ddt_process_phase', '1 for the lifecycle phase the API process is in', ('phase',))
+for _name in PHASES:
+    _phase.set_function(lambda p=_name: int(state.phase == p), phase=_name)
+
+
+def load_config():
+    """Read the per-role credential files into the environment, once per process."""
+    global _config_loaded
+    if _config_loaded:
+        return
+    load_dotenv('.env.admin')
+    load_dotenv('.env.user')
+    _config_loaded = True
+
+
+def on_drain(name, fn):
+    """Register fn() to run when the process shuts down, after requests have finished."""
+    _drain_hooks.append((name, fn))
+
+
+def warm_up():
+    """One warm-up attempt; raises if the connection pools cannot be created."""
+    started = time.perf_counter()
+    state.warmup['pools'] = database.warm_pools()
+    state.warmup['pools_seconds'] = round(time.perf_counter() - started, 3)
+
+    # Cold caches only cost queries, so a failed preload does not block readiness
+    conn = database.get_db_connection(database.INTENT_READ)
+    if conn is None:
+        state.warmup['caches'] = "skipped: database connection failed"
+        return
+    cursor = conn.cursor()
+    try:
+        active_since = datetime.now() - timedelta(hours=WARMUP_ACTIVE_USER_HOURS)
+        state.warmup['domain_cache_entries'] = domain_catalog.preload(cursor, WARMUP_CACHE_ROWS, active_since)
+        state.warmup['intern_cache_entries'] = url_dictionary.preload(cursor, WARMUP_CACHE_ROWS)
+    except Exception as e:
+        print(f"Cache preload failed: {e}")
+        state.warmup['caches'] = f"failed: {e}"
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def _warm_up_until_ready():
+    while state.phase == PHASE_STARTING:
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            print(f"Warm-up failed, retrying in {WARMUP_RETRY_SECONDS}s: {e}")
+            state.warmup['error'] = str(e)
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+            continue
+        state.warmup.pop('error', None)
+        if state.phase == PHASE_STARTING:
+            state.phase = PHASE_READY
+            state.ready_at = time.time()
+            print(f"API process ready after {state.ready_at - state.started_at:.1f}s")
+
+
+def begin_drain():
+    """Stop advertising readiness and end long-lived streams so in-flight work can finish."""
+    if state.phase == PHASE_DRAINING:
+        return
+    state.phase = PHASE_DRAINING
+    print("Draining API process...")
+    live_drift.broker.close_all()
+
+
+def _install_sigterm_handler():
+    """Run begin_drain on SIGTERM before the server's own handler."""
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        # Only the server's handler knows how to stop it; without one, drain at shutdown
+        return
+
+    def handle_sigterm(signum, frame):
+        begin_drain()
+        previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+async def _run_drain_hooks():
+    for name, fn in _drain_hooks:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(fn), timeout=DRAIN_TIMEOUT_SECONDS)
+            print(f"Drain step {name} finished in {time.perf_counter() - started:.2f}s")
+        except asyncio.TimeoutError:
+            print(f"Drain step {name} did not finish within {DRAIN_TIMEOUT_SECONDS}s")
+        except Exception as e:
+            print(f"Drain step {name} failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan: warm up in the background, drain on shutdown."""
+    load_config()
+    _install_sigterm_handler()
+    warm_task = asyncio.create_task(_warm_up_until_ready())
+    try:
+        yield
+    finally:
+        begin_drain()
+        warm_task.cancel()
+        await _run_drain_hooks()
+        print("API process drained")
@@ -0,0 +1,264 @@
+# backend/live_drift.py
+"""
+Online drift detection on the ingest path, pushed to clients over SSE.
+
+/api/events/batch feeds every committed batch to a per-session DriftEngine
+(drift_rules.py) held in memory, so the drift rules run on events as they
+arrive instead of re-reading the session from MySQL on the next scheduler
+cycle. New drifts are inserted with the same de-duplication as the batch
+analyzer (which runs the same rules, plus the cross-session drift trigger
+analysis, and catches anything this process missed) and published to the
+user's open /api/drifts/stream connections. Each session's engine uses the
+user's adaptive thresholds as of its first batch, and the batch's focus
+spans and switch rates are merged into the user's behaviour sketches
+(drift_thresholds.py).
+
+State lives in the API process: with several workers, sessions must be
+routed to the same worker for the in-memory windows to see every event.
+A session whose state was evicted or lost to a restart simply starts with
+empty windows.
+"""
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+import metrics
+from drift_detection import insert_drift
+from drift_rules import DriftEngine
+from drift_thresholds import BehaviorObserver, load_thresholds, record_observations
+from streaming import dumps
+
+LIVE_DRIFT_ENABLED = os.getenv('LIVE_DRIFT_ENABLED', '1') != '0'
+# Sessions with detector state held in memory; least recently fed are evicted first
+LIVE_DRIFT_MAX_SESSIONS = int(os.getenv('LIVE_DRIFT_MAX_SESSIONS', '10000'))
+# Drifts buffered per stream connection before new ones are dropped
+LIVE_DRIFT_QUEUE_SIZE = int(os.getenv('LIVE_DRIFT_QUEUE_SIZE', '100'))
+# Comment lines sent on an idle stream so proxies do not time it out
+LIVE_DRIFT_KEEPALIVE_SECONDS = float(os.getenv('LIVE_DRIFT_KEEPALIVE_SECONDS', '15'))
+
+SSE_MEDIA_TYPE = 'text/event-stream'
+
+_live_drifts = metrics.counter('ddt_live_drifts_total', 'Drifts detected on the ingest path', ('drift_type',))
+_live_dropped = metrics.counter('ddt_live_drift_dropped_total', 'Drift notifications dropped for slow streams')
+_live_errors = metrics.counter('ddt_live_drift_errors_total', 'Ingest batches whose live detection failed')
+
+
+class _SessionState:
+    __slots__ = ('user_id', 'detector', 'observer', 'tabs', 'lock')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.detector = None  # built with the user's thresholds on the first batch
+        self.observer = BehaviorObserver()
+        self.tabs = {}  # tab_id -> (domain_name, category)
+        self.lock = threading.Lock()
+
+
+_sessions = OrderedDict()  # session_id -> _SessionState
+_sessions_lock = threading.Lock()
+
+
+def _session_state(session_id, user_id):
+    with _sessions_lock:
+        state = _sessions.get(session_id)
+        if state is None or state.user_id != user_id:
+            state = _SessionState(user_id)
+            _sessions[session_id] = state
+        _sessions.move_to_end(session_id)
+        while len(_sessions) > LIVE_DRIFT_MAX_SESSIONS:
+            _sessions.popitem(last=False)
+        return state
+
+
+def forget_session(session_id):
+    """Drop the detector state of a closed session."""
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
+
+
+def remember_tab(session_id, tab_id, domain_name, category):
+    """Record the domain of a tab just opened, saving a lookup on its first events."""
+    with _sessions_lock:
+        state = _sessions.get(session_id)
+    if state is not None:
+        with state.lock:
+            state.tabs[tab_id] = (domain_name, category)
+
+
+def invalidate_user_tabs(user_id):
+    """Forget cached tab categories after the user's domain categories changed."""
+    with _sessions_lock:
+        states = [state for state in _sessions.values() if state.user_id == user_id]
+    for state in states:
+        with state.lock:
+            state.tabs.clear()
+
+
+def _load_tabs(cursor, session_id, tab_ids):
+    placeholders = ', '.join(['%s'] * len(tab_ids))
+    cursor.execute(f"""
+        SELECT t.tid, d.domain_name, d.category
+        FROM tab t
+        JOIN domains d ON t.domain_id = d.id
+        WHERE t.session_id = %s AND t.tid IN ({placeholders})
+    """, (session_id, *tab_ids), query_name='live_drift.tabs')
+    return {tid: (domain_name, category) for tid, domain_name, category in cursor.fetchall()}
+
+
+def detect(cursor, session_id, user_id, events, url_flags):
+    """
+    Feed an ingested batch to the session's detector and insert the drifts
+    it completes. url_flags is aligned with events and holds the flags stored
+    in url_dict (see url_dictionary.encode_events), so the rules see the same
+    flags as the batch analyzer. Returns the new drifts (with drift_id) for the caller to
+    publish once committed.
+    """
+    state = _session_state(session_id, user_id)
+    with state.lock:
+        missing = {event.tab_id for event in events} - state.tabs.keys()
+        if missing:
+            state.tabs.update(_load_tabs(cursor, session_id, sorted(missing)))
+        if state.detector is None:
+            state.detector = DriftEngine(load_thresholds(cursor, user_id))
+
+        drifts = []
+        detector = state.detector
+        for event, flags in sorted(zip(events, url_flags), key=lambda pair: pair[0].timestamp):
+            ts = event.timestamp.replace(tzinfo=None)
+            # Events older than the window (late retries) cannot be placed in it
+            if detector.last_event_time and ts < detector.last_event_time:
+                continue
+            domain_name, category = state.tabs.get(event.tab_id, (None, None))
+            event_dict = {
+                "timestamp": ts, "event_type": event.event_type, "tab_id": event.tab_id,
+                "domain_name": domain_name, "category": category,
+                "url_flags": flags,
+            }
+            state.observer.feed(event_dict)
+            drifts.extend(detector.feed(event_dict))
+        observations = state.observer.drain()
+
+    record_observations(cursor, user_id, observations)
+
+    new_drifts = []
+    for drift in drifts:
+        drift_id = insert_drift(cursor, session_id, drift['event_start'], drift['event_end'],
+                                drift['drift_type'], drift['description'], drift['severity'], drift['tab_id'])
+        if drift_id is not None:
+            new_drifts.append({"drift_id": drift_id, "session_id": session_id, **drift})
+    return new_drifts
+
+
+def process_batch(conn, session_id, user_id, events, url_flags):
+    """
+    Run live detection for a batch whose events are already committed.
+
+    Never raises: a detection failure must not fail the ingest request, and
+    the scheduled analyzer picks up whatever was missed.
+    """
+    if not LIVE_DRIFT_ENABLED or not events:
+        return []
+    cursor = conn.cursor()
+    try:
+        drifts = detect(cursor, session_id, user_id, events, url_flags)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        _live_errors.inc()
+        print(f"[live_drift] session {session_id}: {e}")
+        return []
+    finally:
+        cursor.close()
+    for drift in drifts:
+        _live_drifts.inc(drift_type=drift['drift_type'])
+        broker.publish(user_id, drift)
+    return drifts
+
+
+class DriftBroker:
+    """Fan-out of drift notifications to each user's open stream connections."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> {asyncio.Queue: event loop}
+        self.closed = False
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=LIVE_DRIFT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.pop(queue, None)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, drift):
+        """Queue a drift for every stream of user_id; safe to call from any thread."""
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, {}).items())
+        for queue, loop in targets:
+            loop.call_soon_threadsafe(_offer, queue, drift)
+
+    def close_all(self):
+        """End every open stream (the client reconnects elsewhere) and refuse new ones; used when draining."""
+        with self._lock:
+            self.closed = True
+            targets = [item for queues in self._subscribers.values() for item in queues.items()]
+        for queue, loop in targets:
+            loop.call_soon_threadsafe(_close, queue)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+
+def _offer(queue, drift):
+    try:
+        queue.put_nowait(drift)
+    except asyncio.QueueFull:
+        _live_dropped.inc()
+
+
+def _close(queue):
+    # Make room so the end-of-stream marker always fits
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
+
+
+broker = DriftBroker()
+
+_tracked = metrics.gauge('ddt_live_drift_sessions', 'Sessions with live drift detector state')
+_tracked.set_function(lambda: len(_sessions))
+_streams = metrics.gauge('ddt_live_drift_streams', 'Open drift stream connections')
+_streams.set_function(broker.connection_count)
+
+
+def format_event(drift):
+    """One SSE message for a drift."""
+    return f"id: {drift['drift_id']}\nevent: drift\ndata: {dumps(drift)}\n\n"
+
+
+async def sse_stream(request, user_id):
+    """Async generator of SSE messages for user_id until the client disconnects or the process drains."""
+    queue = broker.subscribe(user_id)
+    try:
+        yield "retry: 5000\n\n"
+        while not broker.closed and not await request.is_disconnected():
+            try:
+                drift = await asyncio.wait_for(queue.get(), timeout=LIVE_DRIFT_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if drift is None:
+                break
+            yield format_event(drift)
+    finally:
+        broker.unsubscribe(user_id, queue)
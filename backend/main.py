@@ -1,17 +1,44 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException, Body, Depends, status
+from fastapi import FastAPI, HTTPException, Body, Depends, Request, BackgroundTasks, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional
 import mysql.connector
-from database import get_db_connection
+from database import get_db_connection, INTENT_READ, INTENT_WRITE
 from models import *
+from event_rollup import build_engagement_buckets, upsert_engagement_buckets
+from url_dictionary import encode_events
+from session_lifecycle import touch_activity
+from streaming import stream_query, NDJSON_MEDIA_TYPE
+import export
+import rollups
+import domain_catalog
+import whitelist_bulk
+import purge
+import query_fanout
+import live_drift
+import ingest_dedup
+import rate_limit
+import lifecycle
+import drift_timeline
+import drift_histogram
+import drift_thresholds
+import stat_sketches
+from domain_catalog import extract_domain
+import json
 import os
-from dotenv import load_dotenv
+import time
+import metrics
 
-app = FastAPI()
+# Credential files are read once here, not per request
+lifecycle.load_config()
+lifecycle.on_drain('query_fanout', query_fanout.shutdown)
+
+app = FastAPI(lifespan=lifecycle.lifespan)
 
 # --- Security Configuration ---
 SECRET_KEY = "your-secret-key-change-this-in-production"  # TODO: Move to environment variable
@@ -27,17 +54,10 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-def get_db_connection_for_user(user_type='user'):
+def get_db_connection_for_user(user_type='user', intent=INTENT_WRITE, user_id=None):
     """Get database connection based on user type (admin or user)"""
-    if user_type == 'admin':
-        # Load admin environment variables
-        load_dotenv('.env.admin')
-    else:
-        # Load regular user environment variables
-        load_dotenv('.env.user')
-    
-    # Get connection using the appropriate user credentials
-    return get_db_connection()
+    # The .env.admin / .env.user credentials were loaded at startup (lifecycle.load_config)
+    return get_db_connection(intent, user_id)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -71,6 +91,28 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         )
 
 # --- Middleware ---
+# Registered before CORS so refused requests still carry CORS headers
+@app.middleware("http")
+async def limit_requests(request: Request, call_next):
+    """Per-IP token bucket and priority-based load shedding (see rate_limit.py)."""
+    request_class = rate_limit.classify_request(request.url.path)
+    if request_class is None or request.method == "OPTIONS":
+        return await call_next(request)
+    client_ip = request.client.host if request.client else None
+    wait = rate_limit.check_ip(client_ip)
+    if wait:
+        rate_limit.record_rejection(request_class, 'ip_rate')
+        return JSONResponse(status_code=429, content={"detail": "Too many requests, retry later"},
+                            headers=rate_limit.retry_after_header(wait))
+    if not rate_limit.shedder.try_enter(request_class):
+        rate_limit.record_rejection(request_class, 'shed')
+        return JSONResponse(status_code=503, content={"detail": "Server busy, retry later"},
+                            headers=rate_limit.retry_after_header(5))
+    try:
+        return await call_next(request)
+    finally:
+        rate_limit.shedder.leave(request_class)
+
 # This allows your extension and dashboard (on different ports)
 # to talk to this server. CRITICAL.
 app.add_middleware(
@@ -81,11 +123,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request and label it with its route template, not the raw path."""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        metrics.http_request_seconds.observe(
+            time.perf_counter() - start,
+            method=request.method, route=route_path, status=str(status_code),
+        )
+
 # --- API Endpoints ---
 @app.get("/")
 def read_root():
     return {"status": "Digital Drift Tracker API is running"}
 
+@app.get("/health/live", include_in_schema=False)
+def health_live():
+    """Liveness: the process is serving requests."""
+    return {"status": "ok", "phase": lifecycle.state.phase}
+
+@app.get("/health/ready", include_in_schema=False)
+def health_ready():
+    """Readiness: 200 once pools and caches are warm, 503 while starting or draining."""
+    body = lifecycle.state.to_dict()
+    if not lifecycle.state.ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+METRICS_ALLOW_REMOTE = os.getenv('METRICS_ALLOW_REMOTE', 'false').lower() == 'true'
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    """Prometheus text exposition; only served to local clients unless METRICS_ALLOW_REMOTE=true."""
+    client_host = request.client.host if request.client else None
+    if not METRICS_ALLOW_REMOTE and client_host not in ('127.0.0.1', '::1', 'localhost'):
+        raise HTTPException(status_code=403, detail="Metrics are only available locally")
+    return Response(content=metrics.render_metrics(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
 @app.post("/api/session/start", response_model=SessionResponse)
 async def session_start(payload: SessionStartPayload, current_user: dict = Depends(get_current_user)):
     conn = get_db_connection_for_user('admin')
@@ -123,6 +205,7 @@ async def session_close(payload: dict = Body(...)):
         # Call the stored procedure
         cursor.callproc('closeSession', [sid])
         conn.commit()
+        live_drift.forget_session(sid)
         return {"status": "ok", "sid_closed": sid}
     except Exception as e:
         conn.rollback()
@@ -131,177 +214,139 @@ async def session_close(payload: dict = Body(...)):
         cursor.close()
         conn.close()
 
-@app.get("/api/dashboard/insights")
-async def get_insights(current_user: dict = Depends(get_current_user)):
-    """Return insights data composed of multiple analytic queries."""
-    conn = get_db_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Database connection failed")
+# Query 5: Unclassified High-Activity Domains (last 30 days)
+INSIGHTS_Q5 = """
+    SELECT 
+        d.domain_name, d.id AS domain_id, SUM(dds.total_seconds_focused) AS total_time_seconds
+    FROM daily_domain_summary dds
+    JOIN domains d ON dds.domain_id = d.id
+    WHERE 
+        dds.user_id = %s
+        AND d.category = 'Neutral'
+        AND dds.summary_date > (CURDATE() - INTERVAL 30 DAY)
+        AND NOT EXISTS (
+            SELECT 1 FROM whitelists w WHERE w.domain_id = d.id AND w.user_id = d.user_id
+        )
+    GROUP BY d.domain_name, d.id
+    ORDER BY total_time_seconds DESC
+    LIMIT 5
+    """
 
-    cursor = conn.cursor()
-    user_id = current_user["user_id"]
+# Query 6: Tab Switches vs Productivity (per-session productive minutes)
+# Computes productive_seconds strictly within each session boundaries by summing
+# focus durations on tabs categorized as 'Productive'.
+INSIGHTS_Q6 = """
+    SELECT 
+        s.sid, s.start_time, TIMESTAMPDIFF(MINUTE, s.start_time, s.end_time) AS total_minutes,
+        (SELECT COUNT(*) 
+         FROM activity_event ae 
+         WHERE ae.session_id = s.sid AND ae.event_type = 'TAB_FOCUS'
+        ) AS tab_switches,
+        (
+            SELECT COALESCE(SUM(
+                TIMESTAMPDIFF(SECOND,
+                    ae.timestamp,
+                    LEAST(COALESCE(ae.next_ts, s.end_time), s.end_time)
+                )
+            ), 0)
+            FROM (
+                SELECT 
+                    ae.session_id, ae.timestamp, ae.tab_id,
+                    LEAD(ae.timestamp) OVER (PARTITION BY ae.session_id ORDER BY ae.timestamp) AS next_ts
+                FROM activity_event ae
+                WHERE ae.session_id = s.sid AND ae.event_type = 'TAB_FOCUS'
+            ) AS ae
+            JOIN tab t ON ae.tab_id = t.tid
+            JOIN domains d ON t.domain_id = d.id
+            WHERE d.category = 'Productive'
+        ) AS productive_seconds
+    FROM sessions s
+    WHERE s.user_id = %s AND s.end_time IS NOT NULL
+    ORDER BY s.start_time DESC
+    """
 
-    def rows_to_dicts(rows, cur):
-        if not rows or not cur.description:
-            return []
-        cols = [d[0] for d in cur.description]
-        return [dict(zip(cols, r)) for r in rows]
+# Query 7: Driftiest Hours of the Day
+# Read from the incrementally maintained weekday x hour x type histogram
+INSIGHTS_Q7 = drift_histogram.DRIFTIEST_HOURS_QUERY
 
-    try:
-        # Query 5: Unclassified High-Activity Domains (last 30 days)
-        q5 = (
-            """
-            SELECT 
-                d.domain_name, d.id AS domain_id, SUM(dds.total_seconds_focused) AS total_time_seconds
-            FROM daily_domain_summary dds
-            JOIN domains d ON dds.domain_id = d.id
-            WHERE 
-                dds.user_id = %s
-                AND d.category = 'Neutral'
-                AND dds.summary_date > (CURDATE() - INTERVAL 30 DAY)
-                AND NOT EXISTS (
-                    SELECT 1 FROM whitelists w WHERE w.domain_id = d.id AND w.user_id = d.user_id
-                )
-            GROUP BY d.domain_name, d.id
-            ORDER BY total_time_seconds DESC
-            LIMIT 5
-            """
-        )
-        cursor.execute(q5, (user_id,))
-        unclassified_domains = rows_to_dicts(cursor.fetchall(), cursor)
-
-        # Query 6: Tab Switches vs Productivity (per-session productive minutes)
-        # Computes productive_seconds strictly within each session boundaries by summing
-        # focus durations on tabs categorized as 'Productive'.
-        q6 = (
-            """
-            SELECT 
-                s.sid, s.start_time, TIMESTAMPDIFF(MINUTE, s.start_time, s.end_time) AS total_minutes,
-                (SELECT COUNT(*) 
-                 FROM activity_event ae 
-                 WHERE ae.session_id = s.sid AND ae.event_type = 'TAB_FOCUS'
-                ) AS tab_switches,
-                (
-                    SELECT COALESCE(SUM(
-                        TIMESTAMPDIFF(SECOND,
-                            ae.timestamp,
-                            LEAST(COALESCE(ae.next_ts, s.end_time), s.end_time)
-                        )
-                    ), 0)
-                    FROM (
-                        SELECT 
-                            ae.session_id, ae.timestamp, ae.tab_id,
-                            LEAD(ae.timestamp) OVER (PARTITION BY ae.session_id ORDER BY ae.timestamp) AS next_ts
-                        FROM activity_event ae
-                        WHERE ae.session_id = s.sid AND ae.event_type = 'TAB_FOCUS'
-                    ) AS ae
-                    JOIN tab t ON ae.tab_id = t.tid
-                    JOIN domains d ON t.domain_id = d.id
-                    WHERE d.category = 'Productive'
-                ) AS productive_seconds
-            FROM sessions s
-            WHERE s.user_id = %s AND s.end_time IS NOT NULL
-            ORDER BY s.start_time DESC
-            """
-        )
-        cursor.execute(q6, (user_id,))
-        session_productivity = rows_to_dicts(cursor.fetchall(), cursor)
+# Query 8: Stickiest Distractions
+INSIGHTS_Q8 = """
+    WITH TabFocusDurations AS (
+        SELECT t.domain_id,
+               TIMESTAMPDIFF(SECOND, ae.timestamp, LEAD(ae.timestamp, 1) OVER(PARTITION BY ae.session_id ORDER BY ae.timestamp)) AS focus_duration_seconds
+        FROM activity_event ae
+        JOIN tab t ON ae.tab_id = t.tid
+        WHERE ae.event_type = 'TAB_FOCUS' AND ae.user_id = %s
+    )
+    SELECT d.domain_name,
+           AVG(tfd.focus_duration_seconds) AS avg_duration_seconds
+    FROM TabFocusDurations tfd
+    JOIN domains d ON tfd.domain_id = d.id
+    WHERE d.user_id = %s
+      AND d.category = 'Unproductive'
+      AND tfd.focus_duration_seconds IS NOT NULL
+      AND tfd.focus_duration_seconds < 1800
+    GROUP BY d.domain_name
+    ORDER BY avg_duration_seconds DESC
+    LIMIT 5
+    """
 
-        # Query 7: Driftiest Hours of the Day
-        q7 = (
-            """
-            SELECT 
-                HOUR(de.event_start) AS drift_hour,
-                COUNT(*) AS total_drifts,
-                'Unproductive Shift' AS most_common_drift_type
-            FROM drift_event de
-            JOIN sessions s ON de.session_id = s.sid
-            WHERE s.user_id = %s
-            GROUP BY HOUR(de.event_start)
-            ORDER BY total_drifts DESC
-            """
-        )
-        cursor.execute(q7, (user_id,))
-        driftiest_hours = rows_to_dicts(cursor.fetchall(), cursor)
-
-        # Query 8: Stickiest Distractions
-        q8 = (
-            """
-            WITH TabFocusDurations AS (
-                SELECT t.domain_id,
-                       TIMESTAMPDIFF(SECOND, ae.timestamp, LEAD(ae.timestamp, 1) OVER(PARTITION BY ae.session_id ORDER BY ae.timestamp)) AS focus_duration_seconds
-                FROM activity_event ae
-                JOIN tab t ON ae.tab_id = t.tid
-                WHERE ae.event_type = 'TAB_FOCUS' AND ae.user_id = %s
-            )
-            SELECT d.domain_name,
-                   AVG(tfd.focus_duration_seconds) AS avg_duration_seconds
-            FROM TabFocusDurations tfd
-            JOIN domains d ON tfd.domain_id = d.id
-            WHERE d.user_id = %s
-              AND d.category = 'Unproductive'
-              AND tfd.focus_duration_seconds IS NOT NULL
-              AND tfd.focus_duration_seconds < 1800
-            GROUP BY d.domain_name
-            ORDER BY avg_duration_seconds DESC
-            LIMIT 5
-            """
-        )
-        cursor.execute(q8, (user_id, user_id))
-        stickiest_distractions = rows_to_dicts(cursor.fetchall(), cursor)
+def insights_queries(user_id):
+    """Independent insights queries, keyed by response field, for query_fanout.run_queries."""
+    return {
+        "unclassified_domains": (INSIGHTS_Q5, (user_id,), 'insights.q5'),
+        "session_productivity": (INSIGHTS_Q6, (user_id,), 'insights.q6'),
+        "driftiest_hours": (INSIGHTS_Q7, (user_id,), 'insights.q7'),
+        "stickiest_distractions": (INSIGHTS_Q8, (user_id, user_id), 'insights.q8'),
+    }
 
-        return {
-            "unclassified_domains": unclassified_domains,
-            "session_productivity": session_productivity,
-            "driftiest_hours": driftiest_hours,
-            "stickiest_distractions": stickiest_distractions,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch insights: {str(e)}")
-    finally:
-        cursor.close()
-        conn.close()
+def run_fanout(queries, what, user_id):
+    """Run independent read queries for user_id concurrently, mapping failures to HTTP errors."""
+    try:
+        return query_fanout.run_queries(queries, user_id=user_id)
+    except query_fanout.FanoutTimeout:
+        raise HTTPException(status_code=504, detail=f"Timed out fetching {what}")
+    except query_fanout.FanoutError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch {what}: {str(e)}")
+
+@app.get("/api/dashboard/insights")
+def get_insights(current_user: dict = Depends(get_current_user)):
+    """Return insights data composed of multiple analytic queries, run concurrently."""
+    user_id = current_user["user_id"]
+    return run_fanout(insights_queries(user_id), "insights", user_id)
 
 
 @app.post("/api/tab/open", response_model=TabResponse)
 async def tab_open(payload: TabPayload, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
+    conn = get_db_connection(user_id=current_user["user_id"])
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
     cursor = conn.cursor()
     user_id = current_user["user_id"]
     
+    domain_name = extract_domain(payload.url)
     try:
         # 1. Get the clean domain
-        cursor.execute("SELECT extractDomainFromUrl(%s) AS domain_name", (payload.url,))
-        result = cursor.fetchone()
-        domain_name = result[0] if result else None
-        
         if not domain_name:
             raise HTTPException(status_code=400, detail="Invalid URL")
 
-        # 2. Get or create the domain_id and determine category
-        # First check if domain exists
-        cursor.execute("SELECT id, category FROM domains WHERE user_id = %s AND domain_name = %s", 
-                      (user_id, domain_name))
-        result = cursor.fetchone()
+        # 2. Get or create the user's mapping row (cached after the first visit)
+        domain_id, created = domain_catalog.resolve_domain(cursor, user_id, domain_name)
+        if created:
+            # Make the new ids visible before they are cached for other requests
+            conn.commit()
         
-        domain_exists = result is not None
-        if domain_exists:
-            domain_id = result[0]
-            current_category = result[1] if len(result) > 1 else None
-        else:
-            # Create new domain - category will be set below based on whitelist
-            cursor.execute("INSERT INTO domains (user_id, domain_name, category) VALUES (%s, %s, 'Neutral')",
-                          (user_id, domain_name))
-            domain_id = cursor.lastrowid
-            current_category = 'Neutral'
-        
-        # 3. Check if domain is in whitelist
-        cursor.execute("SELECT domain_id FROM whitelists WHERE user_id = %s AND domain_id = %s",
-                      (user_id, domain_id))
-        is_whitelisted = cursor.fetchone() is not None
+        # 3. Check the current category and whether the domain is in the whitelist
+        cursor.execute("""
+            SELECT d.category, w.domain_id IS NOT NULL
+            FROM domains d
+            LEFT JOIN whitelists w ON w.user_id = d.user_id AND w.domain_id = d.id
+            WHERE d.id = %s
+        """, (domain_id,), query_name='tab_open.domain_state')
+        result = cursor.fetchone()
+        current_category = result[0] if result else None
+        is_whitelisted = bool(result[1]) if result else False
         
         # 4. Update category based on whitelist rules:
         # - If in whitelist -> Productive
@@ -327,9 +372,14 @@ async def tab_open(payload: TabPayload, current_user: dict = Depends(get_current
         tid = cursor.lastrowid
         
         conn.commit()
+        live_drift.remember_tab(payload.session_id, tid, domain_name,
+                                'Productive' if is_whitelisted else 'Unproductive')
         return TabResponse(tid=tid, domain_id=domain_id)
+    except HTTPException:
+        raise
     except Exception as e:
         conn.rollback()
+        domain_catalog.forget(user_id, domain_name)
         raise HTTPException(status_code=500, detail=f"Failed to open tab: {str(e)}")
     finally:
         cursor.close()
@@ -361,127 +411,343 @@ async def tab_close(payload: dict = Body(...)):
 
 @app.post("/api/events/batch")
 async def events_batch(payload: EventBatchPayload, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
+    user_id = current_user["user_id"]
+    # A retry of a batch this process already committed needs no database work
+    if ingest_dedup.already_ingested(user_id, payload.batch_id):
+        return {"inserted_count": 0, "drifts_detected": 0, "duplicate": True}
+    events = ingest_dedup.dedupe_events(payload.events)
+
+    conn = get_db_connection(user_id=user_id)
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
     cursor = conn.cursor()
-    user_id = current_user["user_id"]
     
-    insert_data = []
-    for event in payload.events:
-        insert_data.append((
-            payload.session_id,
-            user_id,
-            event.tab_id,
-            event.event_type,
-            event.timestamp,
-            event.url,
-            event.mouse_x,
-            event.mouse_y,
-            event.scroll_y_pixels,
-            event.scroll_y_percent,
-            event.target_element_id
-        ))
-
     query = """
         INSERT INTO activity_event (
-            session_id, user_id, tab_id, event_type, timestamp, url, 
-            mouse_x, mouse_y, scroll_y_pixels, scroll_y_percent, target_element_id
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            session_id, user_id, tab_id, event_type, timestamp, url, url_id,
+            mouse_x, mouse_y, scroll_y_pixels, scroll_y_percent,
+            target_element_id, target_element_ref
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
     
+    # Fold mouse/scroll/click events into per-minute engagement buckets
+    engagement_rows = build_engagement_buckets(payload.session_id, user_id, events)
+    
     try:
-        cursor.executemany(query, insert_data)
+        # Intern URLs and element ids first and commit them on their own so the
+        # process-wide intern cache never holds ids from a rolled-back batch
+        encoded = encode_events(cursor, events)
         conn.commit()
+        
+        # Claim the batch id in the events' transaction; a taken claim means
+        # an earlier attempt committed and the client missed the response
+        if payload.batch_id is not None and not ingest_dedup.claim_batch(
+                cursor, user_id, payload.batch_id, payload.session_id, events):
+            conn.rollback()
+            return {"inserted_count": 0, "drifts_detected": 0, "duplicate": True}
+        
+        # Charged only once the claim holds, so acknowledged retries cost no budget
+        wait = rate_limit.check_user_events(user_id, len(events))
+        if wait:
+            raise HTTPException(status_code=429, detail="Event rate limit exceeded, retry later",
+                                headers=rate_limit.retry_after_header(wait))
+        
+        insert_data = []
+        for event, (url, url_id, element_id, element_ref, _) in zip(events, encoded):
+            insert_data.append((
+                payload.session_id,
+                user_id,
+                event.tab_id,
+                event.event_type,
+                event.timestamp,
+                url,
+                url_id,
+                event.mouse_x,
+                event.mouse_y,
+                event.scroll_y_pixels,
+                event.scroll_y_percent,
+                element_id,
+                element_ref
+            ))
+        
+        cursor.executemany(query, insert_data, query_name='ingest.activity_event')
         inserted_count = cursor.rowcount
+        upsert_engagement_buckets(cursor, engagement_rows)
+        touch_activity(cursor, payload.session_id, events)
+        conn.commit()
+        ingest_dedup.mark_ingested(user_id, payload.batch_id)
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database insert failed: {str(e)}")
+    else:
+        # Run the drift rules on the committed events and push what they find
+        url_flags = [flags for *_, flags in encoded]
+        drifts = live_drift.process_batch(conn, payload.session_id, user_id, events, url_flags)
     finally:
         cursor.close()
         conn.close()
     
-    return {"inserted_count": inserted_count}
+    return {"inserted_count": inserted_count, "drifts_detected": len(drifts)}
+
+@app.get("/api/drifts/stream")
+async def drift_stream(request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Server-Sent Events stream of drifts detected on the ingest path for
+    the current user. Each message is `event: drift` with the drift as JSON.
+    """
+    return StreamingResponse(
+        live_drift.sse_stream(request, current_user["user_id"]),
+        media_type=live_drift.SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+ANALYTICS_GRAINS = ('auto', 'day', 'week', 'month')
+
+# Drift events of the period, for the area chart and drift list
+ANALYTICS_DRIFTS = """
+    SELECT drift_id, drift_type, description, event_start, event_end, 
+           duration_seconds, severity
+    FROM drift_event
+    WHERE session_id IN (SELECT sid FROM sessions WHERE user_id = %s)
+    AND event_start > (CURDATE() - INTERVAL %s DAY)
+    ORDER BY event_start DESC
+"""
+
+def resolve_analytics_period(period_days, grain, top_n):
+    """Validate analytics parameters; returns (grain, period start date)."""
+    if grain not in ANALYTICS_GRAINS:
+        raise HTTPException(status_code=400, detail=f"grain must be one of {', '.join(ANALYTICS_GRAINS)}")
+    if period_days <= 0 or top_n <= 0:
+        raise HTTPException(status_code=400, detail="period_days and top_n must be positive")
+    if grain == 'auto':
+        grain = rollups.choose_grain(period_days)
+    return grain, rollups.period_start(grain, period_days)
+
+def analytics_queries(user_id, period_days, grain, start_date, top_n):
+    """Independent analytics queries, keyed by response field, for query_fanout.run_queries."""
+    return {
+        "drift_events": (ANALYTICS_DRIFTS, (user_id, period_days), 'analytics.drifts'),
+        # Per-bucket summaries of the top domains, for bar and line charts
+        "domain_summaries": (rollups.top_domains_query(grain),
+                             (user_id, start_date, top_n, top_n, user_id, start_date),
+                             f'analytics.domain_summaries.{grain}'),
+        # Category totals, for pie chart
+        "category_totals": (rollups.category_totals_query(grain), (user_id, start_date),
+                            f'analytics.category_totals.{grain}'),
+    }
 
 @app.get("/api/dashboard/analytics")
-async def get_analytics(period_days: int = 7, current_user: dict = Depends(get_current_user)):
-    """Get comprehensive analytics for the dashboard."""
-    conn = get_db_connection()
+def get_analytics(period_days: int = 7, grain: str = 'auto', top_n: int = 10,
+                  current_user: dict = Depends(get_current_user)):
+    """
+    Get comprehensive analytics for the dashboard.
+    
+    Domain summaries are read from the daily, weekly or monthly rollup
+    (grain=auto picks the coarsest that fits period_days) and limited to the
+    top_n domains of the period plus one 'Other' row per bucket. The
+    queries run concurrently.
+    """
+    grain, start_date = resolve_analytics_period(period_days, grain, top_n)
+    user_id = current_user["user_id"]
+    result = run_fanout(analytics_queries(user_id, period_days, grain, start_date, top_n),
+                        "analytics", user_id)
+    result["grain"] = grain
+    result["period_start"] = start_date
+    return result
+
+WHITELIST_QUERY = """
+    SELECT w.wid, w.user_id, w.domain_id, w.user_reason, w.created_at,
+           d.domain_name, d.category
+    FROM whitelists w
+    JOIN domains d ON w.domain_id = d.id
+    WHERE w.user_id = %s
+    ORDER BY w.created_at DESC
+"""
+
+@app.get("/api/dashboard/bootstrap")
+def get_dashboard_bootstrap(period_days: int = 7, grain: str = 'auto', top_n: int = 10,
+                            current_user: dict = Depends(get_current_user)):
+    """
+    Everything the dashboard shows on load (analytics, insights and
+    whitelist) in one response, with all queries run concurrently.
+    """
+    user_id = current_user["user_id"]
+    grain, start_date = resolve_analytics_period(period_days, grain, top_n)
+    analytics = analytics_queries(user_id, period_days, grain, start_date, top_n)
+    insights = insights_queries(user_id)
+    queries = {f"analytics.{key}": query for key, query in analytics.items()}
+    queries.update({f"insights.{key}": query for key, query in insights.items()})
+    queries["whitelist"] = (WHITELIST_QUERY, (user_id,), 'whitelist.list')
+    
+    results = run_fanout(queries, "dashboard", user_id)
+    return {
+        "analytics": dict({key: results[f"analytics.{key}"] for key in analytics},
+                          grain=grain, period_start=start_date),
+        "insights": {key: results[f"insights.{key}"] for key in insights},
+        "whitelist": results["whitelist"],
+    }
+
+@app.get("/api/dashboard/drift-timeline")
+def get_drift_timeline(request: Request, period_days: int = 7, bucket: str = 'auto',
+                       current_user: dict = Depends(get_current_user)):
+    """
+    Drift count and total duration per (bucket, drift_type), aggregated in
+    MySQL. bucket=auto picks hour, day or week from period_days.
+    Responses carry an ETag and may be cached for TIMELINE_CACHE_SECONDS.
+    """
+    if bucket not in drift_timeline.TIMELINE_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(drift_timeline.TIMELINE_BUCKETS)}")
+    if period_days <= 0:
+        raise HTTPException(status_code=400, detail="period_days must be positive")
+    if bucket == 'auto':
+        bucket = drift_timeline.choose_bucket(period_days)
+    
+    user_id = current_user["user_id"]
+    try:
+        body, etag = drift_timeline.get_timeline(lambda: get_db_connection(INTENT_READ, user_id),
+                                                 user_id, bucket, period_days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ConnectionError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch drift timeline: {str(e)}")
+    
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={int(drift_timeline.TIMELINE_CACHE_SECONDS)}"}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/dashboard/drift-heatmap")
+def get_drift_heatmap(drift_type: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """
+    Drift counts by day of week (Monday first) and hour of day, with
+    weekday/weekend totals per hour, optionally for one drift type.
+    """
+    user_id = current_user["user_id"]
+    conn = get_db_connection(INTENT_READ, user_id)
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
     cursor = conn.cursor()
-    user_id = current_user["user_id"]
+    try:
+        cursor.execute(drift_histogram.HEATMAP_QUERY, (user_id,), query_name='drift_histogram.heatmap')
+        return drift_histogram.build_heatmap(cursor.fetchall(), drift_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch drift heatmap: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
 
+@app.get("/api/dashboard/drift-thresholds")
+def get_drift_thresholds(current_user: dict = Depends(get_current_user)):
+    """
+    The limits and severity cutoffs the drift rules use for this user, and
+    which behaviours they were personalized from.
+    """
+    user_id = current_user["user_id"]
+    conn = get_db_connection(INTENT_READ, user_id)
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    cursor = conn.cursor()
     try:
-        # Helper function to convert rows to dicts
-        def rows_to_dicts(rows, cursor):
-            if not rows or not cursor.description:
-                return []
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
-        
-        # Get drift events, for area chart
-        query_drifts = """
-            SELECT drift_id, drift_type, description, event_start, event_end, 
-                   duration_seconds, severity
-            FROM drift_event
-            WHERE session_id IN (SELECT sid FROM sessions WHERE user_id = %s)
-            AND event_start > (CURDATE() - INTERVAL %s DAY)
-            ORDER BY event_start DESC
-        """
-        cursor.execute(query_drifts, (user_id, period_days))
-        drifts_rows = cursor.fetchall()
-        drifts = rows_to_dicts(drifts_rows, cursor)
-        
-        # Get daily domain summaries, for bar chart
-        query_summaries = """
-            SELECT d.domain_name, d.category, dds.summary_date,
-                   dds.total_seconds_focused, dds.total_events
-            FROM daily_domain_summary dds
-            JOIN domains d ON dds.domain_id = d.id
-            WHERE dds.user_id = %s
-            AND dds.summary_date > (CURDATE() - INTERVAL %s DAY)
-            ORDER BY dds.summary_date DESC, dds.total_seconds_focused DESC
-        """
-        cursor.execute(query_summaries, (user_id, period_days))
-        summaries_rows = cursor.fetchall()
-        summaries = rows_to_dicts(summaries_rows, cursor)
-        
-        # Get category totals, for pie chart
-        query_category_totals = """
-            SELECT d.category, SUM(dds.total_seconds_focused) as total_seconds
-            FROM daily_domain_summary dds
-            JOIN domains d ON dds.domain_id = d.id
-            WHERE dds.user_id = %s
-            AND dds.summary_date > (CURDATE() - INTERVAL %s DAY)
-            GROUP BY d.category
-        """
-        cursor.execute(query_category_totals, (user_id, period_days))
-        category_totals_rows = cursor.fetchall()
-        category_totals = rows_to_dicts(category_totals_rows, cursor)
-        
-        return {
-            "drift_events": drifts or [],
-            "domain_summaries": summaries or [],
-            "category_totals": category_totals or []
-        }
+        return drift_thresholds.load_thresholds(cursor, user_id).to_dict()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch drift thresholds: {str(e)}")
     finally:
         cursor.close()
         conn.close()
 
+STREAM_FORMATS = ('ndjson', 'json')
+
+@app.get("/api/dashboard/drifts/stream")
+def stream_drift_events(period_days: int = 7, format: str = 'ndjson', current_user: dict = Depends(get_current_user)):
+    """Stream the user's drift events for the period as NDJSON (default) or a JSON array."""
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(STREAM_FORMATS)}")
+    
+    conn = get_db_connection(INTENT_READ, current_user["user_id"])
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    return stream_query(conn, ANALYTICS_DRIFTS, (current_user["user_id"], period_days), fmt=format,
+                        query_name='stream.drift_events', key='drift_events')
+
+@app.get("/api/export/{resource}")
+def export_history(
+    resource: str,
+    format: str = 'ndjson',
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    types: Optional[str] = None,
+    after_id: int = 0,
+    limit: Optional[int] = None,
+    user_id: Optional[int] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Stream raw history (events, tabs or drifts) in key order.
+    
+    Rows are read in keyset-paginated chunks; resume an interrupted export by
+    passing the last received id as after_id. Admins may export any user (or
+    all users); regular users always get their own data.
+    """
+    if resource not in export.EXPORT_RESOURCES:
+        raise HTTPException(status_code=404, detail=f"Unknown export resource: {resource}")
+    if format not in ('ndjson', 'parquet'):
+        raise HTTPException(status_code=400, detail="format must be ndjson or parquet")
+    if format == 'parquet' and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed")
+    if limit is not None and limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    
+    if current_user.get("role") == "admin":
+        export_user_id = user_id
+    else:
+        export_user_id = current_user["user_id"]
+    type_list = [t.strip() for t in types.split(',') if t.strip()] if types else None
+    
+    if not export.export_slots.acquire(blocking=False):
+        raise HTTPException(status_code=429, detail="Too many exports running, retry later",
+                            headers={"Retry-After": "30"})
+    conn = get_db_connection(INTENT_READ, current_user["user_id"])
+    if conn is None:
+        export.export_slots.release()
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    # From here on the stream releases the connection and slot, even if it is never iterated
+    stream = export.ExportStream(None, conn)
+    try:
+        chunks = export.iter_export_chunks(conn, resource, export_user_id, start, end, type_list,
+                                           after_id=after_id, limit=limit)
+        if format == 'parquet':
+            stream.body = export.parquet_export(resource, chunks)
+            media_type = 'application/vnd.apache.parquet'
+            filename = f"{resource}.parquet"
+        else:
+            stream.body = export.ndjson_export(chunks)
+            media_type = NDJSON_MEDIA_TYPE
+            filename = f"{resource}.ndjson"
+        return StreamingResponse(stream, media_type=media_type,
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    except Exception:
+        stream.close()
+        raise
+
 @app.get("/api/whitelist")
 async def get_whitelist(current_user: dict = Depends(get_current_user)):
     """Get all whitelisted domains for a user."""
-    conn = get_db_connection()
+    user_id = current_user["user_id"]
+    conn = get_db_connection(INTENT_READ, user_id)
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
     cursor = conn.cursor()
-    user_id = current_user["user_id"]
     
     try:
         def rows_to_dicts(rows, cursor):
@@ -490,15 +756,7 @@ async def get_whitelist(current_user: dict = Depends(get_current_user)):
             columns = [desc[0] for desc in cursor.description]
             return [dict(zip(columns, row)) for row in rows]
         
-        query = """
-            SELECT w.wid, w.user_id, w.domain_id, w.user_reason, w.created_at,
-                   d.domain_name, d.category
-            FROM whitelists w
-            JOIN domains d ON w.domain_id = d.id
-            WHERE w.user_id = %s
-            ORDER BY w.created_at DESC
-        """
-        cursor.execute(query, (user_id,))
+        cursor.execute(WHITELIST_QUERY, (user_id,), query_name='whitelist.list')
         rows = cursor.fetchall()
         whitelist = rows_to_dicts(rows, cursor)
         
@@ -513,13 +771,13 @@ async def get_whitelist(current_user: dict = Depends(get_current_user)):
 async def add_to_whitelist(payload: dict = Body(...), current_user: dict = Depends(get_current_user)):
     """Add a domain to the user's whitelist by domain_name."""
     user_id = current_user["user_id"]
-    domain_name = payload.get('domain_name')
+    domain_name = extract_domain(payload.get('domain_name'))
     user_reason = payload.get('user_reason', '')
     
     if not domain_name:
         raise HTTPException(status_code=400, detail="Missing domain_name")
     
-    conn = get_db_connection()
+    conn = get_db_connection(user_id=user_id)
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -527,17 +785,7 @@ async def add_to_whitelist(payload: dict = Body(...), current_user: dict = Depen
     
     try:
         # Get or create domain
-        cursor.execute("SELECT id FROM domains WHERE user_id = %s AND domain_name = %s",
-                      (user_id, domain_name))
-        result = cursor.fetchone()
-        
-        if result:
-            domain_id = result[0]
-        else:
-            # Create new domain
-            cursor.execute("INSERT INTO domains (user_id, domain_name, category) VALUES (%s, %s, 'Productive')",
-                          (user_id, domain_name))
-            domain_id = cursor.lastrowid
+        domain_id, _ = domain_catalog.resolve_domain(cursor, user_id, domain_name)
         
         # Add to whitelist
         query = """
@@ -551,9 +799,11 @@ async def add_to_whitelist(payload: dict = Body(...), current_user: dict = Depen
         cursor.execute("UPDATE domains SET category = 'Productive' WHERE id = %s", (domain_id,))
         
         conn.commit()
+        live_drift.invalidate_user_tabs(user_id)
         return {"status": "ok", "whitelisted": True, "domain_id": domain_id}
     except Exception as e:
         conn.rollback()
+        domain_catalog.forget(user_id, domain_name)
         raise HTTPException(status_code=500, detail=f"Failed to whitelist domain: {str(e)}")
     finally:
         cursor.close()
@@ -562,7 +812,7 @@ async def add_to_whitelist(payload: dict = Body(...), current_user: dict = Depen
 @app.delete("/api/whitelist/{domain_id}")
 async def remove_from_whitelist(domain_id: int, current_user: dict = Depends(get_current_user)):
     """Remove a domain from the user's whitelist."""
-    conn = get_db_connection()
+    conn = get_db_connection(user_id=current_user["user_id"])
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -579,6 +829,7 @@ async def remove_from_whitelist(domain_id: int, current_user: dict = Depends(get
                       (domain_id, user_id))
         
         conn.commit()
+        live_drift.invalidate_user_tabs(user_id)
         return {"status": "ok", "removed": True}
     except Exception as e:
         conn.rollback()
@@ -587,6 +838,89 @@ async def remove_from_whitelist(domain_id: int, current_user: dict = Depends(get
         cursor.close()
         conn.close()
 
+@app.post("/api/whitelist/import")
+async def import_whitelist(request: Request, mode: str = 'merge', dry_run: bool = False,
+                           current_user: dict = Depends(get_current_user)):
+    """
+    Apply a whitelist in one transaction.
+    
+    Accepts a JSON list (names or {domain_name, user_reason} objects), a
+    text/csv body, or a multipart upload with a 'file' field.
+    mode=replace also removes whitelisted domains missing from the import;
+    dry_run reports the diff without applying it.
+    """
+    if mode not in whitelist_bulk.IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(whitelist_bulk.IMPORT_MODES)}")
+    
+    content_type = request.headers.get('content-type', '')
+    try:
+        if content_type.startswith('multipart/form-data'):
+            form = await request.form()
+            upload = form.get('file')
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Missing 'file' field")
+            raw = (await upload.read()).decode('utf-8-sig')
+            filename = (upload.filename or '').lower()
+            if filename.endswith('.json'):
+                entries = whitelist_bulk.parse_json(json.loads(raw))
+            else:
+                entries = whitelist_bulk.parse_csv(raw)
+        elif content_type.startswith('text/csv') or content_type.startswith('text/plain'):
+            entries = whitelist_bulk.parse_csv((await request.body()).decode('utf-8-sig'))
+        else:
+            entries = whitelist_bulk.parse_json(await request.json())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid whitelist import: {str(e)}")
+    
+    if len(entries) > whitelist_bulk.MAX_IMPORT_DOMAINS:
+        raise HTTPException(status_code=400, detail=f"At most {whitelist_bulk.MAX_IMPORT_DOMAINS} domains per import")
+    
+    conn = get_db_connection(user_id=current_user["user_id"])
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    try:
+        result = whitelist_bulk.apply_import(conn, current_user["user_id"], entries, mode=mode, dry_run=dry_run)
+        if not dry_run:
+            live_drift.invalidate_user_tabs(current_user["user_id"])
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to import whitelist: {str(e)}")
+    finally:
+        conn.close()
+
+@app.get("/api/whitelist/export")
+async def export_whitelist(format: str = 'json', current_user: dict = Depends(get_current_user)):
+    """Export the user's whitelist as JSON or CSV (re-importable with /api/whitelist/import)."""
+    if format not in ('json', 'csv'):
+        raise HTTPException(status_code=400, detail="format must be json or csv")
+    
+    conn = get_db_connection(INTENT_READ, current_user["user_id"])
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        cursor.execute("""
+            SELECT d.domain_name, w.user_reason, d.category, w.created_at
+            FROM whitelists w
+            JOIN domains d ON w.domain_id = d.id
+            WHERE w.user_id = %s
+            ORDER BY d.domain_name
+        """, (current_user["user_id"],), query_name='whitelist.export')
+        rows = cursor.fetchall()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to export whitelist: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
+    
+    if format == 'csv':
+        return Response(content=whitelist_bulk.export_csv(rows), media_type='text/csv',
+                        headers={"Content-Disposition": 'attachment; filename="whitelist.csv"'})
+    return {"domains": rows}
+
 # --- Authentication Endpoints ---
 @app.post("/api/auth/signup", response_model=Token)
 async def signup(user: UserSignup):
@@ -783,9 +1117,17 @@ def get_admin_user(current_user: dict = Depends(get_current_user)):
     return current_user
 
 @app.get("/api/admin/stats")
-async def get_admin_stats(current_user: dict = Depends(get_admin_user)):
-    """Get system-wide statistics for admin dashboard."""
-    conn = get_db_connection_for_user('admin')
+async def get_admin_stats(exact: bool = False, current_user: dict = Depends(get_admin_user)):
+    """
+    Get system-wide statistics for admin dashboard.
+    
+    Active users and top domains are estimated from the per-day sketches
+    built by jobs/run_stat_sketches.py (HyperLogLog and Space-Saving, see
+    stat_sketches.py) unless exact=true, which runs the full scans for
+    audits. Tiles without stored sketches (for active users: without one
+    for every day of the window) fall back to the exact query.
+    """
+    conn = get_db_connection_for_user('admin', INTENT_READ, current_user["user_id"])
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -796,13 +1138,19 @@ async def get_admin_stats(current_user: dict = Depends(get_admin_user)):
         cursor.execute("SELECT COUNT(*) FROM user")
         total_users = cursor.fetchone()[0]
         
+        approximation = {}
         # Active users (users with sessions in last 30 days)
-        cursor.execute("""
-            SELECT COUNT(DISTINCT user_id) 
-            FROM sessions 
-            WHERE start_time > (CURDATE() - INTERVAL 30 DAY)
-        """)
-        active_users = cursor.fetchone()[0]
+        estimate = None if exact else stat_sketches.approximate_active_users(cursor, date.today())
+        if estimate is not None:
+            active_users = estimate["estimate"]
+            approximation["active_users"] = estimate
+        else:
+            cursor.execute("""
+                SELECT COUNT(DISTINCT user_id) 
+                FROM sessions 
+                WHERE start_time > (CURDATE() - INTERVAL 30 DAY)
+            """)
+            active_users = cursor.fetchone()[0]
         
         # Total sessions
         cursor.execute("SELECT COUNT(*) FROM sessions")
@@ -820,22 +1168,32 @@ async def get_admin_stats(current_user: dict = Depends(get_admin_user)):
         """)
         avg_session_duration = cursor.fetchone()[0] or 0
         
-        # Top domains by total time across all users
-        cursor.execute("""
-            SELECT d.domain_name, d.category, SUM(dds.total_seconds_focused) as total_time
-            FROM daily_domain_summary dds
-            JOIN domains d ON dds.domain_id = d.id
-            GROUP BY d.domain_name, d.category
-            ORDER BY total_time DESC
-            LIMIT 10
-        """)
-        top_domains = []
-        for row in cursor.fetchall():
-            top_domains.append({
-                "domain": row[0],
-                "category": row[1],
-                "total_seconds": row[2]
-            })
+        # Top domains by total time across all users, aggregated on catalog ids
+        estimate = None if exact else stat_sketches.approximate_top_domains(cursor, 10)
+        if estimate is not None:
+            top_domains = estimate["domains"]
+            approximation["top_domains"] = {"days": estimate["days"]}
+        else:
+            cursor.execute("""
+                SELECT c.domain_name, c.default_category, top.total_time
+                FROM (
+                    SELECT d.catalog_id, SUM(dds.total_seconds_focused) AS total_time
+                    FROM daily_domain_summary dds
+                    JOIN domains d ON dds.domain_id = d.id
+                    GROUP BY d.catalog_id
+                    ORDER BY total_time DESC
+                    LIMIT 10
+                ) top
+                JOIN domain_catalog c ON c.catalog_id = top.catalog_id
+                ORDER BY top.total_time DESC
+            """, query_name='admin.top_domains')
+            top_domains = []
+            for row in cursor.fetchall():
+                top_domains.append({
+                    "domain": row[0],
+                    "category": row[1],
+                    "total_seconds": row[2]
+                })
         
         return {
             "total_users": total_users,
@@ -843,7 +1201,9 @@ async def get_admin_stats(current_user: dict = Depends(get_admin_user)):
             "total_sessions": total_sessions,
             "total_drifts": total_drifts,
             "avg_session_duration_minutes": round(avg_session_duration, 2),
-            "top_domains": top_domains
+            "top_domains": top_domains,
+            "approximate": bool(approximation),
+            "approximation": approximation
         }
         
     except Exception as e:
@@ -852,10 +1212,15 @@ async def get_admin_stats(current_user: dict = Depends(get_admin_user)):
         cursor.close()
         conn.close()
 
+@app.get("/api/admin/limits")
+def get_admin_limits(current_user: dict = Depends(get_admin_user)):
+    """Rate limiter and load shedding state of this API process."""
+    return rate_limit.snapshot()
+
 @app.get("/api/admin/users")
 async def get_admin_users(current_user: dict = Depends(get_admin_user)):
     """Get list of all users for admin dashboard."""
-    conn = get_db_connection()
+    conn = get_db_connection(INTENT_READ, current_user["user_id"])
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -894,10 +1259,38 @@ async def get_admin_users(current_user: dict = Depends(get_admin_user)):
         cursor.close()
         conn.close()
 
-@app.delete("/api/admin/users/{user_id}")
-async def delete_user(user_id: int, current_user: dict = Depends(get_admin_user)):
-    """Delete a user and all associated data (admin only)."""
-    conn = get_db_connection()
+@app.get("/api/admin/users/stream")
+def stream_admin_users(format: str = 'ndjson', current_user: dict = Depends(get_admin_user)):
+    """Stream the admin user list as NDJSON (default) or a JSON array, without buffering it."""
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(STREAM_FORMATS)}")
+    
+    conn = get_db_connection(INTENT_READ, current_user["user_id"])
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    query = """
+        SELECT 
+            u.uid AS id, u.email, u.created_at,
+            COUNT(DISTINCT s.sid) as session_count,
+            COUNT(DISTINCT de.drift_id) as drift_count
+        FROM user u
+        LEFT JOIN sessions s ON u.uid = s.user_id
+        LEFT JOIN drift_event de ON s.sid = de.session_id
+        GROUP BY u.uid, u.email, u.created_at
+        ORDER BY u.created_at DESC
+    """
+    return stream_query(conn, query, fmt=format, query_name='stream.admin_users', key='users')
+
+@app.delete("/api/admin/users/{user_id}", status_code=status.HTTP_202_ACCEPTED)
+async def delete_user(user_id: int, background_tasks: BackgroundTasks, current_user: dict = Depends(get_admin_user)):
+    """
+    Queue deletion of a user and all associated data (admin only).
+    
+    The purge runs in the background in bounded chunks per table; poll
+    /api/admin/purge-jobs/{job_id} for progress.
+    """
+    conn = get_db_connection(user_id=current_user["user_id"])
     if conn is None:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -915,26 +1308,8 @@ async def delete_user(user_id: int, current_user: dict = Depends(get_admin_user)
             )
         
         user_email = user_result[1]
-        
-        # Delete the user (this will cascade delete all related data due to foreign key constraints)
-        cursor.execute("DELETE FROM user WHERE uid = %s", (user_id,))
-        
-        # Check if any rows were affected
-        if cursor.rowcount == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"User with ID {user_id} not found"
-            )
-        
+        job_id, created = purge.create_purge_job(cursor, user_id, user_email, requested_by=current_user.get("email"))
         conn.commit()
-        
-        return {
-            "status": "success",
-            "message": f"User {user_email} (ID: {user_id}) and all associated data have been deleted",
-            "deleted_user_id": user_id,
-            "deleted_user_email": user_email
-        }
-        
     except HTTPException:
         conn.rollback()
         raise
@@ -944,6 +1319,39 @@ async def delete_user(user_id: int, current_user: dict = Depends(get_admin_user)
     finally:
         cursor.close()
         conn.close()
+    
+    # A job already queued or running has its runner (or is resumed by the scheduler)
+    if created:
+        background_tasks.add_task(purge.run_purge_job, job_id)
+    return {
+        "status": "accepted",
+        "message": f"Deletion of user {user_email} (ID: {user_id}) has been queued",
+        "job_id": job_id,
+        "status_url": f"/api/admin/purge-jobs/{job_id}",
+        "deleted_user_id": user_id,
+        "deleted_user_email": user_email
+    }
+
+@app.get("/api/admin/purge-jobs/{job_id}")
+async def get_purge_job_status(job_id: int, current_user: dict = Depends(get_admin_user)):
+    """Progress of a background user purge."""
+    conn = get_db_connection()
+    if conn is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    cursor = conn.cursor()
+    
+    try:
+        job = purge.get_purge_job(cursor, job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get purge job: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Purge job {job_id} not found")
+    return job
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,273 @@
+# backend/metrics.py
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms live in a single process-wide registry and
+are rendered by render_metrics() for the API's /metrics endpoint. Processes
+without an HTTP server of their own (the job scheduler) can expose the same
+registry with start_metrics_server().
+"""
+
+import os
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Statements slower than this are printed to the slow-query log
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labelvalues, value, extra in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class _ValueMetric(_Metric):
+    """A single value per label set, set directly or read from a callback at scrape time."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks = {}
+
+    def set_function(self, fn, **labels):
+        """Read the value from fn() at scrape time."""
+        key = self._key(labels)
+        with self._lock:
+            self._callbacks[key] = fn
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        for key, fn in callbacks.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return [('', key, value, None) for key, value in sorted(values.items())]
+
+
+class Counter(_ValueMetric):
+    """Monotonic total; set_function must return a value that only grows (e.g. a running hit count)."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_ValueMetric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, dict(state, counts=list(state["counts"]))) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                samples.append(('_bucket', key, cumulative, ('le', _format_value(float(bound)))))
+            samples.append(('_sum', key, state["sum"], None))
+            samples.append(('_count', key, state["count"], None))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def render_metrics():
+    return REGISTRY.render()
+
+
+# --- Shared metric families ---
+
+http_request_seconds = histogram(
+    'ddt_http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status'))
+db_query_seconds = histogram(
+    'ddt_db_query_duration_seconds', 'Statement latency by stable query name', ('query',))
+db_query_rows = counter(
+    'ddt_db_query_rows_total', 'Rows returned or affected by stable query name', ('query',))
+db_query_errors = counter(
+    'ddt_db_query_errors_total', 'Statements that raised, by stable query name', ('query',))
+db_slow_queries = counter(
+    'ddt_db_slow_queries_total', f'Statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms)', ('query',))
+job_cycle_seconds = histogram(
+    'ddt_job_cycle_duration_seconds', 'Duration of background job cycles', ('job',))
+job_cycles = counter(
+    'ddt_job_cycles_total', 'Background job cycles by outcome', ('job', 'outcome'))
+job_last_success = gauge(
+    'ddt_job_last_success_timestamp_seconds', 'Unix time of the last successful job cycle', ('job',))
+
+
+def record_query(query_name, seconds, sql=None):
+    """Record one statement's latency and write the slow-query log line if needed."""
+    db_query_seconds.observe(seconds, query=query_name)
+    elapsed_ms = seconds * 1000
+    if elapsed_ms >= SLOW_QUERY_MS:
+        db_slow_queries.inc(query=query_name)
+        snippet = ' '.join((sql or '').split())[:200]
+        print(f"[SLOW QUERY] {query_name} took {elapsed_ms:.1f} ms: {snippet}")
+
+
+def timed_job(job_name):
+    """Decorator recording duration and outcome of each job cycle."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                job_cycles.inc(job=job_name, outcome='error')
+                raise
+            finally:
+                job_cycle_seconds.observe(time.perf_counter() - start, job=job_name)
+            job_cycles.inc(job=job_name, outcome='success')
+            job_last_success.set(time.time(), job=job_name)
+            return result
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve /metrics from a daemon thread (for processes without an API server)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
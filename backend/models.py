@@ -32,10 +32,12 @@ class ActivityEvent(BaseModel):
     scroll_y_pixels: Optional[int] = None
     scroll_y_percent: Optional[float] = None
     target_element_id: Optional[str] = None
+    seq: Optional[int] = None  # Client sequence number within the session
 
 class EventBatchPayload(BaseModel):
     session_id: int
     user_id: Optional[int] = None  # Not needed - backend gets it from JWT token
+    batch_id: Optional[str] = Field(None, max_length=64)  # Client idempotency key, unchanged on retry
     events: List[ActivityEvent]
 
 # Authentication Models
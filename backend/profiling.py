@@ -0,0 +1,183 @@
+# backend/profiling.py
+"""
+Opt-in profiling for the batch jobs (--profile).
+
+Jobs wrap their stages in profiling.phase(name, events=n). When profiling is
+off that is a no-op; when on, each phase accumulates wall time, database time
+(wall time inside cursor calls, see database.thread_db_seconds), CPU time
+outside those calls (the job thread's CPU time minus the CPU spent in cursor
+calls, where mysql-connector decodes rows) plus the number of events it
+processed, and report() prints the totals. The three parts do not overlap, so
+the rest of the wall time is waiting outside the database (sleeps, I/O).
+
+Optionally a cProfile dump (pstats, for snakeviz / gprof2dot) and a
+collapsed-stack file (one "frame;frame;frame count" line per stack, the input
+format of flamegraph.pl and speedscope) can be written as well.
+"""
+
+import cProfile
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from database import thread_db_cpu_seconds, thread_db_seconds
+
+
+def _cpu_outside_db():
+    """CPU time of the calling thread not spent inside cursor calls."""
+    return time.thread_time() - thread_db_cpu_seconds()
+
+
+class _PhaseStats:
+    __slots__ = ('calls', 'wall', 'cpu', 'db', 'events')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.db = 0.0
+        self.events = 0
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class JobProfiler:
+    def __init__(self, cprofile_out=None, collapsed_out=None, sample_interval=0.005):
+        self.phases = {}
+        self.cprofile_out = cprofile_out
+        self.collapsed_out = collapsed_out
+        self._cprofile = cProfile.Profile() if cprofile_out else None
+        self._sampler = StackSampler(threading.get_ident(), sample_interval) if collapsed_out else None
+        self._start_wall = None
+        self._start_cpu = None
+        self._start_db = None
+
+    def start(self):
+        self._start_wall = time.perf_counter()
+        self._start_cpu = _cpu_outside_db()
+        self._start_db = thread_db_seconds()
+        if self._sampler:
+            self._sampler.start()
+        if self._cprofile:
+            self._cprofile.enable()
+
+    def stop(self):
+        if self._cprofile:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_out)
+        if self._sampler:
+            self._sampler.stop()
+            self._sampler.write(self.collapsed_out)
+        self.total_wall = time.perf_counter() - self._start_wall
+        self.total_cpu = _cpu_outside_db() - self._start_cpu
+        self.total_db = thread_db_seconds() - self._start_db
+
+    @contextmanager
+    def phase(self, name, events=0):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = _PhaseStats()
+        wall, cpu, db = time.perf_counter(), _cpu_outside_db(), thread_db_seconds()
+        try:
+            yield stats
+        finally:
+            stats.calls += 1
+            stats.wall += time.perf_counter() - wall
+            stats.cpu += _cpu_outside_db() - cpu
+            stats.db += thread_db_seconds() - db
+            stats.events += events
+
+    def report(self):
+        print()
+        print("=== Profile ===")
+        print(f"{'phase':<28}{'calls':>7}{'wall s':>10}{'db s':>10}{'cpu s':>10}{'events':>10}{'events/s':>12}")
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1].wall):
+            rate = f"{stats.events / stats.wall:,.0f}" if stats.events and stats.wall > 0 else '-'
+            print(f"{name:<28}{stats.calls:>7}{stats.wall:>10.3f}{stats.db:>10.3f}{stats.cpu:>10.3f}"
+                  f"{stats.events:>10}{rate:>12}")
+        print(f"{'total':<28}{'':>7}{self.total_wall:>10.3f}{self.total_db:>10.3f}{self.total_cpu:>10.3f}")
+        other = self.total_wall - self.total_db - self.total_cpu
+        print(f"Wall time split: db {self.total_db:.3f}s, cpu outside db {self.total_cpu:.3f}s, "
+              f"other/wait {other:.3f}s")
+        if self.cprofile_out:
+            print(f"cProfile stats written to {self.cprofile_out}")
+        if self.collapsed_out:
+            print(f"Collapsed stacks written to {self.collapsed_out}")
+
+
+_active = None
+
+
+def enable(cprofile_out=None, collapsed_out=None):
+    """Turn profiling on for this process and start the clocks."""
+    global _active
+    _active = JobProfiler(cprofile_out=cprofile_out, collapsed_out=collapsed_out)
+    _active.start()
+    return _active
+
+
+def finish():
+    """Stop profiling and print the report, if it was enabled."""
+    global _active
+    if _active is None:
+        return
+    _active.stop()
+    _active.report()
+    _active = None
+
+
+@contextmanager
+def phase(name, events=0):
+    if _active is None:
+        yield None
+        return
+    with _active.phase(name, events) as stats:
+        yield stats
+
+
+def add_profile_arguments(parser):
+    """Register the shared --profile flags on a job's argparse parser."""
+    parser.add_argument('--profile', action='store_true',
+                        help='Print per-phase wall/db/cpu timings and event throughput.')
+    parser.add_argument('--cprofile-out', help='Also write cProfile stats (pstats format) to this file.')
+    parser.add_argument('--collapsed-out', help='Also write sampled collapsed stacks (flamegraph input) to this file.')
+
+
+def enable_from_args(args):
+    if args.profile or args.cprofile_out or args.collapsed_out:
+        enable(cprofile_out=args.cprofile_out, collapsed_out=args.collapsed_out)
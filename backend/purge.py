@@ -0,0 +1,171 @@
+# backend/purge.py
+"""
+Background user purge in bounded chunks.
+
+Instead of one DELETE FROM user that cascades through every table in a
+single transaction, a purge job walks PURGE_STEPS leaf tables first and
+deletes at most PURGE_BATCH_SIZE rows per statement, committing and pausing
+between chunks. Progress is written to purge_job after every chunk, so a
+job interrupted by a restart resumes at its current step. A runner first
+claims its job (claim_purge_job), so a job is never run by two runners at
+once.
+"""
+
+import json
+import os
+import time
+
+from database import get_db_connection
+
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '5000'))
+PURGE_PAUSE_SECONDS = float(os.getenv('PURGE_PAUSE_SECONDS', '0.05'))
+# Queued/running jobs untouched for this long are considered abandoned and resumed
+PURGE_STALE_MINUTES = int(os.getenv('PURGE_STALE_MINUTES', '10'))
+
+_USER_SESSIONS = "SELECT sid FROM sessions WHERE user_id = %s"
+
+# (step, DELETE ... LIMIT %s taking (user_id, batch_size)), children before parents
+PURGE_STEPS = [
+    ('activity_event', "DELETE FROM activity_event WHERE user_id = %s LIMIT %s"),
+    ('tab_minute_engagement', "DELETE FROM tab_minute_engagement WHERE user_id = %s LIMIT %s"),
+    ('ingest_batch', "DELETE FROM ingest_batch WHERE user_id = %s LIMIT %s"),
+    ('drift_involves_tab', f"""
+        DELETE FROM drift_involves_tab
+        WHERE tab_id IN (SELECT tid FROM tab WHERE session_id IN ({_USER_SESSIONS})) LIMIT %s
+    """),
+    ('drift_event', f"DELETE FROM drift_event WHERE session_id IN ({_USER_SESSIONS}) LIMIT %s"),
+    ('drift_hour_histogram', "DELETE FROM drift_hour_histogram WHERE user_id = %s LIMIT %s"),
+    ('user_behavior_sketch', "DELETE FROM user_behavior_sketch WHERE user_id = %s LIMIT %s"),
+    ('daily_domain_summary', "DELETE FROM daily_domain_summary WHERE user_id = %s LIMIT %s"),
+    ('weekly_domain_summary', "DELETE FROM weekly_domain_summary WHERE user_id = %s LIMIT %s"),
+    ('monthly_domain_summary', "DELETE FROM monthly_domain_summary WHERE user_id = %s LIMIT %s"),
+    ('whitelists', "DELETE FROM whitelists WHERE user_id = %s LIMIT %s"),
+    ('tab', f"DELETE FROM tab WHERE session_id IN ({_USER_SESSIONS}) LIMIT %s"),
+    ('sessions', "DELETE FROM sessions WHERE user_id = %s LIMIT %s"),
+    ('domains', "DELETE FROM domains WHERE user_id = %s LIMIT %s"),
+    # Cascades whatever arrived while the purge was running
+    ('user', "DELETE FROM user WHERE uid = %s LIMIT %s"),
+]
+STEP_NAMES = [name for name, _ in PURGE_STEPS]
+
+
+def create_purge_job(cursor, user_id, user_email, requested_by=None):
+    """
+    Queue a purge for user_id. Returns (job_id, created); created is False
+    when a job for the user was already queued or running.
+    """
+    cursor.execute("SELECT job_id FROM purge_job WHERE user_id = %s AND status IN ('queued', 'running') LIMIT 1",
+                   (user_id,), query_name='purge.active_job')
+    row = cursor.fetchone()
+    if row:
+        return row[0], False
+    cursor.execute("INSERT INTO purge_job (user_id, user_email, requested_by, progress) VALUES (%s, %s, %s, %s)",
+                   (user_id, user_email, requested_by, json.dumps({})), query_name='purge.create_job')
+    return cursor.lastrowid, True
+
+
+def claim_purge_job(cursor, job_id, stale_minutes=PURGE_STALE_MINUTES):
+    """
+    Mark a queued, failed or abandoned running job as running. Returns False
+    when another runner holds it (running with progress in the last
+    stale_minutes) or it is completed. The caller must commit.
+    """
+    # updated_at is set explicitly so a stale running job counts as changed
+    cursor.execute("""
+        UPDATE purge_job SET status = 'running', error = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE job_id = %s
+        AND (status IN ('queued', 'failed')
+             OR (status = 'running' AND updated_at < NOW() - INTERVAL %s MINUTE))
+    """, (job_id, stale_minutes), query_name='purge.claim_job')
+    return cursor.rowcount == 1
+
+
+def get_purge_job(cursor, job_id):
+    cursor.execute("""
+        SELECT job_id, user_id, user_email, status, current_step, rows_deleted, progress, error,
+               created_at, updated_at, finished_at
+        FROM purge_job WHERE job_id = %s
+    """, (job_id,), query_name='purge.get_job')
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    columns = [desc[0] for desc in cursor.description]
+    job = dict(zip(columns, row))
+    job["progress"] = json.loads(job["progress"]) if job["progress"] else {}
+    if job["status"] in ('queued', 'running') and job["current_step"] in STEP_NAMES:
+        job["steps_completed"] = STEP_NAMES.index(job["current_step"])
+    else:
+        job["steps_completed"] = len(STEP_NAMES) if job["status"] == 'completed' else 0
+    job["steps_total"] = len(STEP_NAMES)
+    return job
+
+
+def run_purge_job(job_id, batch_size=PURGE_BATCH_SIZE, pause_seconds=PURGE_PAUSE_SECONDS):
+    """
+    Run (or resume) a purge job to completion. Returns the final status, or
+    the current one when the job cannot be claimed.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        print(f"[purge] job {job_id}: database connection failed")
+        return 'failed'
+
+    cursor = conn.cursor()
+    try:
+        claimed = claim_purge_job(cursor, job_id)
+        conn.commit()
+        job = get_purge_job(cursor, job_id)
+        if job is None or not claimed:
+            # Completed, or another runner is deleting and reporting progress
+            return job["status"] if job else None
+        user_id = job["user_id"]
+        progress = job["progress"]
+        rows_deleted = job["rows_deleted"]
+        start = STEP_NAMES.index(job["current_step"]) if job["current_step"] in STEP_NAMES else 0
+
+        for step, statement in PURGE_STEPS[start:]:
+            while True:
+                cursor.execute(statement, (user_id, batch_size), query_name=f"purge.{step}")
+                deleted = cursor.rowcount
+                progress[step] = progress.get(step, 0) + deleted
+                rows_deleted += deleted
+                cursor.execute(
+                    "UPDATE purge_job SET current_step = %s, rows_deleted = %s, progress = %s WHERE job_id = %s",
+                    (step, rows_deleted, json.dumps(progress), job_id), query_name='purge.update_job')
+                conn.commit()
+                if deleted < batch_size:
+                    break
+                time.sleep(pause_seconds)
+
+        cursor.execute("""
+            UPDATE purge_job SET status = 'completed', current_step = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        """, (job_id,), query_name='purge.update_job')
+        conn.commit()
+        print(f"[purge] job {job_id}: user {user_id} purged ({rows_deleted} rows)")
+        return 'completed'
+    except Exception as e:
+        conn.rollback()
+        print(f"[purge] job {job_id} failed: {e}")
+        try:
+            cursor.execute("UPDATE purge_job SET status = 'failed', error = %s WHERE job_id = %s",
+                           (str(e)[:500], job_id), query_name='purge.update_job')
+            conn.commit()
+        except Exception:
+            pass
+        return 'failed'
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def find_resumable_jobs(cursor, stale_minutes=PURGE_STALE_MINUTES, include_failed=False):
+    """Ids of queued/running jobs with no progress for stale_minutes (and failed ones if asked)."""
+    statuses = ('queued', 'running', 'failed') if include_failed else ('queued', 'running')
+    cursor.execute(f"""
+        SELECT job_id FROM purge_job
+        WHERE status IN ({', '.join(['%s'] * len(statuses))})
+        AND updated_at < NOW() - INTERVAL %s MINUTE
+        ORDER BY job_id
+    """, (*statuses, stale_minutes), query_name='purge.resumable_jobs')
+    return [row[0] for row in cursor.fetchall()]
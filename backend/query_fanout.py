@@ -0,0 +1,104 @@
+# backend/query_fanout.py
+"""
+Concurrent execution of independent read queries.
+
+run_queries() takes a dict of named queries and runs them on pooled
+connections, at most max_concurrency at a time for the calling request.
+Page latency becomes the slowest query instead of the sum of all of them.
+Every query runs with MAX_EXECUTION_TIME set to the time left before the
+request deadline, so a slow query is stopped by MySQL instead of holding
+its pooled connection after the request has given up. The queries are
+read-only, so they are routed like any read-intent connection (to a
+replica when one is caught up with the user's own writes).
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from database import DB_POOL_SIZE, INTENT_READ, get_pooled_connection
+
+FANOUT_MAX_CONCURRENCY = int(os.getenv('FANOUT_MAX_CONCURRENCY', '4'))
+FANOUT_DEADLINE_SECONDS = float(os.getenv('FANOUT_DEADLINE_SECONDS', '10'))
+
+# Shared by all requests; per-request concurrency is capped in run_queries
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='query-fanout')
+
+
+class FanoutTimeout(Exception):
+    """The queries did not all finish before the deadline."""
+
+
+class FanoutError(Exception):
+    """A query failed; the original exception is chained."""
+
+
+def _rows_to_dicts(cursor, rows):
+    if not rows or not cursor.description:
+        return []
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _run_one(sql, params, query_name, deadline, user_id):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise FanoutTimeout(query_name)
+    conn = get_pooled_connection(timeout=remaining, intent=INTENT_READ, user_id=user_id)
+    if conn is None:
+        raise FanoutError(f"No database connection for {query_name}")
+    cursor = conn.cursor()
+    try:
+        # Only applies to SELECT; reset when the connection goes back to the pool
+        timeout_ms = max(int((deadline - time.monotonic()) * 1000), 1)
+        cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (timeout_ms,), query_name='fanout.set_timeout')
+        cursor.execute(sql, params, query_name=query_name)
+        return _rows_to_dicts(cursor, cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_queries(queries, max_concurrency=FANOUT_MAX_CONCURRENCY, deadline_seconds=FANOUT_DEADLINE_SECONDS,
+                user_id=None):
+    """
+    Run {key: (sql, params, query_name)} concurrently and return {key: [row dicts]}.
+    user_id is the user the reads are for (see database.choose_target).
+
+    Raises FanoutTimeout when the deadline passes first, or FanoutError
+    wrapping the first query failure.
+    """
+    deadline = time.monotonic() + deadline_seconds
+    pending_keys = list(queries)
+    running = {}
+    results = {}
+    try:
+        while pending_keys or running:
+            while pending_keys and len(running) < max_concurrency:
+                key = pending_keys.pop(0)
+                sql, params, query_name = queries[key]
+                running[_executor.submit(_run_one, sql, params, query_name, deadline, user_id)] = key
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FanoutTimeout(', '.join(sorted(running.values())))
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                try:
+                    results[key] = future.result()
+                except FanoutTimeout:
+                    raise
+                except Exception as e:
+                    # MySQL error 3024: query interrupted by MAX_EXECUTION_TIME
+                    if getattr(e, 'errno', None) == 3024:
+                        raise FanoutTimeout(queries[key][2]) from e
+                    raise FanoutError(f"{queries[key][2]}: {e}") from e
+    finally:
+        for future in running:
+            future.cancel()
+    return results
+
+
+def shutdown():
+    """Wait for running fan-out queries to finish; called when the API process drains."""
+    _executor.shutdown(wait=True)
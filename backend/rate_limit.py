@@ -0,0 +1,233 @@
+# backend/rate_limit.py
+"""
+In-process rate limiting and priority-based load shedding for the API.
+
+Two token-bucket limits protect the workers from a single flooding client:
+
+- per client IP, on every request (RATE_LIMIT_IP_PER_SECOND, burst
+  RATE_LIMIT_IP_BURST), checked by the HTTP middleware
+- per user, on ingested events (RATE_LIMIT_USER_EVENTS_PER_SECOND, burst
+  RATE_LIMIT_USER_EVENT_BURST), charged one token per event left after
+  dropping repeated seq numbers, by POST /api/events/batch once the batch
+  id is claimed (retries of an ingested batch are acknowledged without
+  being charged)
+
+Requests over a limit get 429 with Retry-After. Buckets live in bounded LRU
+tables, so state is per API process; run behind a proxy that forwards the
+client address if several processes share one host.
+
+Independently, every request is given a class in priority order ingest >
+auth > dashboard > admin, and the middleware counts requests in flight per
+process. A class is shed with 503 once the total in flight reaches its share
+of LOAD_SHED_MAX_IN_FLIGHT (SHED_FRACTIONS), so under overload admin scans
+and exports go first and event ingest last. Long-lived drift streams are
+neither limited nor counted.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import metrics
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') != '0'
+RATE_LIMIT_IP_PER_SECOND = float(os.getenv('RATE_LIMIT_IP_PER_SECOND', '20'))
+RATE_LIMIT_IP_BURST = float(os.getenv('RATE_LIMIT_IP_BURST', '100'))
+RATE_LIMIT_USER_EVENTS_PER_SECOND = float(os.getenv('RATE_LIMIT_USER_EVENTS_PER_SECOND', '50'))
+RATE_LIMIT_USER_EVENT_BURST = float(os.getenv('RATE_LIMIT_USER_EVENT_BURST', '2000'))
+RATE_LIMIT_MAX_TRACKED = int(os.getenv('RATE_LIMIT_MAX_TRACKED', '100000'))
+# 0 disables shedding
+LOAD_SHED_MAX_IN_FLIGHT = int(os.getenv('LOAD_SHED_MAX_IN_FLIGHT', '64'))
+
+CLASS_INGEST = 'ingest'
+CLASS_AUTH = 'auth'
+CLASS_DASHBOARD = 'dashboard'
+CLASS_ADMIN = 'admin'
+REQUEST_CLASSES = (CLASS_INGEST, CLASS_AUTH, CLASS_DASHBOARD, CLASS_ADMIN)
+
+# Share of LOAD_SHED_MAX_IN_FLIGHT at which each class starts being shed
+SHED_FRACTIONS = {
+    CLASS_INGEST: 1.0,
+    CLASS_AUTH: 0.9,
+    CLASS_DASHBOARD: 0.75,
+    CLASS_ADMIN: 0.5,
+}
+
+# (path prefix, class), first match wins; anything else is dashboard traffic
+_CLASS_PREFIXES = (
+    ('/api/events/', CLASS_INGEST),
+    ('/api/tab/', CLASS_INGEST),
+    ('/api/session/', CLASS_INGEST),
+    ('/api/auth/', CLASS_AUTH),
+    ('/api/admin/', CLASS_ADMIN),
+    ('/api/export/', CLASS_ADMIN),
+)
+# Never limited or counted: health checks, monitoring and long-lived SSE streams
+EXEMPT_PATHS = ('/', '/health/live', '/health/ready', '/metrics', '/api/drifts/stream')
+
+
+class TokenBucket:
+    """rate tokens per second up to burst; starts full."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost=1.0):
+        """Returns 0 when cost tokens were taken, otherwise the seconds until they would be available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # A request larger than the burst can never fit; charge it a full bucket instead
+        cost = min(cost, self.burst)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class RateLimiter:
+    """Token buckets keyed by client (user id or IP) in a bounded LRU table."""
+
+    def __init__(self, name, rate, burst, max_tracked=RATE_LIMIT_MAX_TRACKED):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_tracked = max_tracked
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def check(self, key, cost=1.0):
+        """Returns 0 when allowed, otherwise the seconds the client should wait."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_tracked:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(cost)
+            if wait:
+                self.limited += 1
+            else:
+                self.allowed += 1
+            return wait
+
+    def snapshot(self, top_n=10):
+        """Limits, counters and the clients with the emptiest buckets."""
+        with self._lock:
+            emptiest = sorted(self._buckets.items(), key=lambda item: item[1].tokens)[:top_n]
+            return {
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "tracked": len(self._buckets),
+                "allowed": self.allowed,
+                "limited": self.limited,
+                "lowest_tokens": [{"key": str(key), "tokens": round(bucket.tokens, 1)} for key, bucket in emptiest],
+            }
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class LoadShedder:
+    """Counts requests in flight per class and decides which to shed."""
+
+    def __init__(self, max_in_flight=LOAD_SHED_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self.in_flight = {request_class: 0 for request_class in REQUEST_CLASSES}
+
+    def try_enter(self, request_class):
+        """Admit a request, or return False when its class is being shed."""
+        with self._lock:
+            total = sum(self.in_flight.values())
+            if self.max_in_flight > 0 and total >= self.max_in_flight * SHED_FRACTIONS[request_class]:
+                return False
+            self.in_flight[request_class] += 1
+            return True
+
+    def leave(self, request_class):
+        with self._lock:
+            self.in_flight[request_class] -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": dict(self.in_flight),
+                "shed_at": {request_class: int(self.max_in_flight * fraction)
+                            for request_class, fraction in SHED_FRACTIONS.items()},
+            }
+
+
+ip_limiter = RateLimiter('ip', RATE_LIMIT_IP_PER_SECOND, RATE_LIMIT_IP_BURST)
+user_event_limiter = RateLimiter('user_events', RATE_LIMIT_USER_EVENTS_PER_SECOND, RATE_LIMIT_USER_EVENT_BURST)
+shedder = LoadShedder()
+rejections = Counter()
+_rejections_lock = threading.Lock()
+
+_rejected = metrics.counter('ddt_requests_rejected_total', 'Requests refused by rate limits or load shedding',
+                            ('request_class', 'reason'))
+_in_flight = metrics.gauge('ddt_requests_in_flight', 'Requests in flight per class', ('request_class',))
+for _class in REQUEST_CLASSES:
+    _in_flight.set_function(lambda c=_class: shedder.in_flight[c], request_class=_class)
+_tracked = metrics.gauge('ddt_rate_limit_tracked_clients', 'Clients with a token bucket', ('limiter',))
+for _limiter in (ip_limiter, user_event_limiter):
+    _tracked.set_function(_limiter.__len__, limiter=_limiter.name)
+
+
+def classify_request(path):
+    """Request class of a path, or None for exempt paths."""
+    if path in EXEMPT_PATHS:
+        return None
+    for prefix, request_class in _CLASS_PREFIXES:
+        if path.startswith(prefix):
+            return request_class
+    return CLASS_DASHBOARD
+
+
+def record_rejection(request_class, reason):
+    with _rejections_lock:
+        rejections[f"{request_class}:{reason}"] += 1
+    _rejected.inc(request_class=request_class, reason=reason)
+
+
+def check_ip(client_ip):
+    """Seconds to wait when the IP is over its limit, else 0."""
+    if not RATE_LIMIT_ENABLED or client_ip is None:
+        return 0.0
+    return ip_limiter.check(client_ip)
+
+
+def check_user_events(user_id, event_count):
+    """Seconds to wait when the user is over the ingest event limit, else 0."""
+    if not RATE_LIMIT_ENABLED:
+        return 0.0
+    wait = user_event_limiter.check(user_id, event_count)
+    if wait:
+        record_rejection(CLASS_INGEST, 'user_rate')
+    return wait
+
+
+def retry_after_header(wait_seconds):
+    return {"Retry-After": str(max(1, math.ceil(min(wait_seconds, 3600))))}
+
+
+def snapshot():
+    """Limiter and shedder state for the admin endpoint."""
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "limiters": {limiter.name: limiter.snapshot() for limiter in (ip_limiter, user_event_limiter)},
+        "load_shedding": shedder.snapshot(),
+        "rejected": dict(sorted(rejections.items())),
+    }
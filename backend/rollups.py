@@ -0,0 +1,138 @@
+# backend/rollups.py
+"""
+Weekly and monthly rollups of daily_domain_summary.
+
+Each grain maps to a table keyed by (user_id, bucket start, domain_id).
+refresh_rollups() recomputes the buckets overlapping a date range from the
+daily rows, so it is idempotent and safe to re-run after the daily summary
+job. Analytics queries use choose_grain() to read the coarsest table that
+still gives a useful number of points for the requested period.
+"""
+
+from datetime import date, timedelta
+
+# grain -> (table, bucket column, SQL expression mapping summary_date to the bucket start)
+ROLLUP_GRAINS = {
+    'day': ('daily_domain_summary', 'summary_date', 'summary_date'),
+    'week': ('weekly_domain_summary', 'week_start',
+             'DATE_SUB(summary_date, INTERVAL WEEKDAY(summary_date) DAY)'),
+    'month': ('monthly_domain_summary', 'month_start',
+              'DATE_SUB(summary_date, INTERVAL DAYOFMONTH(summary_date) - 1 DAY)'),
+}
+
+# Longest period (in days) served at each grain before moving to the next one
+DAY_GRAIN_MAX_DAYS = 31
+WEEK_GRAIN_MAX_DAYS = 182
+
+
+def choose_grain(period_days):
+    if period_days <= DAY_GRAIN_MAX_DAYS:
+        return 'day'
+    if period_days <= WEEK_GRAIN_MAX_DAYS:
+        return 'week'
+    return 'month'
+
+
+def bucket_start(grain, day):
+    """First day of the grain's bucket containing day."""
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    if grain == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket_start(grain, day):
+    start = bucket_start(grain, day)
+    if grain == 'week':
+        return start + timedelta(days=7)
+    if grain == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def refresh_rollups(cursor, start_date, end_date=None, user_id=None):
+    """
+    Recompute weekly and monthly rows for every bucket overlapping
+    [start_date, end_date] (inclusive): the buckets' rows are deleted and
+    re-inserted from the daily rows in the caller's transaction, so
+    domains whose daily rows were removed drop out of the rollups too.
+    Returns {grain: rows affected by the insert}.
+    """
+    if end_date is None:
+        end_date = start_date
+    affected = {}
+    for grain in ('week', 'month'):
+        table, column, expression = ROLLUP_GRAINS[grain]
+        params = [bucket_start(grain, start_date), next_bucket_start(grain, end_date)]
+        user_filter = ""
+        if user_id is not None:
+            user_filter = "AND user_id = %s"
+            params.append(user_id)
+        cursor.execute(f"""
+            DELETE FROM {table}
+            WHERE {column} >= %s AND {column} < %s {user_filter}
+        """, tuple(params), query_name=f"rollup.{grain}.clear")
+        cursor.execute(f"""
+            INSERT INTO {table}
+                (user_id, {column}, domain_id, total_seconds_focused, total_events, active_days)
+            SELECT user_id, {expression} AS bucket, domain_id,
+                   SUM(total_seconds_focused), SUM(total_events), COUNT(*)
+            FROM daily_domain_summary
+            WHERE summary_date >= %s AND summary_date < %s {user_filter}
+            GROUP BY user_id, bucket, domain_id
+            ON DUPLICATE KEY UPDATE
+                total_seconds_focused = VALUES(total_seconds_focused),
+                total_events = VALUES(total_events),
+                active_days = VALUES(active_days)
+        """, tuple(params), query_name=f"rollup.{grain}")
+        affected[grain] = cursor.rowcount
+    return affected
+
+
+def period_start(grain, period_days, today=None):
+    """Start of the first bucket overlapping the last period_days days."""
+    today = today or date.today()
+    return bucket_start(grain, today - timedelta(days=period_days - 1))
+
+
+def top_domains_query(grain):
+    """
+    Per-bucket totals for the top_n domains of the period, with everything
+    else folded into one 'Other' row per bucket.
+
+    Params: (user_id, period_start, top_n, top_n, user_id, period_start)
+    """
+    table, column, _ = ROLLUP_GRAINS[grain]
+    return f"""
+        WITH ranked AS (
+            SELECT domain_id,
+                   ROW_NUMBER() OVER (ORDER BY SUM(total_seconds_focused) DESC, domain_id) AS domain_rank
+            FROM {table}
+            WHERE user_id = %s AND {column} >= %s
+            GROUP BY domain_id
+        )
+        SELECT CASE WHEN r.domain_rank <= %s THEN d.domain_name ELSE 'Other' END AS domain_name,
+               CASE WHEN r.domain_rank <= %s THEN d.category ELSE NULL END AS category,
+               s.{column} AS summary_date,
+               SUM(s.total_seconds_focused) AS total_seconds_focused,
+               SUM(s.total_events) AS total_events
+        FROM {table} s
+        JOIN ranked r ON s.domain_id = r.domain_id
+        JOIN domains d ON s.domain_id = d.id
+        WHERE s.user_id = %s AND s.{column} >= %s
+        GROUP BY 1, 2, 3
+        ORDER BY summary_date DESC, total_seconds_focused DESC
+    """
+
+
+def category_totals_query(grain):
+    """Params: (user_id, period_start)"""
+    table, column, _ = ROLLUP_GRAINS[grain]
+    return f"""
+        SELECT d.category, SUM(s.total_seconds_focused) AS total_seconds
+        FROM {table} s
+        JOIN domains d ON s.domain_id = d.id
+        WHERE s.user_id = %s AND s.{column} >= %s
+        GROUP BY d.category
+    """
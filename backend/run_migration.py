@@ -5,34 +5,42 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import get_db_connection
 
-def run_auth_migration():
-    """Run the authentication migration script to add password_hash column."""
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', 'database')
+
+def split_statements(migration_sql):
+    """Split a migration script into statements, dropping full-line comments."""
+    statements = []
+    for chunk in migration_sql.split(';'):
+        lines = [line for line in chunk.splitlines() if not line.strip().startswith('--')]
+        statement = '\n'.join(lines).strip()
+        if statement:
+            statements.append(statement)
+    return statements
+
+def run_migration(filename='auth_migration.sql'):
+    """Run a migration script from the database/ directory."""
     conn = get_db_connection()
     if conn is None:
         print("Failed to connect to database")
         return False
-    
+
     cursor = conn.cursor()
-    
+
     try:
         # Read the migration script
-        migration_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'auth_migration.sql')
+        migration_path = os.path.join(MIGRATIONS_DIR, filename)
         with open(migration_path, 'r') as f:
             migration_sql = f.read()
-        
-        # Split the SQL into individual statements
-        statements = [stmt.strip() for stmt in migration_sql.split(';') if stmt.strip()]
-        
+
         # Execute each statement
-        for statement in statements:
-            if statement and not statement.startswith('--'):
-                print(f"Executing: {statement[:50]}...")
-                cursor.execute(statement)
-        
+        for statement in split_statements(migration_sql):
+            print(f"Executing: {statement[:50]}...")
+            cursor.execute(statement)
+
         conn.commit()
-        print("Authentication migration completed successfully!")
+        print(f"Migration {filename} completed successfully!")
         return True
-        
+
     except Exception as e:
         conn.rollback()
         print(f"Migration failed: {str(e)}")
@@ -41,6 +49,11 @@ def run_auth_migration():
         cursor.close()
         conn.close()
 
+def run_auth_migration():
+    """Run the authentication migration script to add password_hash column."""
+    return run_migration('auth_migration.sql')
+
 if __name__ == "__main__":
-    success = run_auth_migration()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'auth_migration.sql'
+    success = run_migration(filename)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,85 @@
+# backend/session_lifecycle.py
+"""
+Session activity tracking and idle-session reaping.
+
+Ingest records the newest event time per session and per tab once per
+batch (touch_activity). Sessions whose last activity is older than
+SESSION_IDLE_MINUTES are closed by reap_idle_sessions in set-based batches,
+with end_time set to the last activity rather than the time of reaping, so
+sessions whose close call never arrived (browser crash, suspended service
+worker) still get a realistic duration.
+"""
+
+import os
+import time
+
+SESSION_IDLE_MINUTES = int(os.getenv('SESSION_IDLE_MINUTES', '30'))
+
+
+def touch_activity(cursor, session_id, events):
+    """Advance last_activity_at of the session and tabs in an event batch."""
+    if not events:
+        return
+    tab_last = {}
+    for event in events:
+        ts = event.timestamp.replace(tzinfo=None)
+        if event.tab_id not in tab_last or ts > tab_last[event.tab_id]:
+            tab_last[event.tab_id] = ts
+    session_last = max(tab_last.values())
+
+    cursor.execute("""
+        UPDATE sessions SET last_activity_at = %s
+        WHERE sid = %s AND (last_activity_at IS NULL OR last_activity_at < %s)
+    """, (session_last, session_id, session_last), query_name='ingest.session_activity')
+    cursor.executemany("""
+        UPDATE tab SET last_activity_at = %s
+        WHERE tid = %s AND session_id = %s AND (last_activity_at IS NULL OR last_activity_at < %s)
+    """, [(ts, tab_id, session_id, ts) for tab_id, ts in tab_last.items()], query_name='ingest.tab_activity')
+
+
+def reap_idle_sessions(conn, idle_minutes=SESSION_IDLE_MINUTES, batch_size=500, pause_seconds=0.1):
+    """
+    Close open sessions idle for more than idle_minutes, batch_size at a time.
+
+    Returns a list of (session_id, user_id, start_time, end_time) for the
+    sessions closed.
+    """
+    closed = []
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute("""
+                SELECT sid FROM sessions
+                WHERE end_time IS NULL
+                AND COALESCE(last_activity_at, start_time) < NOW() - INTERVAL %s MINUTE
+                ORDER BY sid
+                LIMIT %s
+            """, (idle_minutes, batch_size), query_name='reaper.find_idle')
+            session_ids = [row[0] for row in cursor.fetchall()]
+            if not session_ids:
+                break
+            placeholders = ', '.join(['%s'] * len(session_ids))
+
+            cursor.execute(f"""
+                UPDATE sessions
+                SET end_time = GREATEST(start_time, COALESCE(last_activity_at, start_time))
+                WHERE sid IN ({placeholders}) AND end_time IS NULL
+            """, tuple(session_ids), query_name='reaper.close_sessions')
+            cursor.execute(f"""
+                UPDATE tab t
+                JOIN sessions s ON t.session_id = s.sid
+                SET t.closed_at = LEAST(COALESCE(t.last_activity_at, t.opened_at, s.end_time), s.end_time)
+                WHERE t.session_id IN ({placeholders}) AND t.closed_at IS NULL
+            """, tuple(session_ids), query_name='reaper.close_tabs')
+            cursor.execute(f"""
+                SELECT sid, user_id, start_time, end_time FROM sessions WHERE sid IN ({placeholders})
+            """, tuple(session_ids), query_name='reaper.closed_sessions')
+            closed.extend(cursor.fetchall())
+            conn.commit()
+
+            if len(session_ids) < batch_size:
+                break
+            time.sleep(pause_seconds)
+    finally:
+        cursor.close()
+    return closed
@@ -0,0 +1,134 @@
+# backend/stat_sketches.py
+"""
+Per-day sketches behind the admin statistics.
+
+jobs/run_stat_sketches.py stores, for each day, a HyperLogLog of the users
+who started a session that day and a Space-Saving summary of focused
+seconds per catalog domain from daily_domain_summary. Admin stats merge the
+stored days of a window instead of scanning sessions and every summary row,
+so their cost depends on the number of days, not on the rows behind them.
+"""
+
+from datetime import timedelta
+
+from sketches import HyperLogLog, SpaceSaving
+
+SKETCH_ACTIVE_USERS = 'active_users'
+SKETCH_DOMAIN_SECONDS = 'domain_seconds'
+SKETCH_TYPES = {
+    SKETCH_ACTIVE_USERS: HyperLogLog,
+    SKETCH_DOMAIN_SECONDS: SpaceSaving,
+}
+
+HLL_PRECISION = 12
+# Counters per day; a domain with more than 1/capacity of a window's total
+# focused time is guaranteed to be in the merged summary
+DOMAIN_SKETCH_CAPACITY = 1000
+
+
+def build_daily_sketches(cursor, day):
+    """Build and store both sketches for day. Returns {name: sketch}."""
+    next_day = day + timedelta(days=1)
+
+    users = HyperLogLog(HLL_PRECISION)
+    cursor.execute("""
+        SELECT DISTINCT user_id FROM sessions
+        WHERE start_time >= %s AND start_time < %s
+    """, (day, next_day), query_name='sketches.day_users')
+    for (user_id,) in cursor.fetchall():
+        users.add(user_id)
+
+    domains = SpaceSaving(DOMAIN_SKETCH_CAPACITY)
+    cursor.execute("""
+        SELECT d.catalog_id, SUM(dds.total_seconds_focused)
+        FROM daily_domain_summary dds
+        JOIN domains d ON dds.domain_id = d.id
+        WHERE dds.summary_date = %s
+        GROUP BY d.catalog_id
+    """, (day,), query_name='sketches.day_domains')
+    for catalog_id, seconds in cursor.fetchall():
+        if seconds:
+            domains.add(catalog_id, int(seconds))
+
+    built = {SKETCH_ACTIVE_USERS: users, SKETCH_DOMAIN_SECONDS: domains}
+    cursor.executemany("""
+        INSERT INTO daily_stat_sketch (stat_date, sketch_name, sketch)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE sketch = VALUES(sketch)
+    """, [(day, name, sketch.to_bytes()) for name, sketch in built.items()], query_name='sketches.store')
+    return built
+
+
+def load_merged(cursor, name, start_date=None, end_date=None):
+    """
+    Merge the stored sketches of name for days in [start_date, end_date]
+    (open-ended when None). Returns (sketch, days merged); sketch is None
+    when no day is stored.
+    """
+    conditions = ["sketch_name = %s"]
+    params = [name]
+    if start_date is not None:
+        conditions.append("stat_date >= %s")
+        params.append(start_date)
+    if end_date is not None:
+        conditions.append("stat_date <= %s")
+        params.append(end_date)
+    cursor.execute(f"""
+        SELECT sketch FROM daily_stat_sketch
+        WHERE {' AND '.join(conditions)}
+    """, tuple(params), query_name=f'sketches.load.{name}')
+
+    merged = None
+    days = 0
+    for (data,) in cursor.fetchall():
+        sketch = SKETCH_TYPES[name].from_bytes(bytes(data))
+        merged = sketch if merged is None else merged.merge(sketch)
+        days += 1
+    return merged, days
+
+
+# Same window as the exact query: sessions started since midnight 30 days ago
+ACTIVE_USER_DAYS = 30
+
+
+def approximate_active_users(cursor, today):
+    """
+    HyperLogLog estimate of users with a session in the last ACTIVE_USER_DAYS,
+    or None unless every day of the window has a stored sketch (a partial
+    window would undercount, e.g. right after deploy or missed job runs).
+    """
+    sketch, days = load_merged(cursor, SKETCH_ACTIVE_USERS, today - timedelta(days=ACTIVE_USER_DAYS), today)
+    if sketch is None or days < ACTIVE_USER_DAYS + 1:
+        return None
+    return {"estimate": sketch.count(), "relative_std_error": round(sketch.relative_error, 4), "days": days}
+
+
+def approximate_top_domains(cursor, n=10):
+    """
+    Top n catalog domains by focused seconds over all stored days, or None.
+
+    Each entry's total_seconds overestimates the true total by at most its
+    error_seconds.
+    """
+    sketch, days = load_merged(cursor, SKETCH_DOMAIN_SECONDS)
+    if sketch is None:
+        return None
+    top = sketch.top(n)
+    names = {}
+    if top:
+        placeholders = ', '.join(['%s'] * len(top))
+        cursor.execute(f"""
+            SELECT c.catalog_id, c.domain_name, c.default_category
+            FROM domain_catalog c
+            WHERE c.catalog_id IN ({placeholders})
+        """, tuple(key for key, _, _ in top), query_name='sketches.domain_names')
+        names = {catalog_id: (name, category) for catalog_id, name, category in cursor.fetchall()}
+    return {
+        "domains": [{
+            "domain": names.get(key, (None, None))[0],
+            "category": names.get(key, (None, None))[1],
+            "total_seconds": count,
+            "error_seconds": error,
+        } for key, count, error in top],
+        "days": days,
+    }
@@ -0,0 +1,114 @@
+# backend/streaming.py
+"""
+Streaming JSON / NDJSON responses backed by database.iter_row_batches.
+
+Memory stays at one row batch per response regardless of result size.
+stream_query hands the connection to a ConnectionStream body, which closes
+it when the response finishes, the client disconnects, or the body is
+dropped without ever being iterated.
+"""
+
+import json
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from fastapi.responses import StreamingResponse
+
+from database import iter_row_batches
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    return json.dumps(value, default=json_default, separators=(',', ':'))
+
+
+class ConnectionStream:
+    """
+    Response body that owns a connection (and, through release, anything
+    else held for the response, e.g. an export slot).
+
+    Both are released exactly once: when iteration ends, or on close() or
+    garbage collection when the body is never iterated (the client went
+    away before the response started, or the request failed first). A
+    generator's finally would not run in that case.
+    """
+
+    def __init__(self, body, conn, release=None):
+        self.body = body
+        self.conn = conn
+        self.release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        try:
+            yield from self.body
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        try:
+            self.conn.close()
+        finally:
+            if self.release is not None:
+                self.release()
+
+    def __del__(self):
+        self.close()
+
+
+def _iter_dicts(conn, query, params, batch_size, query_name):
+    for columns, rows in iter_row_batches(conn, query, params, batch_size, query_name):
+        for row in rows:
+            yield dict(zip(columns, row))
+
+
+def ndjson_lines(conn, query, params=None, batch_size=STREAM_BATCH_SIZE, query_name=None):
+    """Yield one encoded JSON object per line."""
+    for row in _iter_dicts(conn, query, params, batch_size, query_name):
+        yield (dumps(row) + '\n').encode('utf-8')
+
+
+def json_array_chunks(conn, query, params=None, batch_size=STREAM_BATCH_SIZE, query_name=None, key=None):
+    """Yield a JSON array (optionally wrapped as {key: [...]}) one element at a time."""
+    yield (('{' + json.dumps(key) + ':[') if key else '[').encode('utf-8')
+    first = True
+    for row in _iter_dicts(conn, query, params, batch_size, query_name):
+        yield ((b'' if first else b',') + dumps(row).encode('utf-8'))
+        first = False
+    yield (']}' if key else ']').encode('utf-8')
+
+
+def stream_query(conn, query, params=None, fmt='ndjson', query_name=None, key=None):
+    """StreamingResponse for a query in 'ndjson' or 'json' format; the response owns conn."""
+    stream = ConnectionStream(None, conn)
+    try:
+        if fmt == 'json':
+            stream.body = json_array_chunks(conn, query, params, query_name=query_name, key=key)
+            media_type = 'application/json'
+        else:
+            stream.body = ndjson_lines(conn, query, params, query_name=query_name)
+            media_type = NDJSON_MEDIA_TYPE
+        return StreamingResponse(stream, media_type=media_type)
+    except Exception:
+        stream.close()
+        raise
@@ -0,0 +1,96 @@
+# backend/url_classifier.py
+"""
+URL classification, run once per distinct URL when it is interned.
+
+Each rule names a host pattern, a path and an optional query parameter. All
+rules are compiled into a single regular expression over "host + path"; the
+matching rule's code and flag bits are stored on url_dict so detectors can
+filter on integers instead of LIKE '%...%' scans.
+
+Rules can be replaced by pointing URL_RULES_FILE at a JSON list with the same
+shape as DEFAULT_RULES. Changing rules only affects newly interned URLs until
+jobs/run_url_classification.py is run.
+"""
+
+import json
+import os
+import re
+from urllib.parse import urlsplit, parse_qs
+
+# Flag bits stored in url_dict.url_flags
+URL_FLAG_SEARCH = 1      # Search engine results page
+URL_FLAG_HAS_QUERY = 2   # The rule's query parameter is present and non-empty
+
+KIND_FLAGS = {
+    'search': URL_FLAG_SEARCH,
+}
+
+DEFAULT_RULES = [
+    {"name": "google", "kind": "search", "host": r"google\.[a-z]{2,3}(?:\.[a-z]{2})?", "path": "/search", "param": "q"},
+    {"name": "bing", "kind": "search", "host": r"bing\.com", "path": "/search", "param": "q"},
+    {"name": "duckduckgo", "kind": "search", "host": r"(?:html\.)?duckduckgo\.com", "path": "/", "param": "q"},
+    {"name": "yahoo", "kind": "search", "host": r"search\.yahoo\.com", "path": "/search", "param": "p"},
+    {"name": "brave", "kind": "search", "host": r"search\.brave\.com", "path": "/search", "param": "q"},
+    {"name": "ecosia", "kind": "search", "host": r"ecosia\.org", "path": "/search", "param": "q"},
+    {"name": "yandex", "kind": "search", "host": r"yandex\.[a-z]{2,3}", "path": "/search", "param": "text"},
+    {"name": "baidu", "kind": "search", "host": r"baidu\.com", "path": "/s", "param": "wd"},
+]
+
+
+def normalize_host(netloc):
+    """Lowercase the host and strip credentials, port, trailing dot and www."""
+    host = netloc.rsplit('@', 1)[-1].split(':', 1)[0].lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+class UrlClassifier:
+    """A rule set compiled into one matcher."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        alternatives = []
+        for index, rule in enumerate(self.rules):
+            path = re.escape(rule["path"].rstrip('/'))
+            alternatives.append(f"(?P<r{index}>(?:{rule['host']}){path}/?)")
+        self._matcher = re.compile('^(?:' + '|'.join(alternatives) + ')$') if alternatives else None
+
+    def classify(self, url):
+        """Return (url_flags, rule_code); rule_code is the 1-based rule index or 0."""
+        if not url or self._matcher is None:
+            return 0, 0
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return 0, 0
+        if parts.scheme not in ('http', 'https'):
+            return 0, 0
+
+        match = self._matcher.match(normalize_host(parts.netloc) + (parts.path or '/'))
+        if match is None:
+            return 0, 0
+
+        index = int(match.lastgroup[1:])
+        rule = self.rules[index]
+        flags = KIND_FLAGS.get(rule.get("kind"), 0)
+        param = rule.get("param")
+        if param and any(v.strip() for v in parse_qs(parts.query).get(param, [])):
+            flags |= URL_FLAG_HAS_QUERY
+        return flags, index + 1
+
+
+def load_rules():
+    """Rules from URL_RULES_FILE if set, else the built-in defaults."""
+    rules_file = os.getenv('URL_RULES_FILE')
+    if not rules_file:
+        return DEFAULT_RULES
+    with open(rules_file, 'r') as f:
+        return json.load(f)
+
+
+classifier = UrlClassifier(load_rules())
+
+
+def classify_url(url):
+    return classifier.classify(url)
@@ -0,0 +1,195 @@
+# backend/url_dictionary.py
+"""
+Dictionary encoding for activity_event URLs and target element ids.
+
+Values are interned into url_dict / element_dict keyed by a 64-bit hash (the
+first 8 bytes of SHA-256, which the migration reproduces in SQL with
+CONV(LEFT(SHA2(value, 256), 16), 16, 10)). Events store the integer id; the
+raw column is only filled when a hash collides with a different value.
+URLs are classified (url_classifier.py) once, when first interned; the
+intern cache keeps the stored flags next to each id so the ingest path sees
+the same url_flags as jobs reading url_dict. jobs/run_url_classification.py
+rewrites those flags from another process, so cached URL entries expire
+after URL_CACHE_TTL_SECONDS and are then read back from url_dict.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from url_classifier import classify_url
+
+# How long a cached URL entry (id and stored url_flags) is trusted; 0 keeps entries until evicted
+URL_CACHE_TTL_SECONDS = float(os.getenv('URL_CACHE_TTL_SECONDS', '300'))
+
+# kind -> (table, id column, hash column, value column, max value length)
+DICTIONARIES = {
+    'url': ('url_dict', 'url_id', 'url_hash', 'url', 2083),
+    'element': ('element_dict', 'element_id', 'element_hash', 'element_value', 100),
+}
+
+# Extra columns computed once per new dictionary value: kind -> (columns, fn(value) -> tuple)
+DICTIONARY_EXTRAS = {
+    'url': (('url_flags', 'rule_code'), classify_url),
+}
+
+
+def value_hash(value):
+    """64-bit unsigned hash of a string, matching the SQL backfill."""
+    return int.from_bytes(hashlib.sha256(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class InternCache:
+    """
+    Bounded LRU mapping of interned value -> dictionary id (or any cached
+    entry). With ttl_seconds, entries older than that count as misses.
+    """
+
+    def __init__(self, max_size=50000, ttl_seconds=0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()  # value -> (entry, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, value):
+        with self._lock:
+            item = self._items.get(value)
+            if item is not None and self.ttl_seconds and time.monotonic() - item[1] > self.ttl_seconds:
+                del self._items[value]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(value)
+            self.hits += 1
+            return item[0]
+
+    def put(self, value, dict_id):
+        with self._lock:
+            self._items[value] = (dict_id, time.monotonic())
+            self._items.move_to_end(value)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def discard(self, value):
+        with self._lock:
+            self._items.pop(value, None)
+
+    def __len__(self):
+        return len(self._items)
+
+
+# Process-wide caches shared by every request on the ingest path: value -> (id, stored extras)
+intern_caches = {
+    'url': InternCache(max_size=50000, ttl_seconds=URL_CACHE_TTL_SECONDS),
+    'element': InternCache(max_size=20000),
+}
+
+_cache_entries = metrics.gauge('ddt_intern_cache_entries', 'Entries held in the intern cache', ('cache',))
+_cache_hits = metrics.counter('ddt_intern_cache_hits_total', 'Intern cache hits', ('cache',))
+_cache_misses = metrics.counter('ddt_intern_cache_misses_total', 'Intern cache misses', ('cache',))
+for _kind, _cache in intern_caches.items():
+    _cache_entries.set_function(_cache.__len__, cache=_kind)
+    _cache_hits.set_function(lambda c=_cache: c.hits, cache=_kind)
+    _cache_misses.set_function(lambda c=_cache: c.misses, cache=_kind)
+
+
+def intern_values(cursor, kind, values):
+    """
+    Return {value: (id, extras)} for every non-empty value, inserting missing
+    ones. extras holds the value's stored DICTIONARY_EXTRAS columns, e.g.
+    (url_flags, rule_code) for URLs, and is () for kinds without any.
+
+    Values whose hash collides with a different stored value are left out of
+    the result so the caller keeps them inline. The caller must commit before
+    the returned ids are used by other connections.
+    """
+    table, id_col, hash_col, value_col, max_len = DICTIONARIES[kind]
+    cache = intern_caches[kind]
+
+    result = {}
+    missing = {}
+    for value in set(v for v in values if v):
+        if len(value) > max_len:
+            continue
+        entry = cache.get(value)
+        if entry is not None:
+            result[value] = entry
+        else:
+            missing[value_hash(value)] = value
+
+    if not missing:
+        return result
+
+    extra_cols, extra_fn = DICTIONARY_EXTRAS.get(kind, ((), None))
+    columns = ', '.join((hash_col, value_col) + extra_cols)
+    placeholders = ', '.join(['%s'] * (2 + len(extra_cols)))
+    rows = []
+    for hashed, value in missing.items():
+        rows.append((hashed, value) + (tuple(extra_fn(value)) if extra_fn else ()))
+    cursor.executemany(f"INSERT IGNORE INTO {table} ({columns}) VALUES ({placeholders})", rows,
+                       query_name=f"intern.{kind}.insert")
+    # Read the extras back rather than reusing extra_fn's: a value inserted
+    # earlier keeps what was stored then (or set by run_url_classification.py)
+    select_cols = ', '.join((id_col, hash_col, value_col) + extra_cols)
+    placeholders = ', '.join(['%s'] * len(missing))
+    cursor.execute(
+        f"SELECT {select_cols} FROM {table} WHERE {hash_col} IN ({placeholders})",
+        tuple(missing.keys()),
+        query_name=f"intern.{kind}.lookup",
+    )
+    for dict_id, stored_hash, stored_value, *extras in cursor.fetchall():
+        value = missing.get(int(stored_hash))
+        if value is not None and value == stored_value:
+            entry = (dict_id, tuple(extras))
+            result[value] = entry
+            cache.put(value, entry)
+    return result
+
+
+def preload(cursor, limit=20000):
+    """Fill the intern caches with the newest dictionary values ahead of traffic; returns the number loaded."""
+    loaded = 0
+    for kind, (table, id_col, _, value_col, _) in DICTIONARIES.items():
+        cache = intern_caches[kind]
+        select_cols = ', '.join((value_col, id_col) + DICTIONARY_EXTRAS.get(kind, ((), None))[0])
+        cursor.execute(f"SELECT {select_cols} FROM {table} ORDER BY {id_col} DESC LIMIT %s",
+                       (min(limit, cache.max_size),), query_name=f"intern.{kind}.preload")
+        rows = cursor.fetchall()
+        # Oldest first, so the newest values end up most recently used
+        for value, dict_id, *extras in reversed(rows):
+            cache.put(value, (dict_id, tuple(extras)))
+        loaded += len(rows)
+    return loaded
+
+
+def encode_events(cursor, events):
+    """
+    Intern the URLs and element ids of a batch of ActivityEvent models.
+
+    Returns a list of (url, url_id, target_element_id, target_element_ref,
+    url_flags) tuples aligned with events, with the inline value cleared when
+    encoded. url_flags are the flags stored in url_dict, or 0 for a URL kept
+    inline, matching COALESCE(ud.url_flags, 0) in the batch queries.
+    """
+    url_entries = intern_values(cursor, 'url', [e.url for e in events])
+    element_entries = intern_values(cursor, 'element', [e.target_element_id for e in events])
+
+    encoded = []
+    for event in events:
+        url_id, url_extras = url_entries.get(event.url, (None, ())) if event.url else (None, ())
+        element_ref, _ = element_entries.get(event.target_element_id, (None, ())) \
+            if event.target_element_id else (None, ())
+        encoded.append((
+            None if url_id is not None else event.url,
+            url_id,
+            None if element_ref is not None else event.target_element_id,
+            element_ref,
+            url_extras[0] if url_extras else 0,
+        ))
+    return encoded
@@ -0,0 +1,175 @@
+# backend/whitelist_bulk.py
+"""
+Set-based whitelist import and export.
+
+An import is parsed (CSV or JSON), normalized, diffed against the user's
+current whitelist and applied in one transaction with a fixed number of
+multi-row statements, however many domains it contains. mode='merge' only
+adds and updates; mode='replace' also removes domains missing from the
+import. Category changes are applied to the user's domains rows in the same
+transaction, and every summary query reads the category from there.
+"""
+
+import csv
+import io
+
+import domain_catalog
+
+MAX_IMPORT_DOMAINS = 5000
+MAX_REASON_LENGTH = 200
+IMPORT_MODES = ('merge', 'replace')
+EXPORT_COLUMNS = ('domain_name', 'user_reason', 'category', 'created_at')
+
+# Rows per IN (...) list
+LOOKUP_CHUNK_SIZE = 1000
+
+
+def parse_csv(text):
+    """Rows of domain_name[,user_reason]; a header row is optional."""
+    entries = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row or not row[0].strip() or row[0].strip().lower() == 'domain_name':
+            continue
+        entries.append({"domain_name": row[0], "user_reason": row[1] if len(row) > 1 else ''})
+    return entries
+
+
+def parse_json(data):
+    """A list of names or {domain_name, user_reason} objects, optionally wrapped in {"domains": [...]}."""
+    if isinstance(data, dict):
+        data = data.get("domains")
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of domains")
+    entries = []
+    for item in data:
+        if isinstance(item, str):
+            entries.append({"domain_name": item, "user_reason": ''})
+        elif isinstance(item, dict) and item.get("domain_name"):
+            entries.append({"domain_name": str(item["domain_name"]), "user_reason": str(item.get("user_reason") or '')})
+        else:
+            raise ValueError(f"Invalid whitelist entry: {item!r}")
+    return entries
+
+
+def normalize_entries(entries):
+    """Return ({domain_name: reason}, [invalid names]); later duplicates win."""
+    wanted = {}
+    invalid = []
+    for entry in entries:
+        name = domain_catalog.extract_domain(entry["domain_name"].strip())
+        if not name or len(name) > 255 or '.' not in name:
+            invalid.append(entry["domain_name"])
+            continue
+        wanted[name] = entry["user_reason"].strip()[:MAX_REASON_LENGTH]
+    return wanted, invalid
+
+
+def _chunks(values, size=LOOKUP_CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _resolve_domain_ids(cursor, user_id, names):
+    """
+    Create missing catalog and mapping rows for names (new mappings start at
+    the catalog's default_category); return {domain_name: domain_id}.
+    """
+    cursor.executemany("INSERT IGNORE INTO domain_catalog (domain_name) VALUES (%s)",
+                       [(name,) for name in names], query_name='whitelist_bulk.catalog_insert')
+    for chunk in _chunks(names):
+        cursor.execute(f"""
+            INSERT IGNORE INTO domains (user_id, catalog_id, domain_name, category)
+            SELECT %s, catalog_id, domain_name, default_category
+            FROM domain_catalog WHERE domain_name IN ({_placeholders(chunk)})
+        """, (user_id, *chunk), query_name='whitelist_bulk.domain_insert')
+    domain_ids = {}
+    for chunk in _chunks(names):
+        cursor.execute(f"SELECT domain_name, id FROM domains WHERE user_id = %s AND domain_name IN ({_placeholders(chunk)})",
+                       (user_id, *chunk), query_name='whitelist_bulk.domain_lookup')
+        domain_ids.update(cursor.fetchall())
+    return domain_ids
+
+
+def apply_import(conn, user_id, entries, mode='merge', dry_run=False):
+    """
+    Diff entries against the whitelist and apply the result in one transaction.
+
+    Returns counts of added, updated, removed and unchanged domains plus the
+    names that could not be parsed. With dry_run the transaction is rolled back.
+    """
+    wanted, invalid = normalize_entries(entries)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT d.domain_name, w.domain_id, w.user_reason
+            FROM whitelists w
+            JOIN domains d ON w.domain_id = d.id
+            WHERE w.user_id = %s
+        """, (user_id,), query_name='whitelist_bulk.current')
+        current = {name: (domain_id, reason or '') for name, domain_id, reason in cursor.fetchall()}
+
+        added = [name for name in wanted if name not in current]
+        updated = [name for name in wanted if name in current and current[name][1] != wanted[name]]
+        removed = [name for name in current if name not in wanted] if mode == 'replace' else []
+
+        domain_ids = _resolve_domain_ids(cursor, user_id, added) if added else {}
+        for name in updated:
+            domain_ids[name] = current[name][0]
+
+        upserts = [(user_id, domain_ids[name], wanted[name]) for name in added + updated if name in domain_ids]
+        if upserts:
+            cursor.executemany("""
+                INSERT INTO whitelists (user_id, domain_id, user_reason)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE user_reason = VALUES(user_reason)
+            """, upserts, query_name='whitelist_bulk.upsert')
+
+        added_ids = [domain_ids[name] for name in added if name in domain_ids]
+        for chunk in _chunks(added_ids):
+            cursor.execute(f"UPDATE domains SET category = 'Productive' WHERE user_id = %s AND id IN ({_placeholders(chunk)})",
+                           (user_id, *chunk), query_name='whitelist_bulk.recategorize')
+
+        removed_ids = [current[name][0] for name in removed]
+        for chunk in _chunks(removed_ids):
+            cursor.execute(f"DELETE FROM whitelists WHERE user_id = %s AND domain_id IN ({_placeholders(chunk)})",
+                           (user_id, *chunk), query_name='whitelist_bulk.delete')
+            # Same rule as remove_from_whitelist: a de-listed domain has been visited
+            cursor.execute(f"UPDATE domains SET category = 'Unproductive' WHERE user_id = %s AND id IN ({_placeholders(chunk)})",
+                           (user_id, *chunk), query_name='whitelist_bulk.recategorize')
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+            for name, domain_id in domain_ids.items():
+                domain_catalog.user_domain_cache.put((user_id, name), domain_id)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return {
+        "mode": mode,
+        "dry_run": dry_run,
+        "added": len(added),
+        "updated": len(updated),
+        "removed": len(removed),
+        "unchanged": len(wanted) - len(added) - len(updated),
+        "invalid": invalid,
+    }
+
+
+def export_csv(rows):
+    """rows: dicts with EXPORT_COLUMNS keys."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([row.get(column) if row.get(column) is not None else '' for column in EXPORT_COLUMNS])
+    return out.getvalue()
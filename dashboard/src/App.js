@@ -1,6 +1,6 @@
 // dashboard/src/App.js
 import React, { useState, useEffect } from 'react';
-import { getAnalytics } from './services/api';
+import { getDashboardBootstrap } from './services/api';
 import ProductivityPieChart from './components/ProductivityPieChart';
 import TopDomainsBarChart from './components/TopDomainsBarChart';
 import DriftTimeline from './components/DriftTimeline';
@@ -17,10 +17,15 @@ import './components/LoginPopup.css';
 
 
 
+const GRAIN_TITLES = { day: 'Daily', week: 'Weekly', month: 'Monthly' };
+
 function App() {
   const [currentPage, setCurrentPage] = useState('dashboard'); // 'dashboard' | 'whitelist' | 'insights' | 'admin'
   const [loading, setLoading] = useState(true);
   const [analyticsData, setAnalyticsData] = useState(null);
+  // Prefetched by the dashboard bootstrap call so the other pages open without a request
+  const [insightsData, setInsightsData] = useState(null);
+  const [whitelistData, setWhitelistData] = useState(null);
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [authLoading, setAuthLoading] = useState(true);
   const [userRole, setUserRole] = useState('user'); // 'user' or 'admin'
@@ -78,9 +83,11 @@ function App() {
 
   const loadDashboard = () => {
     setLoading(true);
-    getAnalytics(7) // Get last 7 days
+    getDashboardBootstrap(7) // Get last 7 days
       .then(response => {
-        setAnalyticsData(response.data);
+        setAnalyticsData(response.data.analytics);
+        setInsightsData(response.data.insights);
+        setWhitelistData(response.data.whitelist);
         setLoading(false);
       })
       .catch(error => {
@@ -279,19 +286,19 @@ function App() {
                   </div>
                 )}
 
-                {/* Drift Timeline - Area Chart */}
+                {/* Drift Timeline - Area Chart (aggregated server-side) */}
                 {analyticsData.drift_events && analyticsData.drift_events.length > 0 && (
                   <div className="dashboard-card">
                     <h2>Drift Events Timeline</h2>
-                    <DriftTimeline data={analyticsData.drift_events} />
+                    <DriftTimeline periodDays={7} />
                   </div>
                 )}
 
                 {/* Daily Domain Activity - Line Chart */}
                 {analyticsData.domain_summaries && analyticsData.domain_summaries.length > 0 && (
                   <div className="dashboard-card">
-                    <h2>Daily Domain Activity</h2>
-                    <DomainActivityChart data={analyticsData.domain_summaries} />
+                    <h2>{GRAIN_TITLES[analyticsData.grain] || 'Daily'} Domain Activity</h2>
+                    <DomainActivityChart data={analyticsData.domain_summaries} grain={analyticsData.grain} />
                   </div>
                 )}
 
@@ -311,10 +318,10 @@ function App() {
         )}
         
         {userRole !== 'admin' && currentPage === 'whitelist' && (
-          <WhitelistManager />
+          <WhitelistManager initialWhitelist={whitelistData} onWhitelistLoaded={setWhitelistData} />
         )}
         {userRole !== 'admin' && currentPage === 'insights' && (
-          <InsightsPage />
+          <InsightsPage initialData={insightsData} />
         )}
         {currentPage === 'admin' && userRole === 'admin' && (
           <AdminDashboard />
@@ -2,8 +2,16 @@
 import React, { useMemo } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 
-export default function DomainActivityChart({ data }) {
-  // Group domain summaries by date and domain
+// Weekly buckets are labelled by their Monday, monthly buckets by month
+const formatBucket = (date, grain) => {
+  if (grain === 'month') {
+    return date.toLocaleDateString('en-US', { month: 'short', year: 'numeric', timeZone: 'UTC' });
+  }
+  return date.toLocaleDateString('en-US', { month: 'short', day: 'numeric', timeZone: 'UTC' });
+};
+
+export default function DomainActivityChart({ data, grain = 'day' }) {
+  // Group domain summaries (one row per bucket and domain) by bucket
   const chartData = useMemo(() => {
     if (!data || data.length === 0) return { data: [], domains: [] };
 
@@ -13,7 +21,7 @@ export default function DomainActivityChart({ data }) {
     data.forEach(item => {
       const dateStr = item.summary_date || new Date().toISOString().split('T')[0];
       const date = new Date(dateStr);
-      const dayKey = date.toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
+      const dayKey = formatBucket(date, grain);
       
       if (!dateMap[dayKey]) {
         dateMap[dayKey] = { date: dayKey, timestamp: date.getTime() };
@@ -45,7 +53,7 @@ export default function DomainActivityChart({ data }) {
       .map(([domain]) => domain);
 
     return { data: result, domains: topDomains };
-  }, [data]);
+  }, [data, grain]);
 
   if (chartData.data.length === 0) {
     return <p>No domain activity data available.</p>;
@@ -0,0 +1,65 @@
+// dashboard/src/components/DriftHeatmap.js
+import React, { useEffect, useState } from 'react';
+import { getDriftHeatmap } from '../services/api';
+
+const HOURS = Array.from({ length: 24 }, (_, hour) => hour);
+
+export default function DriftHeatmap() {
+  const [heatmap, setHeatmap] = useState(null);
+  const [driftType, setDriftType] = useState('');
+  const [error, setError] = useState(null);
+
+  useEffect(() => {
+    getDriftHeatmap(driftType || null)
+      .then(res => setHeatmap(res.data))
+      .catch(err => setError(err.response?.data?.detail || err.message));
+  }, [driftType]);
+
+  if (error) return <p style={{ color: '#d32f2f' }}>Failed to load heatmap: {error}</p>;
+  if (!heatmap) return <p>Loading heatmap...</p>;
+  if (heatmap.drift_types.length === 0) return <p>No drift activity recorded yet.</p>;
+
+  const max = Math.max(1, ...heatmap.counts.flat());
+  const cellStyle = (count) => ({
+    background: `rgba(239, 68, 68, ${count / max})`,
+    color: count / max > 0.5 ? '#fff' : '#334155',
+    textAlign: 'center',
+    fontSize: '11px',
+    padding: '4px 0',
+  });
+
+  return (
+    <div>
+      <select value={driftType} onChange={(e) => setDriftType(e.target.value)} style={{ marginBottom: '12px' }}>
+        <option value="">All drift types</option>
+        {heatmap.drift_types.map(type => (
+          <option key={type} value={type}>{type}</option>
+        ))}
+      </select>
+      <div className="scroll-panel">
+        <table width="100%" style={{ borderCollapse: 'collapse' }}>
+          <thead>
+            <tr>
+              <th></th>
+              {HOURS.map(hour => (
+                <th key={hour} style={{ fontSize: '11px' }}>{String(hour).padStart(2, '0')}</th>
+              ))}
+            </tr>
+          </thead>
+          <tbody>
+            {heatmap.days.map((day, dayIndex) => (
+              <tr key={day}>
+                <td style={{ fontWeight: 600 }}>{day}</td>
+                {HOURS.map(hour => (
+                  <td key={hour} style={cellStyle(heatmap.counts[dayIndex][hour])}>
+                    {heatmap.counts[dayIndex][hour] || ''}
+                  </td>
+                ))}
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      </div>
+    </div>
+  );
+}
@@ -1,40 +1,47 @@
 // dashboard/src/components/DriftTimeline.js
-import React, { useMemo } from 'react';
+import React, { useState, useEffect, useMemo } from 'react';
 import { AreaChart, Area, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
+import { getDriftTimeline } from '../services/api';
 
-export default function DriftTimeline({ data }) {
-  // Group drifts by day and type
-  const timelineData = useMemo(() => {
-    if (!data || data.length === 0) return { data: [], types: [] };
-
-    const dayMap = {};
-    const driftTypes = new Set();
-
-    data.forEach(drift => {
-      const date = new Date(drift.event_start);
-      const dayKey = date.toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
-      
-      if (!dayMap[dayKey]) {
-        dayMap[dayKey] = { date: dayKey, timestamp: date.getTime() };
-      }
-
-      const type = drift.drift_type || 'Unknown';
-      driftTypes.add(type);
+const formatBucket = (date, bucket) => {
+  if (bucket === 'hour') {
+    return date.toLocaleString('en-US', { month: 'short', day: 'numeric', hour: 'numeric' });
+  }
+  return date.toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
+};
 
-      // Count drifts and sum duration per type per day
-      const countKey = `${type}_count`;
-      const durationKey = `${type}_duration`;
+export default function DriftTimeline({ periodDays = 7, bucket = 'auto' }) {
+  const [timeline, setTimeline] = useState(null);
+  const [error, setError] = useState(null);
 
-      dayMap[dayKey][countKey] = (dayMap[dayKey][countKey] || 0) + 1;
-      dayMap[dayKey][durationKey] = (dayMap[dayKey][durationKey] || 0) + (drift.duration_seconds || 0);
-    });
+  useEffect(() => {
+    // Counts per bucket and type are aggregated by the backend
+    getDriftTimeline(periodDays, bucket)
+      .then(response => {
+        setTimeline(response.data);
+        setError(null);
+      })
+      .catch(err => {
+        console.error("Failed to fetch drift timeline:", err);
+        setError('Could not load the drift timeline.');
+      });
+  }, [periodDays, bucket]);
 
-    // Convert to array and sort by timestamp
-    const result = Object.values(dayMap).sort((a, b) => a.timestamp - b.timestamp);
-    return { data: result, types: Array.from(driftTypes) };
-  }, [data]);
+  const chartData = useMemo(() => {
+    if (!timeline) return [];
+    return timeline.points.map(point => ({
+      ...point,
+      date: formatBucket(new Date(point.bucket_start), timeline.bucket),
+    }));
+  }, [timeline]);
 
-  if (!timelineData || timelineData.data.length === 0) {
+  if (error) {
+    return <p>{error}</p>;
+  }
+  if (!timeline) {
+    return <p>Loading timeline...</p>;
+  }
+  if (timeline.drift_types.length === 0) {
     return <p>No drift events to display on timeline.</p>;
   }
 
@@ -46,11 +53,11 @@ export default function DriftTimeline({ data }) {
     <div style={{ width: '100%', height: '400px' }}>
       <ResponsiveContainer width="100%" height="100%">
         <AreaChart
-          data={timelineData.data}
+          data={chartData}
           margin={{ top: 10, right: 30, left: 0, bottom: 0 }}
         >
           <defs>
-            {timelineData.types.map((type, index) => (
+            {timeline.drift_types.map((type, index) => (
               <linearGradient key={type} id={`color${index}`} x1="0" y1="0" x2="0" y2="1">
                 <stop offset="5%" stopColor={getColor(index)} stopOpacity={0.8}/>
                 <stop offset="95%" stopColor={getColor(index)} stopOpacity={0.1}/>
@@ -62,7 +69,7 @@ export default function DriftTimeline({ data }) {
           <YAxis label={{ value: 'Number of Drifts', angle: -90, position: 'insideLeft' }} />
           <Tooltip />
           <Legend />
-          {timelineData.types.map((type, index) => (
+          {timeline.drift_types.map((type, index) => (
             <Area
               key={type}
               type="monotone"
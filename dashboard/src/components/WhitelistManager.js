@@ -1,18 +1,23 @@
 // dashboard/src/components/WhitelistManager.js
 import React, { useState, useEffect } from 'react';
-import { getWhitelist, addToWhitelist, removeFromWhitelist } from '../services/api';
+import { getWhitelist, addToWhitelist, removeFromWhitelist, importWhitelist, exportWhitelist } from '../services/api';
 import './WhitelistManager.css';
 
-export default function WhitelistManager() {
-  const [whitelist, setWhitelist] = useState([]);
-  const [loading, setLoading] = useState(true);
+export default function WhitelistManager({ initialWhitelist = null, onWhitelistLoaded }) {
+  const [whitelist, setWhitelist] = useState(initialWhitelist || []);
+  const [loading, setLoading] = useState(!initialWhitelist);
   const [newDomain, setNewDomain] = useState('');
   const [newReason, setNewReason] = useState('');
   const [error, setError] = useState(null);
   const [success, setSuccess] = useState(null);
+  const [importFile, setImportFile] = useState(null);
+  const [importMode, setImportMode] = useState('merge');
 
   useEffect(() => {
-    loadWhitelist();
+    // Already loaded by the dashboard bootstrap call
+    if (!initialWhitelist) {
+      loadWhitelist();
+    }
   }, []);
 
   const loadWhitelist = async () => {
@@ -21,6 +26,10 @@ export default function WhitelistManager() {
     try {
       const response = await getWhitelist();
       setWhitelist(response.data.whitelist || []);
+      // Keep the bootstrap copy current for the next time this page opens
+      if (onWhitelistLoaded) {
+        onWhitelistLoaded(response.data.whitelist || []);
+      }
     } catch (err) {
       setError('Failed to load whitelist: ' + (err.response?.data?.detail || err.message));
     } finally {
@@ -73,6 +82,43 @@ export default function WhitelistManager() {
     }
   };
 
+  const runImport = async (dryRun) => {
+    if (!importFile) {
+      setError('Please choose a CSV or JSON file');
+      return;
+    }
+
+    setError(null);
+    setSuccess(null);
+
+    try {
+      const { data } = await importWhitelist(importFile, importMode, dryRun);
+      const summary = `${data.added} added, ${data.updated} updated, ${data.removed} removed, ${data.unchanged} unchanged`;
+      const skipped = data.invalid.length > 0 ? ` (${data.invalid.length} invalid entries skipped)` : '';
+      setSuccess(dryRun ? `Preview: ${summary}${skipped}` : `Import complete: ${summary}${skipped}`);
+      if (!dryRun) {
+        loadWhitelist();
+      }
+    } catch (err) {
+      setError('Failed to import whitelist: ' + (err.response?.data?.detail || err.message));
+    }
+  };
+
+  const handleExport = async () => {
+    setError(null);
+    try {
+      const response = await exportWhitelist('csv');
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = 'whitelist.csv';
+      link.click();
+      window.URL.revokeObjectURL(url);
+    } catch (err) {
+      setError('Failed to export whitelist: ' + (err.response?.data?.detail || err.message));
+    }
+  };
+
   if (loading) {
     return <div className="whitelist-container">Loading whitelist...</div>;
   }
@@ -120,6 +166,35 @@ export default function WhitelistManager() {
         </form>
       </div>
 
+      {/* Bulk Import / Export */}
+      <div className="whitelist-card">
+        <h3>Import / Export</h3>
+        <div className="whitelist-form">
+          <div className="form-group">
+            <label htmlFor="import-file">Whitelist File:</label>
+            <input
+              type="file"
+              id="import-file"
+              accept=".csv,.json,text/csv,application/json"
+              onChange={(e) => setImportFile(e.target.files[0] || null)}
+            />
+            <small>CSV with <code>domain_name,user_reason</code> rows, or a JSON list of domains.</small>
+          </div>
+
+          <div className="form-group">
+            <label htmlFor="import-mode">Mode:</label>
+            <select id="import-mode" value={importMode} onChange={(e) => setImportMode(e.target.value)}>
+              <option value="merge">Merge - add and update only</option>
+              <option value="replace">Replace - also remove domains not in the file</option>
+            </select>
+          </div>
+
+          <button type="button" className="btn-add" onClick={() => runImport(true)}>Preview</button>
+          <button type="button" className="btn-add" onClick={() => runImport(false)}>Import</button>
+          <button type="button" className="btn-add" onClick={handleExport}>Export CSV</button>
+        </div>
+      </div>
+
       {/* Messages */}
       {error && (
         <div className="message message-error">
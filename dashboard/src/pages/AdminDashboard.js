@@ -106,7 +106,9 @@ export default function AdminDashboard() {
         
         <div className="stat-card">
           <h3>Active Users (30 days)</h3>
-          <div className="stat-value">{stats?.active_users || 0}</div>
+          <div className="stat-value" title={stats?.approximation?.active_users ? 'Estimated from daily sketches' : undefined}>
+            {stats?.approximation?.active_users ? '≈' : ''}{stats?.active_users || 0}
+          </div>
         </div>
         
         <div className="stat-card">
@@ -128,7 +130,7 @@ export default function AdminDashboard() {
       {/* Top Domains */}
       {stats?.top_domains && stats.top_domains.length > 0 && (
         <div className="admin-section">
-          <h2>Top Domains (All Users)</h2>
+          <h2>Top Domains (All Users){stats?.approximation?.top_domains ? ' (estimated)' : ''}</h2>
           <div className="top-domains-table">
             <table>
               <thead>
@@ -142,7 +144,7 @@ export default function AdminDashboard() {
                 {stats.top_domains.map((domain, index) => (
                   <tr key={index}>
                     <td>{domain.domain}</td>
-                    <td><span className={`category-badge ${domain.category.toLowerCase()}`}>{domain.category}</span></td>
+                    <td><span className={`category-badge ${(domain.category || 'Neutral').toLowerCase()}`}>{domain.category || 'Neutral'}</span></td>
                     <td>{formatDuration(domain.total_seconds)}</td>
                   </tr>
                 ))}
@@ -4,21 +4,24 @@ import { getInsights } from '../services/api';
 import UnclassifiedDomains from '../components/UnclassifiedDomains';
 import SessionReport from '../components/SessionReport';
 import DriftiestHour from '../components/DriftiestHour';
+import DriftHeatmap from '../components/DriftHeatmap';
 import StickiestDistractions from '../components/StickiestDistractions';
 
-export default function InsightsPage({ userId = 1 }) {
-  const [loading, setLoading] = useState(true);
+export default function InsightsPage({ userId = 1, initialData = null }) {
+  const [loading, setLoading] = useState(!initialData);
   const [error, setError] = useState(null);
-  const [data, setData] = useState(null);
+  const [data, setData] = useState(initialData);
 
   useEffect(() => {
+    // Already loaded by the dashboard bootstrap call
+    if (initialData) return;
     setLoading(true);
     setError(null);
     getInsights(userId)
       .then(res => setData(res.data))
       .catch(err => setError(err.response?.data?.detail || err.message))
       .finally(() => setLoading(false));
-  }, [userId]);
+  }, [userId, initialData]);
 
   if (loading) return <p>Loading insights...</p>;
   if (error) return <p style={{ color: '#d32f2f' }}>Failed to load insights: {error}</p>;
@@ -35,6 +38,11 @@ export default function InsightsPage({ userId = 1 }) {
         <DriftiestHour items={data?.driftiest_hours || []} />
       </div>
 
+      <div className="dashboard-card full-width">
+        <h2>Drifts by Weekday and Hour</h2>
+        <DriftHeatmap />
+      </div>
+
       <div className="dashboard-card full-width">
         <h2>Session Report</h2>
         <div className="scroll-panel">
@@ -35,14 +35,43 @@ apiClient.interceptors.response.use(
   }
 );
 
-export const getAnalytics = (days = 7) => {
+export const getAnalytics = (days = 7, topN = 10) => {
+  // The backend picks the day/week/month rollup that fits the period
   return apiClient.get('/api/dashboard/analytics', {
     params: {
-      period_days: days
+      period_days: days,
+      top_n: topN
     }
   });
 };
 
+// Analytics, insights and whitelist in one round trip (queries run concurrently server-side)
+export const getDashboardBootstrap = (days = 7, topN = 10) => {
+  return apiClient.get('/api/dashboard/bootstrap', {
+    params: {
+      period_days: days,
+      top_n: topN
+    }
+  });
+};
+
+// Drift counts/durations per bucket and type, aggregated server-side
+export const getDriftTimeline = (days = 7, bucket = 'auto') => {
+  return apiClient.get('/api/dashboard/drift-timeline', {
+    params: {
+      period_days: days,
+      bucket: bucket
+    }
+  });
+};
+
+// Drift counts by weekday and hour, optionally for one drift type
+export const getDriftHeatmap = (driftType = null) => {
+  return apiClient.get('/api/dashboard/drift-heatmap', {
+    params: driftType ? { drift_type: driftType } : {}
+  });
+};
+
 // Whitelist management functions
 export const getWhitelist = () => {
   return apiClient.get('/api/whitelist');
@@ -59,14 +88,33 @@ export const removeFromWhitelist = (domainId) => {
   return apiClient.delete(`/api/whitelist/${domainId}`);
 };
 
+// Applies a whole CSV/JSON whitelist file in one request (mode: 'merge' | 'replace')
+export const importWhitelist = (file, mode = 'merge', dryRun = false) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  return apiClient.post('/api/whitelist/import', formData, {
+    params: { mode, dry_run: dryRun }
+  });
+};
+
+export const exportWhitelist = (format = 'csv') => {
+  return apiClient.get('/api/whitelist/export', {
+    params: { format },
+    responseType: format === 'csv' ? 'blob' : 'json'
+  });
+};
+
 // Insights
 export const getInsights = () => {
   return apiClient.get('/api/dashboard/insights');
 };
 
 // Admin functions
-export const getAdminStats = () => {
-  return apiClient.get('/api/admin/stats');
+// Active users and top domains come from sketches unless exact=true (full scans)
+export const getAdminStats = (exact = false) => {
+  return apiClient.get('/api/admin/stats', {
+    params: exact ? { exact: true } : {}
+  });
 };
 
 export const getAdminUsers = () => {
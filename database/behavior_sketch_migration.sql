@@ -0,0 +1,14 @@
+-- Behavior Sketch Migration
+-- Per-user KLL quantile sketches of focus-span length and tab-switch rate,
+-- merged from each ingested batch by backend/live_drift.py and read by
+-- backend/drift_thresholds.py to personalize drift thresholds.
+
+CREATE TABLE IF NOT EXISTS `user_behavior_sketch` (
+  `user_id` int NOT NULL,
+  `metric_name` varchar(32) NOT NULL COMMENT 'focus_span or switch_rate',
+  `sample_count` bigint NOT NULL DEFAULT '0',
+  `sketch` mediumblob NOT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`user_id`, `metric_name`),
+  CONSTRAINT `fk_behavior_sketch_to_user` FOREIGN KEY (`user_id`) REFERENCES `user` (`uid`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
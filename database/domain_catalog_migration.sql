@@ -0,0 +1,39 @@
+-- Domain Catalog Migration
+-- One global row per normalized domain name. domains stays the per-user
+-- mapping (tab, whitelist and summary rows reference domains.id) and keeps the
+-- user's category override; cross-user aggregation groups by catalog_id.
+-- Reload the getOrCreateDomain procedure from project_tpf.sql afterwards.
+
+CREATE TABLE IF NOT EXISTS `domain_catalog` (
+  `catalog_id` int NOT NULL AUTO_INCREMENT,
+  `domain_name` varchar(255) NOT NULL COMMENT 'Lowercased host without www.',
+  `default_category` enum('Productive','Unproductive','Neutral','Social Media','Entertainment') NOT NULL DEFAULT 'Neutral' COMMENT 'Category most users give the domain; initial category of new mappings',
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`catalog_id`),
+  UNIQUE KEY `unique_catalog_domain` (`domain_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT IGNORE INTO `domain_catalog` (domain_name)
+SELECT DISTINCT LOWER(domain_name) FROM domains;
+
+ALTER TABLE `domains`
+ADD COLUMN `catalog_id` int NULL AFTER `user_id`;
+
+UPDATE domains d
+JOIN domain_catalog c ON c.domain_name = LOWER(d.domain_name)
+SET d.catalog_id = c.catalog_id;
+
+ALTER TABLE `domains`
+MODIFY COLUMN `catalog_id` int NOT NULL,
+ADD KEY `idx_domains_catalog` (`catalog_id`),
+ADD CONSTRAINT `fk_domains_to_catalog` FOREIGN KEY (`catalog_id`) REFERENCES `domain_catalog` (`catalog_id`);
+
+-- Seed the defaults; jobs/run_stat_sketches.py keeps them current
+UPDATE domain_catalog c
+JOIN (
+  SELECT catalog_id, category,
+         ROW_NUMBER() OVER (PARTITION BY catalog_id ORDER BY COUNT(*) DESC, category) AS category_rank
+  FROM domains
+  GROUP BY catalog_id, category
+) dominant ON dominant.catalog_id = c.catalog_id AND dominant.category_rank = 1
+SET c.default_category = dominant.category;
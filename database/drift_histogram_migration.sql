@@ -0,0 +1,27 @@
+-- Drift Histogram Migration
+-- Per-user drift counts by day of week, hour of day and drift type, updated
+-- by insert_drift (backend/drift_detection.py) as drifts are written, so the
+-- "driftiest hours" insight and the heatmap read at most 7 x 24 x types rows.
+
+CREATE TABLE IF NOT EXISTS `drift_hour_histogram` (
+  `user_id` int NOT NULL,
+  `day_of_week` tinyint unsigned NOT NULL COMMENT 'WEEKDAY(event_start): 0 = Monday',
+  `hour_of_day` tinyint unsigned NOT NULL,
+  `drift_type` varchar(60) NOT NULL,
+  `drift_count` int NOT NULL DEFAULT '0',
+  `total_seconds` bigint NOT NULL DEFAULT '0',
+  PRIMARY KEY (`user_id`, `day_of_week`, `hour_of_day`, `drift_type`),
+  CONSTRAINT `fk_drift_histogram_to_user` FOREIGN KEY (`user_id`) REFERENCES `user` (`uid`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Backfill from existing drifts (re-running recomputes the counts)
+INSERT INTO drift_hour_histogram
+    (user_id, day_of_week, hour_of_day, drift_type, drift_count, total_seconds)
+SELECT s.user_id, WEEKDAY(de.event_start), HOUR(de.event_start),
+       COALESCE(de.drift_type, 'Unknown'), COUNT(*), COALESCE(SUM(GREATEST(de.duration_seconds, 0)), 0)
+FROM drift_event de
+JOIN sessions s ON de.session_id = s.sid
+GROUP BY s.user_id, WEEKDAY(de.event_start), HOUR(de.event_start), COALESCE(de.drift_type, 'Unknown')
+ON DUPLICATE KEY UPDATE
+    drift_count = VALUES(drift_count),
+    total_seconds = VALUES(total_seconds);
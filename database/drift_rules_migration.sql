@@ -0,0 +1,6 @@
+-- Drift Rules Migration
+-- Drift detection runs as declarative rules in one pass over each session's
+-- events (backend/drift_rules.py). The unfinished stored procedure that
+-- duplicated two of those rules is no longer used.
+
+DROP PROCEDURE IF EXISTS sp_AnalyzeSessionDrifts;
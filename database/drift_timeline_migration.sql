@@ -0,0 +1,6 @@
+-- Drift Timeline Migration
+-- Covering index for the per-bucket drift aggregation behind
+-- /api/dashboard/drift-timeline (the user's sessions, then event_start range),
+-- also used by the duplicate check when drifts are inserted.
+
+CREATE INDEX `idx_drift_session_start` ON `drift_event` (`session_id`, `event_start`, `drift_type`, `duration_seconds`);
@@ -0,0 +1,46 @@
+-- Event Rollup Migration
+-- Adds per-(tab, minute) engagement buckets so MOUSE_MOVE / SCROLL rows can be
+-- purged from activity_event after a short retention window.
+
+-- One row per tab per minute of interaction
+CREATE TABLE IF NOT EXISTS `tab_minute_engagement` (
+  `tab_id` int NOT NULL,
+  `bucket_start` datetime NOT NULL COMMENT 'Timestamp truncated to the minute',
+  `session_id` int NOT NULL,
+  `user_id` int NOT NULL,
+  `move_count` smallint unsigned NOT NULL DEFAULT '0',
+  `scroll_count` smallint unsigned NOT NULL DEFAULT '0',
+  `click_count` smallint unsigned NOT NULL DEFAULT '0',
+  `max_scroll_percent` float DEFAULT NULL,
+  `active_second_mask` bigint unsigned NOT NULL DEFAULT '0' COMMENT 'Bit n set = interaction in second n of the minute',
+  `active_seconds` tinyint unsigned NOT NULL DEFAULT '0' COMMENT 'Distinct seconds with interaction (bits set in active_second_mask)',
+  PRIMARY KEY (`tab_id`, `bucket_start`),
+  KEY `idx_engagement_session` (`session_id`, `bucket_start`),
+  KEY `idx_engagement_user` (`user_id`, `bucket_start`),
+  CONSTRAINT `fk_engagement_to_tab` FOREIGN KEY (`tab_id`) REFERENCES `tab` (`tid`) ON DELETE CASCADE,
+  CONSTRAINT `fk_engagement_to_session` FOREIGN KEY (`session_id`) REFERENCES `sessions` (`sid`) ON DELETE CASCADE,
+  CONSTRAINT `fk_engagement_to_user` FOREIGN KEY (`user_id`) REFERENCES `user` (`uid`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Lets the retention purge find expired high-frequency rows without a full scan
+CREATE INDEX `idx_act_type_time` ON `activity_event` (`event_type`, `timestamp`);
+
+-- Seed buckets from the raw rows that already exist
+INSERT INTO `tab_minute_engagement`
+  (tab_id, bucket_start, session_id, user_id, move_count, scroll_count, click_count, max_scroll_percent,
+   active_second_mask, active_seconds)
+SELECT
+  tab_id,
+  DATE_FORMAT(`timestamp`, '%Y-%m-%d %H:%i:00') AS bucket_start,
+  MIN(session_id),
+  MIN(user_id),
+  SUM(event_type = 'MOUSE_MOVE'),
+  SUM(event_type = 'SCROLL'),
+  SUM(event_type = 'CLICK'),
+  MAX(scroll_y_percent),
+  BIT_OR(1 << SECOND(`timestamp`)),
+  COUNT(DISTINCT SECOND(`timestamp`))
+FROM activity_event
+WHERE event_type IN ('MOUSE_MOVE', 'SCROLL', 'CLICK')
+GROUP BY tab_id, DATE_FORMAT(`timestamp`, '%Y-%m-%d %H:%i:00')
+ON DUPLICATE KEY UPDATE move_count = VALUES(move_count);
@@ -0,0 +1,18 @@
+-- Ingest Batch Migration
+-- Idempotency keys of ingested event batches. backend/ingest_dedup.py claims
+-- (user_id, batch_id) in the same transaction as the batch's events, so a
+-- retried batch is acknowledged without being inserted twice. Rows older
+-- than INGEST_DEDUP_TTL_HOURS are purged by jobs/run_event_compaction.py.
+
+CREATE TABLE IF NOT EXISTS `ingest_batch` (
+  `user_id` int NOT NULL,
+  `batch_id` varchar(64) NOT NULL COMMENT 'Client-generated, unchanged on retry',
+  `session_id` int NOT NULL,
+  `event_count` int NOT NULL,
+  `first_seq` bigint DEFAULT NULL,
+  `last_seq` bigint DEFAULT NULL,
+  `received_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`user_id`, `batch_id`),
+  KEY `idx_ingest_batch_received` (`received_at`),
+  CONSTRAINT `fk_ingest_batch_to_user` FOREIGN KEY (`user_id`) REFERENCES `user` (`uid`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
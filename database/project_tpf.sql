@@ -9,33 +9,13 @@ END$$
 DELIMITER ;
 
 -- Add a new column to the tab table first
+-- (maintained per ingest batch by backend/session_lifecycle.py, not by a per-row trigger)
 ALTER TABLE tab ADD COLUMN last_activity_at TIMESTAMP NULL;
 
-DELIMITER $$
-CREATE TRIGGER trg_update_tab_activity
-AFTER INSERT ON activity_event
-FOR EACH ROW
-BEGIN
-    UPDATE tab
-    SET last_activity_at = NEW.timestamp
-    WHERE tid = NEW.tab_id;
-END$$
-DELIMITER ;
-
 -- Add a new column to the sessions table first
+-- (maintained per ingest batch by backend/session_lifecycle.py, not by a per-row trigger)
 ALTER TABLE sessions ADD COLUMN last_activity_at TIMESTAMP NULL;
 
-DELIMITER $$
-CREATE TRIGGER trg_update_session_activity
-AFTER INSERT ON activity_event
-FOR EACH ROW
-BEGIN
-    UPDATE sessions
-    SET last_activity_at = NEW.timestamp
-    WHERE sid = NEW.session_id;
-END$$
-DELIMITER ;
-
 
 
 DELIMITER $$
@@ -60,9 +40,13 @@ BEGIN
     SELECT id INTO p_domain_id FROM domains WHERE user_id = p_user_id AND domain_name = p_domain_name LIMIT 1;
 
     IF p_domain_id IS NULL THEN
-        INSERT INTO domains (user_id, domain_name)
-        VALUES 
-        (p_user_id, p_domain_name);
+        INSERT INTO domain_catalog (domain_name)
+        VALUES (LOWER(p_domain_name))
+        ON DUPLICATE KEY UPDATE catalog_id = LAST_INSERT_ID(catalog_id);
+
+        INSERT INTO domains (user_id, catalog_id, domain_name, category)
+        SELECT p_user_id, catalog_id, p_domain_name, default_category
+        FROM domain_catalog WHERE catalog_id = LAST_INSERT_ID();
         
         SET p_domain_id = LAST_INSERT_ID();
     END IF;
@@ -70,71 +54,9 @@ END$$
 
 DELIMITER ;
 
-DELIMITER $$
-CREATE PROCEDURE sp_AnalyzeSessionDrifts(IN p_session_id INT)
-BEGIN
-    DECLARE v_user_id INT;
-    DECLARE v_tab_id INT;
-    DECLARE v_event_type VARCHAR(50);
-    DECLARE v_timestamp TIMESTAMP(3);
-    DECLARE v_url VARCHAR(2083);
-    DECLARE v_domain_name VARCHAR(255);
-    DECLARE v_domain_category ENUM('Productive','Unproductive','Neutral','Social Media','Entertainment');
-    
-    -- State variables for loop detection
-    DECLARE v_last_domain_category VARCHAR(50) DEFAULT 'Neutral';
-    DECLARE v_last_event_time TIMESTAMP(3);
-    
-    -- Cursor to loop through all events for the session
-    DECLARE event_cursor CURSOR FOR
-        SELECT 
-            ae.user_id, ae.tab_id, ae.event_type, ae.timestamp, ae.url,
-            d.domain_name, d.category
-        FROM activity_event ae
-        JOIN tab t ON ae.tab_id = t.tid
-        JOIN domains d ON t.domain_id = d.id
-        WHERE ae.session_id = p_session_id
-        ORDER BY ae.timestamp;
-        
-    -- TODO: Add handlers for cursor
-    
-    OPEN event_cursor;
-    
-    event_loop: LOOP
-        FETCH event_cursor INTO v_user_id, v_tab_id, v_event_type, v_timestamp, v_url, v_domain_name, v_domain_category;
-        
-        -- PSEUDO-CODE for detection logic:
-        
-        -- 1. Unproductive Shift Detection
-        IF (v_event_type = 'TAB_FOCUS' OR v_event_type = 'URL_CHANGE') THEN
-            IF (v_last_domain_category = 'Productive' AND v_domain_category = 'Unproductive') THEN
-                -- This is a simple drift. Log it.
-                INSERT INTO drift_event (session_id, event_start, event_end, drift_type, description, severity)
-                VALUES (p_session_id, v_timestamp, v_timestamp, 'Unproductive Shift', CONCAT('Shifted to ', v_domain_name), 'LOW');
-                
-                -- Also link the tab
-                INSERT INTO drift_involves_tab (tab_id, drift_id) VALUES (v_tab_id, LAST_INSERT_ID());
-            END IF;
-            
-            SET v_last_domain_category = v_domain_category;
-        END IF;
-        
-        -- 2. Idle Detection
-        IF (v_last_event_time IS NOT NULL AND TIMESTAMPDIFF(MINUTE, v_last_event_time, v_timestamp) > 5) THEN
-            INSERT INTO drift_event (session_id, event_start, event_end, drift_type, description, severity)
-            VALUES (p_session_id, v_last_event_time, v_timestamp, 'Idle', 'User idle for 5+ minutes', 'LOW');
-        END IF;
-
-        -- 3. TODO: Add logic for other drift types (Rapid Switching, Loops)
-        -- This requires more complex state management (e.g., temp tables)
-        
-        SET v_last_event_time = v_timestamp;
-        
-    END LOOP event_loop;
-    
-    CLOSE event_cursor;
-END$$
-DELIMITR ;
+-- Session drift analysis runs in the backend's rule engine
+-- (backend/drift_rules.py); drift_rules_migration.sql drops the old
+-- sp_AnalyzeSessionDrifts procedure from existing databases.
 
 
 DELIMITER $$
@@ -0,0 +1,21 @@
+-- Purge Job Migration
+-- Tracks background user purges. No foreign key to `user`: the row must
+-- outlive the user it describes.
+
+CREATE TABLE IF NOT EXISTS `purge_job` (
+  `job_id` int NOT NULL AUTO_INCREMENT,
+  `user_id` int NOT NULL,
+  `user_email` varchar(100) DEFAULT NULL,
+  `requested_by` varchar(100) DEFAULT NULL,
+  `status` enum('queued','running','completed','failed') NOT NULL DEFAULT 'queued',
+  `current_step` varchar(60) DEFAULT NULL COMMENT 'Step being purged; completed steps are skipped on resume',
+  `rows_deleted` bigint unsigned NOT NULL DEFAULT '0',
+  `progress` json DEFAULT NULL COMMENT 'Rows deleted per step',
+  `error` varchar(500) DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `finished_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`job_id`),
+  KEY `idx_purge_user` (`user_id`),
+  KEY `idx_purge_status` (`status`, `updated_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,53 @@
+-- Rollup Migration
+-- Weekly and monthly domain summaries maintained from daily_domain_summary, so
+-- long dashboard periods read a handful of buckets instead of every day.
+
+-- One row per user per domain per ISO week (week_start is the Monday)
+CREATE TABLE IF NOT EXISTS `weekly_domain_summary` (
+  `user_id` int NOT NULL,
+  `week_start` date NOT NULL,
+  `domain_id` int NOT NULL,
+  `total_seconds_focused` int NOT NULL DEFAULT '0',
+  `total_events` int NOT NULL DEFAULT '0',
+  `active_days` tinyint unsigned NOT NULL DEFAULT '0',
+  PRIMARY KEY (`user_id`, `week_start`, `domain_id`),
+  KEY `idx_weekly_domain` (`domain_id`),
+  CONSTRAINT `fk_weekly_to_user` FOREIGN KEY (`user_id`) REFERENCES `user` (`uid`) ON DELETE CASCADE,
+  CONSTRAINT `fk_weekly_to_domain` FOREIGN KEY (`domain_id`) REFERENCES `domains` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- One row per user per domain per calendar month (month_start is the 1st)
+CREATE TABLE IF NOT EXISTS `monthly_domain_summary` (
+  `user_id` int NOT NULL,
+  `month_start` date NOT NULL,
+  `domain_id` int NOT NULL,
+  `total_seconds_focused` int NOT NULL DEFAULT '0',
+  `total_events` int NOT NULL DEFAULT '0',
+  `active_days` tinyint unsigned NOT NULL DEFAULT '0',
+  PRIMARY KEY (`user_id`, `month_start`, `domain_id`),
+  KEY `idx_monthly_domain` (`domain_id`),
+  CONSTRAINT `fk_monthly_to_user` FOREIGN KEY (`user_id`) REFERENCES `user` (`uid`) ON DELETE CASCADE,
+  CONSTRAINT `fk_monthly_to_domain` FOREIGN KEY (`domain_id`) REFERENCES `domains` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Serves the daily-grain analytics range scan
+CREATE INDEX `idx_dds_user_date` ON `daily_domain_summary` (`user_id`, `summary_date`);
+
+-- Seed both rollups from the existing daily rows
+INSERT INTO `weekly_domain_summary`
+  (user_id, week_start, domain_id, total_seconds_focused, total_events, active_days)
+SELECT user_id, DATE_SUB(summary_date, INTERVAL WEEKDAY(summary_date) DAY) AS week_start, domain_id,
+       SUM(total_seconds_focused), SUM(total_events), COUNT(*)
+FROM daily_domain_summary
+GROUP BY user_id, week_start, domain_id
+ON DUPLICATE KEY UPDATE total_seconds_focused = VALUES(total_seconds_focused),
+                        total_events = VALUES(total_events), active_days = VALUES(active_days);
+
+INSERT INTO `monthly_domain_summary`
+  (user_id, month_start, domain_id, total_seconds_focused, total_events, active_days)
+SELECT user_id, DATE_SUB(summary_date, INTERVAL DAYOFMONTH(summary_date) - 1 DAY) AS month_start, domain_id,
+       SUM(total_seconds_focused), SUM(total_events), COUNT(*)
+FROM daily_domain_summary
+GROUP BY user_id, month_start, domain_id
+ON DUPLICATE KEY UPDATE total_seconds_focused = VALUES(total_seconds_focused),
+                        total_events = VALUES(total_events), active_days = VALUES(active_days);
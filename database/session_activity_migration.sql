@@ -0,0 +1,23 @@
+-- Session Activity Migration
+-- sessions/tab.last_activity_at (added by project_tpf.sql) are now updated once
+-- per ingest batch instead of by two per-row triggers on activity_event, and
+-- idle sessions are closed by jobs/run_session_reaper.py.
+
+DROP TRIGGER IF EXISTS `trg_update_tab_activity`;
+DROP TRIGGER IF EXISTS `trg_update_session_activity`;
+
+-- Lets the reaper find open sessions ordered by last activity
+CREATE INDEX `idx_sessions_open_activity` ON `sessions` (`end_time`, `last_activity_at`);
+
+-- Backfill open sessions and tabs that predate the triggers
+UPDATE sessions s
+JOIN (SELECT session_id, MAX(timestamp) AS last_ts FROM activity_event GROUP BY session_id) a
+  ON a.session_id = s.sid
+SET s.last_activity_at = a.last_ts
+WHERE s.end_time IS NULL AND s.last_activity_at IS NULL;
+
+UPDATE tab t
+JOIN (SELECT tab_id, MAX(timestamp) AS last_ts FROM activity_event GROUP BY tab_id) a
+  ON a.tab_id = t.tid
+SET t.last_activity_at = a.last_ts
+WHERE t.closed_at IS NULL AND t.last_activity_at IS NULL;
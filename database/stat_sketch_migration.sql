@@ -0,0 +1,16 @@
+-- Stat Sketch Migration
+-- Per-day mergeable sketches for the admin statistics (see backend/stat_sketches.py),
+-- built by jobs/run_stat_sketches.py. Backfill with
+-- `python jobs/run_stat_sketches.py --days 365` (or more) after applying.
+
+CREATE TABLE IF NOT EXISTS `daily_stat_sketch` (
+  `stat_date` date NOT NULL,
+  `sketch_name` varchar(40) NOT NULL,
+  `sketch` mediumblob NOT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`sketch_name`, `stat_date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- One day of sessions / summaries per sketch build
+CREATE INDEX `idx_sessions_start_user` ON `sessions` (`start_time`, `user_id`);
+CREATE INDEX `idx_dds_date` ON `daily_domain_summary` (`summary_date`, `domain_id`);
@@ -0,0 +1,8 @@
+-- URL Classification Migration
+-- Stores the ingest-time URL classifier result on each dictionary entry.
+-- Run backend/jobs/run_url_classification.py afterwards to classify existing URLs.
+
+ALTER TABLE `url_dict`
+ADD COLUMN `url_flags` tinyint unsigned NOT NULL DEFAULT '0' COMMENT 'Bit 1 = search results page, bit 2 = query present',
+ADD COLUMN `rule_code` smallint unsigned NOT NULL DEFAULT '0' COMMENT '1-based index of the matching classifier rule, 0 = none',
+ADD KEY `idx_url_flags` (`url_flags`);
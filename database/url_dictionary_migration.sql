@@ -0,0 +1,50 @@
+-- URL Dictionary Migration
+-- Interns activity_event URLs and target element ids into dictionary tables
+-- keyed by a 64-bit hash (first 8 bytes of SHA-256, same as url_dictionary.py).
+
+CREATE TABLE IF NOT EXISTS `url_dict` (
+  `url_id` int NOT NULL AUTO_INCREMENT,
+  `url_hash` bigint unsigned NOT NULL,
+  `url` varchar(2083) NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`url_id`),
+  UNIQUE KEY `unique_url_hash` (`url_hash`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+CREATE TABLE IF NOT EXISTS `element_dict` (
+  `element_id` int NOT NULL AUTO_INCREMENT,
+  `element_hash` bigint unsigned NOT NULL,
+  `element_value` varchar(100) NOT NULL,
+  PRIMARY KEY (`element_id`),
+  UNIQUE KEY `unique_element_hash` (`element_hash`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Events reference the dictionaries; the raw columns stay for hash collisions and old rows
+ALTER TABLE `activity_event`
+ADD COLUMN `url_id` int DEFAULT NULL AFTER `url`,
+ADD COLUMN `target_element_ref` int DEFAULT NULL AFTER `target_element_id`,
+ADD KEY `fk_act_to_url` (`url_id`),
+ADD CONSTRAINT `fk_act_to_url` FOREIGN KEY (`url_id`) REFERENCES `url_dict` (`url_id`),
+ADD CONSTRAINT `fk_act_to_element` FOREIGN KEY (`target_element_ref`) REFERENCES `element_dict` (`element_id`);
+
+-- Backfill dictionaries from existing rows
+INSERT IGNORE INTO `url_dict` (url_hash, url)
+SELECT DISTINCT CAST(CONV(LEFT(SHA2(url, 256), 16), 16, 10) AS UNSIGNED), url
+FROM activity_event
+WHERE url IS NOT NULL;
+
+INSERT IGNORE INTO `element_dict` (element_hash, element_value)
+SELECT DISTINCT CAST(CONV(LEFT(SHA2(target_element_id, 256), 16), 16, 10) AS UNSIGNED), target_element_id
+FROM activity_event
+WHERE target_element_id IS NOT NULL;
+
+-- Point existing events at the dictionaries and drop their inline copies
+UPDATE activity_event ae
+JOIN url_dict ud ON ud.url_hash = CAST(CONV(LEFT(SHA2(ae.url, 256), 16), 16, 10) AS UNSIGNED)
+SET ae.url_id = ud.url_id, ae.url = NULL
+WHERE ae.url IS NOT NULL AND ud.url = ae.url;
+
+UPDATE activity_event ae
+JOIN element_dict ed ON ed.element_hash = CAST(CONV(LEFT(SHA2(ae.target_element_id, 256), 16), 16, 10) AS UNSIGNED)
+SET ae.target_element_ref = ed.element_id, ae.target_element_id = NULL
+WHERE ae.target_element_id IS NOT NULL AND ed.element_value = ae.target_element_id;
@@ -48,6 +48,7 @@ async function startSession() {
   const response = await apiPost('/api/session/start', sessionData);
   if (response && response.sid) {
     currentSessionId = response.sid;
+    eventSeq = 0;
     console.log('Session started:', currentSessionId);
     chrome.storage.local.set({ sid: currentSessionId });
   }
@@ -63,12 +64,25 @@ async function closeSession() {
 }
 
 // --- Event Batching ---
+// Every batch gets a batch_id and every event a per-session seq. A batch
+// that was not acknowledged is resent unchanged, so the backend can
+// recognize a retry of a batch it already committed and skip it.
+const MAX_BATCH_ATTEMPTS = 6;
+const BATCH_TIMEOUT_MS = 10000;
+const BATCH_RETRY_BASE_MS = 1000;
+const MAX_PENDING_BATCHES = 50;
+let eventSeq = 0;
+let pendingBatches = [];
+let flushingBatches = false;
+let inFlightBatch = null; // the batch flushPendingBatches is sending, never dropped
+
 function queueEvent(event) {
   if (!currentSessionId) return; // Don't track if session isn't on
 
   const eventWithContext = {
     ...event,
     timestamp: new Date().toISOString(),
+    seq: eventSeq++,
   };
   eventBatch.push(eventWithContext);
 
@@ -86,16 +100,198 @@ function queueEvent(event) {
 async function sendBatch() {
   if (eventBatch.length === 0) return;
 
-  const batchToSend = [...eventBatch];
-  eventBatch = [];
-  
-  await apiPost('/api/events/batch', {
+  pendingBatches.push({
+    batch_id: crypto.randomUUID(),
     session_id: currentSessionId,
-    events: batchToSend,
+    events: eventBatch,
+  });
+  eventBatch = [];
+  if (pendingBatches.length > MAX_PENDING_BATCHES) {
+    // Drop the oldest batch that is not being sent right now
+    const index = pendingBatches.findIndex((batch) => batch !== inFlightBatch);
+    const [dropped] = pendingBatches.splice(index, 1);
+    console.error(`Dropped unsent batch ${dropped.batch_id} of ${dropped.events.length} events`);
+  }
+  await flushPendingBatches();
+}
+
+// Status codes worth retrying; other errors will not go away on a resend
+function isRetryable(status) {
+  return status === 408 || status === 429 || status >= 500;
+}
+
+async function postBatchOnce(batch) {
+  const { auth_token } = await chrome.storage.local.get(['auth_token']);
+  const headers = { 'Content-Type': 'application/json' };
+  if (auth_token) {
+    headers['Authorization'] = `Bearer ${auth_token}`;
+  }
+  const controller = new AbortController();
+  const timeout = setTimeout(() => controller.abort(), BATCH_TIMEOUT_MS);
+  try {
+    const response = await fetch(`${API_URL}/api/events/batch`, {
+      method: 'POST',
+      headers: headers,
+      body: JSON.stringify(batch),
+      signal: controller.signal,
+    });
+    if (!response.ok) {
+      const error = new Error(`API Error: ${response.status}`);
+      error.retryable = isRetryable(response.status);
+      // Rate limited (429) or shed (503) requests say when to come back
+      error.retryAfterMs = Number(response.headers.get('Retry-After')) * 1000 || 0;
+      throw error;
+    }
+    return await response.json();
+  } catch (error) {
+    // Network errors and timeouts may have reached the server; the batch_id makes resending safe
+    if (error.retryable === undefined) error.retryable = true;
+    throw error;
+  } finally {
+    clearTimeout(timeout);
+  }
+}
+
+// Sends queued batches in order, retrying each with exponential backoff and jitter
+async function flushPendingBatches() {
+  if (flushingBatches) return;
+  flushingBatches = true;
+  try {
+    while (pendingBatches.length > 0) {
+      const batch = pendingBatches[0];
+      inFlightBatch = batch;
+      for (let attempt = 1; ; attempt++) {
+        try {
+          const result = await postBatchOnce(batch);
+          if (result.duplicate) {
+            console.log(`Batch ${batch.batch_id} was already stored`);
+          } else {
+            console.log(`Sent batch of ${batch.events.length} events`);
+          }
+          break;
+        } catch (error) {
+          if (!error.retryable || attempt >= MAX_BATCH_ATTEMPTS) {
+            console.error(`Giving up on batch ${batch.batch_id}:`, error);
+            break;
+          }
+          const backoff = BATCH_RETRY_BASE_MS * 2 ** (attempt - 1) * (0.5 + Math.random());
+          const delay = Math.max(backoff, error.retryAfterMs || 0);
+          await new Promise((resolve) => setTimeout(resolve, delay));
+        }
+      }
+      // Batches may have been dropped from the queue meanwhile, so remove this one by identity
+      inFlightBatch = null;
+      const index = pendingBatches.indexOf(batch);
+      if (index !== -1) pendingBatches.splice(index, 1);
+    }
+  } finally {
+    inFlightBatch = null;
+    flushingBatches = false;
+  }
+}
+
+// --- Live Drift Alerts ---
+// Drifts detected by the backend as batches arrive, read from the
+// Server-Sent Events stream (fetch is used instead of EventSource so the
+// Authorization header can be sent). A dropped stream is reopened with
+// exponential backoff; a rejected token (401/403) is not retried until the
+// user logs in again.
+const MAX_LIVE_DRIFTS = 10;
+const DRIFT_RECONNECT_BASE_MS = 1000;
+const DRIFT_RECONNECT_MAX_MS = 60000;
+let driftStreamController = null;
+let driftReconnectAttempts = 0;
+
+async function connectDriftStream() {
+  const { auth_token } = await chrome.storage.local.get(['auth_token']);
+  if (!auth_token || driftStreamController) return;
+
+  const controller = new AbortController();
+  driftStreamController = controller;
+  let retry = true;
+  try {
+    const response = await fetch(`${API_URL}/api/drifts/stream`, {
+      headers: { 'Authorization': `Bearer ${auth_token}` },
+      signal: controller.signal,
+    });
+    if (!response.ok) {
+      retry = response.status !== 401 && response.status !== 403;
+      throw new Error(`API Error: ${response.status}`);
+    }
+    driftReconnectAttempts = 0;
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        await handleDriftMessage(buffer.slice(0, end));
+        buffer = buffer.slice(end + 2);
+      }
+    }
+  } catch (error) {
+    if (error.name !== 'AbortError') {
+      console.error('Drift stream error:', error);
+    }
+  } finally {
+    driftStreamController = null;
+  }
+
+  // Reconnect unless the stream was closed on logout or the token was refused
+  if (retry && !controller.signal.aborted) {
+    driftReconnectAttempts++;
+    const backoff = Math.min(DRIFT_RECONNECT_BASE_MS * 2 ** (driftReconnectAttempts - 1), DRIFT_RECONNECT_MAX_MS);
+    setTimeout(connectDriftStream, backoff * (0.5 + Math.random()));
+  }
+}
+
+function disconnectDriftStream() {
+  if (driftStreamController) {
+    driftStreamController.abort();
+    driftStreamController = null;
+  }
+}
+
+async function handleDriftMessage(message) {
+  let eventName = 'message';
+  let data = '';
+  for (const line of message.split('\n')) {
+    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+    else if (line.startsWith('data:')) data += line.slice(5).trim();
+  }
+  if (eventName !== 'drift' || !data) return;
+
+  let drift;
+  try {
+    drift = JSON.parse(data);
+  } catch (error) {
+    console.error('Malformed drift message:', error);
+    return;
+  }
+  const { live_drifts = [], unseen_drifts = 0 } = await chrome.storage.local.get(['live_drifts', 'unseen_drifts']);
+  const unseen = unseen_drifts + 1;
+  await chrome.storage.local.set({
+    live_drifts: [drift, ...live_drifts].slice(0, MAX_LIVE_DRIFTS),
+    unseen_drifts: unseen,
   });
-  console.log(`Sent batch of ${batchToSend.length} events`);
+  await chrome.action.setBadgeBackgroundColor({ color: '#ef4444' });
+  await chrome.action.setBadgeText({ text: String(unseen) });
 }
 
+chrome.storage.onChanged.addListener((changes, area) => {
+  if (area !== 'local' || !changes.auth_token) return;
+  if (changes.auth_token.newValue) {
+    driftReconnectAttempts = 0;
+    connectDriftStream();
+  } else {
+    disconnectDriftStream();
+    chrome.storage.local.remove(['live_drifts', 'unseen_drifts']);
+    chrome.action.setBadgeText({ text: '' });
+  }
+});
+
 // --- Browser Event Listeners ---
 chrome.runtime.onStartup.addListener(startSession);
 chrome.windows.onRemoved.addListener(closeSession); // When browser closes
@@ -229,4 +425,7 @@ chrome.storage.local.get('sid', (data) => {
         }
     });
   }
-});
\ No newline at end of file
+});
+
+// Subscribe to live drift alerts if already logged in
+connectDriftStream();
\ No newline at end of file
@@ -275,6 +275,34 @@ document.addEventListener('DOMContentLoaded', () => {
   const topEl = document.getElementById('stat-top');
   list.innerHTML = '<li class="loading">Loading...</li>'; // Clear and set loading
 
+  // --- 4. Live alerts pushed by the backend (stored by background.js) ---
+  const liveList = document.getElementById('live-drift-list');
+
+  function renderLiveDrifts(drifts) {
+    liveList.innerHTML = '';
+    if (!drifts || drifts.length === 0) {
+      liveList.innerHTML = '<li class="loading">No alerts this session.</li>';
+      return;
+    }
+    drifts.forEach(drift => {
+      const li = document.createElement('li');
+      const time = new Date(drift.event_end).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+      li.textContent = `${time} ${drift.drift_type}: ${drift.description}`;
+      liveList.appendChild(li);
+    });
+  }
+
+  chrome.storage.local.get('live_drifts', (data) => renderLiveDrifts(data.live_drifts));
+  // Opening the popup marks the alerts as seen
+  chrome.storage.local.set({ unseen_drifts: 0 });
+  chrome.action.setBadgeText({ text: '' });
+
+  chrome.storage.onChanged.addListener((changes, area) => {
+    if (area === 'local' && changes.live_drifts) {
+      renderLiveDrifts(changes.live_drifts.newValue);
+    }
+  });
+
   function fetchAnalytics(token) {
     // We need the user ID, which we get from the auth token on the backend
     fetch(`http://127.0.0.1:8000/api/dashboard/analytics?period_days=1`, {